@@ -0,0 +1,35 @@
+import os
+import logging
+import requests
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+def invalidate_backend_cache(year, quarter, source=None):
+    """Tells the FastAPI backend that a quarter was (re)loaded so its cached results
+    for that quarter are dropped. A failure is logged but never fails the load."""
+    backend_url = os.getenv('BACKEND_API_URL')
+    if not backend_url:
+        logger.info("BACKEND_API_URL not set, skipping backend cache invalidation")
+        return False
+
+    params = {'year': year, 'quarter': str(quarter)}
+    if source:
+        params['source'] = source
+
+    try:
+        response = requests.post(
+            f"{backend_url.rstrip('/')}/cache/invalidate",
+            params=params,
+            headers={'X-Admin-Token': os.getenv('CACHE_ADMIN_TOKEN', '')},
+            timeout=10
+        )
+        response.raise_for_status()
+        logger.info(f"Invalidated backend cache for {year}Q{quarter} ({source or 'all sources'}): {response.json()}")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not invalidate backend cache for {year}Q{quarter}: {str(e)}")
+        return False
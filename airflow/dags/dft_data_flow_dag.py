@@ -1,12 +1,18 @@
 from airflow import DAG
-from airflow.operators.python import PythonOperator, BranchPythonOperator
+from airflow.decorators import task, task_group
+from airflow.exceptions import AirflowSkipException
+from airflow.models import Variable
+from airflow.operators.python import PythonOperator
 from airflow.operators.bash import BashOperator
 from datetime import datetime, timedelta
 
-from load_airflow_variables import load_airflow_variables
+from load_airflow_variables import load_quarter_list
+from pipeline_pools import SEC_DOWNLOAD_POOL, SNOWFLAKE_LOAD_POOL
 from web_scrapper import download_quarterly_data
 from zip_ext_and_parq_store import SECDataProcessor
 from s3_data_checker import is_data_present_in_s3
+from backend_cache_notifier import invalidate_backend_cache
+import os
 import subprocess
 
 
@@ -14,43 +20,46 @@ import subprocess
 DBT_PROJECT_DIR = "/opt/airflow/sec_pipeline"
 DBT_PROFILE_DIR = "/opt/airflow/sec_pipeline/profiles"
 
-# **Step 2: Check Data in S3**
-def check_data_and_set_variable(**context):
-    """Checks if data is present in S3 and sets a variable"""
-    year = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_year')
-    quarter = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_quarter')
-    
+# **Step 2: Scrape SEC Data** (skipped when the quarter's data is already in S3)
+@task(pool=SEC_DOWNLOAD_POOL)
+def scrape_sec_data(period):
+    """Fetches one quarter's SEC ZIP file and stores it in S3"""
+    year, quarter = period['year'], period['quarter']
     if is_data_present_in_s3(year, quarter):
-        context['task_instance'].xcom_push(key='run_dbt', value=True)
-    else:
-        context['task_instance'].xcom_push(key='run_dbt', value=False)
-
-def scrape_sec_data(**context):
-    """Fetches SEC ZIP files and stores them in S3"""
-    year = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_year')
-    quarter = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_quarter')
-    download_quarterly_data(year, quarter)
-
-def extract_and_convert(**context):
-    """Extracts SEC ZIP files and converts to Parquet"""
-    year = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_year')
-    quarter = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_quarter')
+        raise AirflowSkipException(f"{year}Q{quarter} is already in S3")
+    if not download_quarterly_data(year, quarter):
+        raise ValueError(f"Download failed for {year}Q{quarter}")
+
+# **Step 3: Extract & Convert Data**
+@task
+def extract_and_convert(period):
+    """Extracts one quarter's SEC ZIP file and converts it to Parquet"""
     processor = SECDataProcessor()
-    processor.extract_zip_file(year, quarter)
-
-def run_dbt_pipeline(**context):
-    """Runs the DBT pipeline using subprocess."""
-    year = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_year')
-    quarter = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_quarter')
-    
-    dbt_command = [
-        "dbt", "run",
-        "--project-dir", "/opt/airflow/sec_pipeline",
-        "--profiles-dir", "/opt/airflow/sec_pipeline/profiles",
-        "--vars", f"{{'year': {year}, 'quarter': {quarter}}}"
-    ]
-    
-    subprocess.run(dbt_command, check=True)
+    processor.extract_zip_file(period['year'], period['quarter'])
+
+# **Step 4: Run DBT Pipeline** (also when the data was already in S3)
+@task(pool=SNOWFLAKE_LOAD_POOL, trigger_rule='none_failed')
+def run_dbt_pipeline(period, dag_run=None):
+    """Runs the quarter's dbt load. Trigger with {"full_refresh": true} to rebuild the
+    incremental fact tables."""
+    full_refresh = bool(dag_run and (dag_run.conf or {}).get('full_refresh'))
+    env = {
+        **os.environ,
+        # Airflow Variable unified_fact_tables=true loads all quarters into single fact tables
+        "UNIFIED_FACT_TABLES": Variable.get('unified_fact_tables', default_var='false'),
+        # dbt deps ran once before the quarters were mapped
+        "SKIP_DBT_DEPS": "true",
+    }
+    subprocess.run(
+        ["bash", f"{DBT_PROJECT_DIR}/run_dbt_pipeline.sh", str(period['year']), str(period['quarter']),
+         'true' if full_refresh else 'false'],
+        env=env, check=True
+    )
+
+@task
+def invalidate_fact_cache(period):
+    """Drops the backend's cached fact table results for the reloaded quarter"""
+    invalidate_backend_cache(period['year'], period['quarter'], 'FACT TABLES')
 
 
 # Default DAG arguments
@@ -70,58 +79,26 @@ dag = DAG(
     catchup=False
 )
 
-task_load_variables = PythonOperator(
-    task_id='load_airflow_variables',
-    python_callable=load_airflow_variables,
-    provide_context=True,
-    dag=dag
-)
-
-
-task_check_data_and_set_variable = PythonOperator(
-    task_id='check_data_and_set_variable',
-    python_callable=check_data_and_set_variable,
-    provide_context=True,
-    dag=dag
-)
-
-task_decide_dbt = BranchPythonOperator(
-    task_id='decide_dbt',
-    python_callable=lambda **context: ['run_dbt_pipeline'] if context['task_instance'].xcom_pull(task_ids='check_data_and_set_variable', key='run_dbt') else ['scrape_sec_data'],
-    provide_context=True,
-    dag=dag
-)
-
-# **Step 3: Scrape SEC Data**
-task_scrape_sec = PythonOperator(
-    task_id='scrape_sec_data',
-    python_callable=scrape_sec_data,
-    provide_context=True,
+# **Step 1: Quarters to process** (run conf, sec_quarters Variable, or sec_year/sec_quarter)
+task_load_quarters = PythonOperator(
+    task_id='load_quarters',
+    python_callable=load_quarter_list,
     dag=dag
 )
 
-# **Step 4: Extract & Convert Data**
-task_extract_convert = PythonOperator(
-    task_id='extract_and_convert',
-    python_callable=extract_and_convert,
-    provide_context=True,
+# dbt packages are installed once, not by every mapped quarter at the same time
+task_dbt_deps = BashOperator(
+    task_id='dbt_deps',
+    bash_command=f"cd {DBT_PROJECT_DIR} && dbt deps --profiles-dir {DBT_PROFILE_DIR}",
     dag=dag
 )
 
-
-task_run_dbt = BashOperator(
-    task_id='run_dbt_pipeline',
-    bash_command=(
-        "bash /opt/airflow/sec_pipeline/run_dbt_pipeline.sh "
-        "{{ ti.xcom_pull(task_ids='load_airflow_variables', key='sec_year') }} "
-        "{{ ti.xcom_pull(task_ids='load_airflow_variables', key='sec_quarter') }}"
-    ),
-    dag=dag
-)
+# One scrape -> extract -> dbt -> cache invalidation chain per quarter
+@task_group(group_id='process_quarter')
+def process_quarter(period):
+    (scrape_sec_data(period) >> extract_and_convert(period) >> run_dbt_pipeline(period)
+     >> invalidate_fact_cache(period))
 
 # Set Task Dependencies
-task_load_variables >> task_check_data_and_set_variable
-task_check_data_and_set_variable >> task_decide_dbt
-task_decide_dbt >> task_run_dbt
-task_decide_dbt >> task_scrape_sec
-task_scrape_sec >> task_extract_convert >> task_run_dbt
\ No newline at end of file
+with dag:
+    task_load_quarters >> task_dbt_deps >> process_quarter.expand(period=task_load_quarters.output)
@@ -1,197 +1,304 @@
 import boto3
 import os
 import io
-import zipfile
 import ujson  
 import pandas as pd
+import pyarrow.dataset as ds
+from pyarrow import fs
 import gc  # Force garbage collection
 from datetime import datetime
 from dotenv import load_dotenv
 
+from zip_ext_and_parq_store import SECDataProcessor
+
 # Load environment variables
 load_dotenv()
 
 # AWS S3 details
 S3_BUCKET_NAME = os.getenv('AWS_S3_BUCKET_NAME')
-RAW_PREFIX = 'raw/'
-
-# Chunk size for reading large CSV files
-CHUNK_SIZE = 1000000
+EXTRACTED_PREFIX = 'extracted/'
+JSON_PREFIX = 'JSON_Conversion/'
+# Kept apart from JSON_Conversion/ so the Snowflake COPY never picks them up
+MANIFEST_PREFIX = 'JSON_Manifests/'
 
 # ---------------------------
 # Optimized S3 Upload
 # ---------------------------
-def upload_to_s3(file_data, s3_path):
+def upload_to_s3(file_data, s3_path, s3_client=None):
     """
     Upload JSON directly to S3 in correct folder structure (JSON_conversion/2024/q1/filename.json).
     """
-    s3_client = boto3.client('s3')
+    s3_client = s3_client or boto3.client('s3')
     s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=s3_path, Body=file_data)
     print(f"✅ Uploaded JSON: {s3_path}")
 
+# ---------------------------
+# Sharding
+# ---------------------------
+def adsh_range(lo=None, hi=None):
+    """
+    Filter on lo <= adsh < hi, open ended where lo or hi is None.
+    """
+    bounds = []
+    if lo is not None:
+        bounds.append(ds.field('adsh') >= lo)
+    if hi is not None:
+        bounds.append(ds.field('adsh') < hi)
+    if not bounds:
+        return None
+    return bounds[0] & bounds[1] if len(bounds) == 2 else bounds[0]
+
+
+def plan_json_shards(year, quarter, shard_count):
+    """
+    Shard work items of one quarter, as [{"year", "quarter", "shard", "shard_count",
+    "lo", "hi"}, ...]. Each shard holds a contiguous adsh range, cut at quantiles of
+    the quarter's sorted sub.adsh: the parsed files are sorted by adsh, so a shard's
+    rows sit in a few row groups and the others are skipped on their statistics.
+    """
+    shard_count = max(int(shard_count), 1)
+    dfSub = read_filtered(parsed_dataset(parsed_quarter_filesystem(), year, quarter, 'sub'), ['adsh'])
+    adshs = sorted(dfSub['adsh'].dropna().unique())
+    # Shards past the number of submissions get an empty range
+    cuts = [None] + [adshs[len(adshs) * shard // shard_count] if adshs else None
+                     for shard in range(1, shard_count)] + [None]
+    return [{"year": int(year), "quarter": int(quarter), "shard": shard, "shard_count": shard_count,
+             "lo": cuts[shard], "hi": cuts[shard + 1]}
+            for shard in range(shard_count)]
+
+
+def shard_manifest_key(year, quarter, shard, shard_count):
+    return f"{MANIFEST_PREFIX}{year}/q{quarter}/shard-{shard:04d}-of-{shard_count:04d}.json"
+
+
+def quarter_manifest_key(year, quarter):
+    return f"{MANIFEST_PREFIX}{year}/q{quarter}/manifest.json"
+
+# ---------------------------
+# Shard Readers
+# ---------------------------
+def parsed_quarter_filesystem():
+    """
+    S3 as a pyarrow filesystem, so the shard readers fetch byte ranges of the columns
+    they read instead of whole files. Row groups are skipped only where the filter can
+    be checked against their statistics, i.e. on adsh, which the files are sorted by.
+    """
+    region = os.getenv('AWS_DEFAULT_REGION')
+    return fs.S3FileSystem(region=region) if region else fs.S3FileSystem()
+
+
+def parsed_dataset(filesystem, year, quarter, file_type):
+    """
+    One of the quarter's parsed Parquet files ({sub,num,pre,tag}.parquet) in S3.
+    """
+    return ds.dataset(f"{S3_BUCKET_NAME}/{EXTRACTED_PREFIX}{year}Q{quarter}/{file_type}.parquet",
+                      filesystem=filesystem, format='parquet')
+
+
+def read_filtered(dataset, columns, filter=None):
+    """
+    Rows of a parsed Parquet file matching filter (all rows without one). Only the
+    columns asked for are read, and row groups whose statistics rule out the filter
+    are skipped. Plain NumPy/object columns come back, not the nullable dtypes
+    SECDataProcessor wrote.
+    """
+    return dataset.to_table(columns=columns, filter=filter).to_pandas(ignore_metadata=True)
+
+
+def read_tag_labels(dataset, tags):
+    """
+    First tag.txt documentation of each tag the shard uses. tag.parquet has no adsh,
+    so every row group of its tag and doc columns is read.
+    """
+    if not tags:
+        return {}
+    dfTag = read_filtered(dataset, ['tag', 'doc'], ds.field('tag').isin(sorted(tags)))
+    return dict(dfTag.drop_duplicates('tag')[['tag', 'doc']].itertuples(index=False))
+
+
+def read_ticker_symbols(s3_client):
+    """
+    cik -> symbol from the ticker file (stored under bucket "scrapedata").
+    """
+    obj = s3_client.get_object(Bucket="scrapedata", Key="ticker.txt")
+    dfSym = pd.read_csv(
+        io.BytesIO(obj['Body'].read()),
+        delimiter="\t",
+        header=None,
+        names=['symbol', 'cik']
+    )
+    return dict(zip(dfSym['cik'], dfSym['symbol']))
+
 # ---------------------------
 # JSON Processing Worker
 # ---------------------------
-def process_submission(adsh, cik, period, fp, fy, name, countryma, cityma, zip_path, year, quarter):
+def build_submission_json(sub, num_rows, pre_lookup, tag_labels, symbols):
     """
-    Unzips, converts to JSON, and uploads to S3.
+    JSON document of one submission, or None when its period is missing or invalid.
+    Missing text values read from the parsed files are None: quarter, country and city
+    become "UNKNOWN", the other fields JSON null (they used to be NaN from the TSV reader).
     """
+    if pd.isna(sub.period):
+        print(f"⚠ Skipping {sub.adsh}: NaN period")
+        return None
+
     try:
-        print(f"✅ Processing: {adsh}")
-
-        # Open the ZIP file and read the files using chunking
-        with zipfile.ZipFile(zip_path, 'r') as myzip:
-            # Read num.txt in chunks (iterator)
-            dfNum_iter = pd.read_csv(
-                myzip.open('num.txt'),
-                delimiter="\t",
-                low_memory=False,
-                chunksize=CHUNK_SIZE
-            )
-            # For pre.txt and tag.txt, load chunks into lists so we can iterate repeatedly
-            dfPre_chunks = list(pd.read_csv(
-                myzip.open('pre.txt'),
-                delimiter="\t",
-                low_memory=False,
-                chunksize=CHUNK_SIZE
-            ))
-            dfTag_chunks = list(pd.read_csv(
-                myzip.open('tag.txt'),
-                delimiter="\t",
-                low_memory=False,
-                chunksize=CHUNK_SIZE
-            ))
-
-        # Fetch ticker file from S3 (assuming the ticker file is stored under bucket "scrapedata")
-        s3_client = boto3.client('s3')
-        obj = s3_client.get_object(Bucket="scrapedata", Key="ticker.txt")
-        dfSym = pd.read_csv(
-            io.BytesIO(obj['Body'].read()),
-            delimiter="\t",
-            header=None,
-            names=['symbol', 'cik']
-        )
+        period_str = str(int(float(sub.period)))
+        start_date = datetime.strptime(period_str, "%Y%m%d").strftime("%Y-%m-%d")
+        end_date = start_date
+    except Exception:
+        print(f"⚠ Skipping {sub.adsh}: Invalid period")
+        return None
 
+    # Build base JSON structure
+    financials_data = {
+        "quarter": str(sub.fp) if sub.fp is not None else "UNKNOWN",
+        "country": sub.countryma if sub.countryma else "UNKNOWN",
+        "data": {"bs": [], "cf": [], "ic": []},
+        "year": int(sub.fy) if not pd.isna(sub.fy) else 0,
+        "name": sub.name,
+        "startDate": start_date,
+        "endDate": end_date,
         # Get symbol using cik from ticker file; default to "UNKNOWN" if not found
-        symbol_info = dfSym.loc[dfSym["cik"] == cik, "symbol"]
-        symbol = symbol_info.iloc[0] if not symbol_info.empty else "UNKNOWN"
+        "symbol": symbols.get(sub.cik, "UNKNOWN"),
+        "city": sub.cityma if sub.cityma else "UNKNOWN"
+    }
+
+    for tag, uom, value in num_rows:
+        # Info and statement type come from the submission's first pre.txt row for the tag
+        info, stmt_type = pre_lookup.get((sub.adsh, tag), ("Unknown", "UNKNOWN"))
+        element = {
+            "label": tag_labels.get(tag, "Unknown"),
+            "concept": tag,
+            "info": info,
+            "unit": uom,
+            "value": value if not pd.isna(value) else 0
+        }
+
+        # Append the element into the correct statement category
+        if stmt_type == "BS":
+            financials_data["data"]["bs"].append(element)
+        elif stmt_type == "CF":
+            financials_data["data"]["cf"].append(element)
+        elif stmt_type in ["IC", "IS"]:
+            financials_data["data"]["ic"].append(element)
+
+    return financials_data
+
+
+def parsed_quarter_checksum(year, quarter):
+    """
+    Checksum of the ZIP the quarter's parsed Parquet files were built from.
+    """
+    source_id = f"{year}Q{quarter}"
+    manifest = SECDataProcessor().parsed_quarter_manifest(source_id)
+    if manifest is None:
+        raise FileNotFoundError(f"{source_id} has not been parsed yet, run extract_zip_file first")
+    print(f"🔹 Reading parsed {source_id} (ZIP sha256 {manifest['zip_sha256']})")
+    return manifest['zip_sha256']
+
+
+def convert_json_shard(year, quarter, shard, shard_count, lo=None, hi=None):
+    """
+    Converts the submissions with lo <= adsh < hi (one shard of a quarter, see
+    plan_json_shards) to JSON and uploads them, then writes the shard's manifest.
+    Reads the quarter's parsed Parquet files in S3, not the ZIP, and never downloads
+    them whole: only the columns used, and of sub, num and pre only the row groups
+    whose adsh statistics overlap the shard's range (tag is read in full).
+    """
+    s3_client = boto3.client('s3')
+    zip_sha256 = parsed_quarter_checksum(year, quarter)
+    filesystem = parsed_quarter_filesystem()
+
+    shard_rows = adsh_range(lo, hi)
+    dfSub = read_filtered(parsed_dataset(filesystem, year, quarter, 'sub'),
+                          ['adsh', 'cik', 'name', 'period', 'fp', 'fy', 'countryma', 'cityma'], shard_rows)
+    print(f"🔹 Shard {shard + 1}/{shard_count} of {year}Q{quarter} [{lo}, {hi}): {len(dfSub)} submissions")
 
-        if pd.isna(period):
-            print(f"⚠ Skipping {adsh}: NaN period")
-            return
+    dfNum = read_filtered(parsed_dataset(filesystem, year, quarter, 'num'), ['adsh', 'tag', 'uom', 'value'],
+                          shard_rows)
+    dfPre = read_filtered(parsed_dataset(filesystem, year, quarter, 'pre'), ['adsh', 'tag', 'stmt', 'plabel'],
+                          shard_rows)
+    tag_labels = read_tag_labels(parsed_dataset(filesystem, year, quarter, 'tag'), set(dfNum['tag']))
 
+    pre_lookup = {(adsh, tag): (plabel, stmt) for adsh, tag, stmt, plabel
+                  in dfPre.drop_duplicates(['adsh', 'tag']).itertuples(index=False)}
+    num_by_adsh = {adsh: list(rows[['tag', 'uom', 'value']].itertuples(index=False, name=None))
+                   for adsh, rows in dfNum.groupby('adsh', sort=False)}
+    symbols = read_ticker_symbols(s3_client)
+    del dfPre, dfNum
+    gc.collect()
+
+    manifest = {"year": int(year), "quarter": int(quarter), "shard": shard, "shard_count": shard_count,
+                "lo": lo, "hi": hi, "zip_sha256": zip_sha256, "submissions": len(dfSub), "files": [], "skipped": [], "failed": []}
+    for sub in dfSub.itertuples(index=False):
         try:
-            period_str = str(int(float(period)))
-            start_date = datetime.strptime(period_str, "%Y%m%d").strftime("%Y-%m-%d")
-            end_date = start_date
-        except Exception:
-            print(f"⚠ Skipping {adsh}: Invalid period")
-            return
-
-        # Build base JSON structure
-        financials_data = {
-            "quarter": str(fp),
-            "country": countryma if countryma else "UNKNOWN",
-            "data": {"bs": [], "cf": [], "ic": []},
-            "year": int(fy) if not pd.isna(fy) else 0,
-            "name": name,
-            "startDate": start_date,
-            "endDate": end_date,
-            "symbol": symbol,
-            "city": cityma if cityma else "UNKNOWN"
-        }
+            financials_data = build_submission_json(sub, num_by_adsh.get(sub.adsh, []), pre_lookup,
+                                                    tag_labels, symbols)
+            if financials_data is None:
+                manifest["skipped"].append(sub.adsh)
+                continue
+            # Correct folder structure (JSON_Conversion/2024/q1/filename.json)
+            s3_path_out = f"{JSON_PREFIX}{year}/q{quarter}/{sub.adsh}.json"
+            upload_to_s3(ujson.dumps(financials_data), s3_path_out, s3_client)
+            manifest["files"].append(s3_path_out)
+        except Exception as ex:
+            print(f"❌ Error processing {sub.adsh}: {str(ex)}")
+            manifest["failed"].append(sub.adsh)
 
-        # Process dfNum in chunks
-        for df_chunk in dfNum_iter:
-            dfNumFiltered = df_chunk[df_chunk['adsh'] == adsh]
-            for _, row in dfNumFiltered.iterrows():
-                # Find label from dfTag (search in each chunk)
-                label = "Unknown"
-                for df_tag in dfTag_chunks:
-                    if row["tag"] in df_tag["tag"].values:
-                        label = df_tag.loc[df_tag["tag"] == row["tag"], "doc"].values[0]
-                        break
-
-                # Find info and statement type from dfPre (search in each chunk)
-                info = "Unknown"
-                stmt_type = "UNKNOWN"
-                for df_pre in dfPre_chunks:
-                    pre_filtered = df_pre[(df_pre["adsh"] == adsh) & (df_pre["tag"] == row["tag"])]
-                    if not pre_filtered.empty:
-                        info = pre_filtered["plabel"].values[0]
-                        stmt_type = pre_filtered["stmt"].values[0]
-                        break
-
-                element = {
-                    "label": label,
-                    "concept": row["tag"],
-                    "info": info,
-                    "unit": row["uom"],
-                    "value": row["value"] if not pd.isna(row["value"]) else 0
-                }
-
-                # Append the element into the correct statement category
-                if stmt_type == "BS":
-                    financials_data["data"]["bs"].append(element)
-                elif stmt_type == "CF":
-                    financials_data["data"]["cf"].append(element)
-                elif stmt_type in ["IC", "IS"]:
-                    financials_data["data"]["ic"].append(element)
-
-        # Convert the financials_data dict to a JSON string
-        json_str = ujson.dumps(financials_data)
-
-        # Correct folder structure (JSON_Conversion/2024/q1/filename.json)
-        s3_path_out = f"JSON_Conversion/{year}/q{quarter}/{adsh}.json"
-
-        # Upload JSON directly to S3
-        upload_to_s3(json_str, s3_path_out)
-
-        # Free memory if needed
-        del dfNum_iter, dfPre_chunks, dfTag_chunks, dfSym
-        gc.collect()
-
-    except Exception as ex:
-        print(f"❌ Error processing {adsh}: {str(ex)}")
+    upload_to_s3(ujson.dumps(manifest), shard_manifest_key(year, quarter, shard, shard_count), s3_client)
+    print(f"✅ Shard {shard + 1}/{shard_count}: {len(manifest['files'])} JSON files, "
+          f"{len(manifest['skipped'])} skipped, {len(manifest['failed'])} failed")
+    return {"shard": shard, "submissions": manifest["submissions"], "files": len(manifest["files"]),
+            "skipped": len(manifest["skipped"]), "failed": len(manifest["failed"])}
 
-# ---------------------------
-# Extract, Convert & Upload JSON Sequentially
-# ---------------------------
-def extract_and_convert_to_json(year, quarter):
-    """Processes SEC reports sequentially."""
-    zip_key = f"{RAW_PREFIX}{year}_Q{quarter}.zip"
-    print(f"🔹 Downloading ZIP file from S3: {zip_key}")
 
+def merge_json_manifests(year, quarter, shard_count):
+    """
+    Combines the shard manifests of a quarter into its manifest.json. Fails when a
+    shard has not reported, so the quarter is never loaded half converted.
+    """
     s3_client = boto3.client('s3')
-    zip_obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=zip_key)
-    zip_path = f"{year}_Q{quarter}.zip"
-
-    with open(zip_path, "wb") as f:
-        f.write(zip_obj['Body'].read())
-
-    # Read submission file from the ZIP
-    with zipfile.ZipFile(zip_path, 'r') as myzip:
-        dfSub = pd.read_csv(myzip.open('sub.txt'), delimiter="\t", low_memory=False)
-
-    # Limit the number of files processed for testing (adjust as needed)
-    # dfSub = dfSub.head(5)
-
-    # Process each submission one after the other
-    for _, row in dfSub.iterrows():
-        process_submission(
-            row.adsh,
-            row.cik,
-            row.period,
-            row.fp,
-            row.fy,
-            row["name"],    # Use row["name"] to get the company name
-            row.countryma,
-            row.cityma,
-            zip_path,
-            year,
-            quarter
-        )
+    merged = {"year": int(year), "quarter": int(quarter), "shard_count": int(shard_count),
+              "zip_sha256": None, "submissions": 0, "files": [], "skipped": [], "failed": []}
+    missing, ranges = [], []
+    for shard in range(int(shard_count)):
+        try:
+            obj = s3_client.get_object(Bucket=S3_BUCKET_NAME,
+                                       Key=shard_manifest_key(year, quarter, shard, int(shard_count)))
+        except s3_client.exceptions.NoSuchKey:
+            missing.append(shard)
+            continue
+        manifest = ujson.loads(obj['Body'].read())
+        # Every shard must come from the same parse of the quarter
+        if merged["zip_sha256"] not in (None, manifest.get("zip_sha256")):
+            raise ValueError(f"JSON shards of {year}Q{quarter} were built from different ZIPs, rerun the conversion")
+        ranges.append((manifest.get("lo"), manifest.get("hi")))
+        merged["zip_sha256"] = manifest.get("zip_sha256")
+        merged["submissions"] += manifest["submissions"]
+        for key in ("files", "skipped", "failed"):
+            merged[key].extend(manifest[key])
+    if missing:
+        raise ValueError(f"Missing JSON shard manifests for {year}Q{quarter}: shards {missing}")
+    # ... and from the same plan, each adsh range starting where the previous one ended
+    if any(prev[1] != nxt[0] for prev, nxt in zip(ranges, ranges[1:])):
+        raise ValueError(f"JSON shards of {year}Q{quarter} were planned differently, rerun the conversion")
 
+    merged["files"].sort()
+    upload_to_s3(ujson.dumps(merged), quarter_manifest_key(year, quarter), s3_client)
+    print(f"✅ {year}Q{quarter}: {len(merged['files'])} JSON files from {shard_count} shards, "
+          f"{len(merged['skipped'])} skipped, {len(merged['failed'])} failed")
+    return {"files": len(merged["files"]), "skipped": len(merged["skipped"]), "failed": len(merged["failed"])}
+
+# ---------------------------
+# Extract, Convert & Upload JSON Sequentially
+# ---------------------------
+def extract_and_convert_to_json(year, quarter, shard_count=1):
+    """Processes a quarter's SEC reports shard after shard on this worker."""
+    SECDataProcessor().extract_zip_file(year, quarter)
+    for work in plan_json_shards(year, quarter, shard_count):
+        convert_json_shard(**work)
+    merge_json_manifests(year, quarter, shard_count)
     print("✅ All JSON files processed and uploaded.")
 
 if __name__ == "__main__":
@@ -1,15 +1,20 @@
 from airflow import DAG
+from airflow.decorators import task, task_group
+from airflow.models import Variable
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
-from airflow.models import Variable
 import os
 import snowflake.connector
 from dotenv import load_dotenv
 
 # Import your processing functions
+from load_airflow_variables import load_quarter_list
+from pipeline_pools import SEC_DOWNLOAD_POOL, SNOWFLAKE_LOAD_POOL
 from sec_data_scrapper import download_quarterly_data
-from ext_zip_convert_into_json_store import extract_and_convert_to_json
-from load_json_data_snowflake import load_json_data_to_snowflake, get_latest_s3_folder, create_views
+from zip_ext_and_parq_store import SECDataProcessor
+from ext_zip_convert_into_json_store import plan_json_shards, convert_json_shard, merge_json_manifests
+from load_json_data_snowflake import load_json_data_to_snowflake, create_views, setup_json_stage
+from backend_cache_notifier import invalidate_backend_cache
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +28,10 @@ default_args = {
     'retry_delay': timedelta(minutes=5),
 }
 
+# Shards per quarter. Airflow cannot map a task inside a mapped task group, so each
+# quarter's group has this many shard tasks, fixed when the DAG file is parsed
+JSON_SHARD_COUNT = max(int(Variable.get("json_shard_count", default_var=8)), 1)
+
 dag = DAG(
     'json_data_pipeline_v1',
     default_args=default_args,
@@ -31,62 +40,84 @@ dag = DAG(
     catchup=False
 )
 
-# Step 1: Scrape SEC Data
-def scrape_sec_data(**kwargs):
+# Step 0: Quarters to process (run conf, sec_quarters Variable, or sec_year/sec_quarter)
+task_load_quarters = PythonOperator(
+    task_id='load_quarters',
+    python_callable=load_quarter_list,
+    dag=dag
+)
+
+# Step 1: Snowflake objects shared by every quarter (storage integration, stage)
+@task
+def setup_snowflake_stage():
     """
-    Fetches SEC ZIP files from the SEC website and stores them in S3.
-    Reads the year and quarter from Airflow Variables.
+    Creates the storage integration and JSON stage once, before any quarter loads,
+    so parallel loads never replace them under each other.
     """
-    year = int(Variable.get("sec_year", default_var=2023))
-    quarter = int(Variable.get("sec_quarter", default_var=1))
-    download_quarterly_data(year, quarter)
+    setup_json_stage()
 
-task_scrape_sec = PythonOperator(
-    task_id='scrape_sec_data',
-    python_callable=scrape_sec_data,
-    dag=dag
-)
+# Step 2: Scrape SEC Data
+@task(pool=SEC_DOWNLOAD_POOL)
+def scrape_sec_data(period):
+    """
+    Fetches one quarter's SEC ZIP file from the SEC website and stores it in S3.
+    """
+    if not download_quarterly_data(period['year'], period['quarter']):
+        raise ValueError(f"Download failed for {period['year']}Q{period['quarter']}")
 
-# Step 2: Extract & Convert Data to JSON
-def extract_and_convert_json(**kwargs):
+# Step 3: Parse the quarter's ZIP into the shared Parquet files
+@task
+def parse_quarter(period):
     """
-    Extracts SEC ZIP files and converts them to JSON.
-    Reads the year and quarter from Airflow Variables.
+    Parses one quarter's SEC ZIP file into extracted/<year>Q<quarter>/, the same
+    typed Parquet files the raw and dbt pipelines load. Reused as they are when the
+    ZIP has not changed since they were written.
     """
-    year = int(Variable.get("sec_year", default_var=2023))
-    quarter = int(Variable.get("sec_quarter", default_var=1))
-    extract_and_convert_to_json(year, quarter)
+    SECDataProcessor().extract_zip_file(period['year'], period['quarter'])
 
-task_extract_convert_json = PythonOperator(
-    task_id='extract_and_convert_json',
-    python_callable=extract_and_convert_json,
-    dag=dag
-)
+# Step 4: Split the quarter into adsh shards
+@task
+def plan_shards(period):
+    """
+    One work item per shard of the quarter, each a contiguous adsh range.
+    """
+    return plan_json_shards(period['year'], period['quarter'], JSON_SHARD_COUNT)
 
-# Step 3: Load JSON Data into Snowflake
-def load_json_snowflake(**kwargs):
+# Step 5: Convert one shard of the quarter to JSON
+@task
+def extract_and_convert_json(shards, shard):
     """
-    Loads JSON data (assumed to be stored in S3) into Snowflake.
+    Converts the submissions of one adsh range of a quarter to JSON.
     """
-    load_json_data_to_snowflake()
+    return convert_json_shard(**shards[shard])
 
-task_load_json_snowflake = PythonOperator(
-    task_id='load_json_snowflake',
-    python_callable=load_json_snowflake,
-    dag=dag
-)
+# Step 6: Merge the quarter's shard manifests
+@task
+def merge_manifests(shards):
+    """
+    Checks every shard of the quarter reported and writes the quarter's manifest.
+    """
+    return merge_json_manifests(shards[0]['year'], shards[0]['quarter'], len(shards))
+
+# Step 7: Load JSON Data into Snowflake
+@task(pool=SNOWFLAKE_LOAD_POOL)
+def load_json_snowflake(period):
+    """
+    Loads one quarter's JSON data (stored in S3) into Snowflake.
+    """
+    load_json_data_to_snowflake(period['year'], period['quarter'])
 
-# Step 4: Create Views in Snowflake
-def create_views_in_snowflake_task(**kwargs):
+# Step 8: Create Views in Snowflake
+@task(pool=SNOWFLAKE_LOAD_POOL)
+def create_views_in_snowflake(period):
     """
-    Opens a new Snowflake connection, retrieves the latest year and quarter,
-    builds the dynamic table name, and calls the existing create_views function.
+    Opens a new Snowflake connection, builds the quarter's table name, and calls
+    the existing create_views function.
     """
-    # Retrieve latest year and quarter using your helper function.
-    latest_year, latest_quarter = get_latest_s3_folder()
+    year, quarter = period['year'], f"q{period['quarter']}"
     SCHEMA_NAME = os.getenv('SCHEMA_NAME', 'SEC_JSON_DATA')
-    table_name = f"{SCHEMA_NAME}.sec_data_{latest_year}_{latest_quarter}"
-    
+    table_name = f"{SCHEMA_NAME}.sec_data_{year}_{quarter}"
+
     # Open a new Snowflake connection.
     ctx = snowflake.connector.connect(
         user=os.getenv('SNOWFLAKE_USER'),
@@ -99,24 +130,44 @@ def create_views_in_snowflake_task(**kwargs):
         # Set active schema.
         ctx.cursor().execute(f"USE SCHEMA {SCHEMA_NAME};")
         # Directly call the existing create_views function.
-        create_views(ctx, table_name, latest_year, latest_quarter)
+        create_views(ctx, table_name, year, quarter)
     finally:
         ctx.close()
+    invalidate_backend_cache(year, period['quarter'], 'JSON')
 
-task_create_views = PythonOperator(
-    task_id='create_views',
-    python_callable=create_views_in_snowflake_task,
-    dag=dag
-)
+# One scrape -> parse -> shards -> merge -> load -> create views chain per quarter, so
+# a slow quarter holds back only itself; the pools bound how many quarters download
+# or load at the same time
+@task_group(group_id='process_quarter')
+def process_quarter(period):
+    shards = plan_shards(period)
+    scrape_sec_data(period) >> parse_quarter(period) >> shards
+    converted = [extract_and_convert_json.override(task_id=f'extract_and_convert_json_{shard}')(shards, shard)
+                 for shard in range(JSON_SHARD_COUNT)]
+    converted >> merge_manifests(shards) >> load_json_snowflake(period) >> create_views_in_snowflake(period)
 
-# Set Task Dependencies: scrape -> extract/convert -> load -> create views.
-task_scrape_sec >> task_extract_convert_json >> task_load_json_snowflake >> task_create_views
+with dag:
+    setup_snowflake_stage() >> process_quarter.expand(period=task_load_quarters.output)
 
 dag.doc_md = """
 ### JSON Data Ingestion Pipeline
-This DAG handles:
-1. Scraping SEC data (ZIP files) based on the SEC year and quarter stored in Airflow Variables.
-2. Extracting and converting the ZIP files to JSON.
-3. Loading the JSON data into Snowflake.
-4. Creating views in Snowflake based on the loaded table.
+This DAG creates the Snowflake storage integration and JSON stage once, then runs
+one mapped task group per quarter of the run:
+1. Scraping SEC data (ZIP files).
+2. Parsing the ZIP files into the shared Parquet files under `extracted/` (skipped
+   when the ZIP checksum matches the last parse).
+3. Converting the parsed quarter to JSON, one task per adsh shard
+   (`json_shard_count` Variable, default 8, read when the DAG is parsed). Each shard
+   is a contiguous adsh range and reads only the row groups of sub, num and pre that
+   overlap it.
+4. Merging the shard manifests into `JSON_Manifests/<year>/q<quarter>/manifest.json`.
+5. Loading the JSON data into Snowflake.
+6. Creating views in Snowflake based on the loaded table.
+
+Quarters come from the run conf (`{"quarters": ["2023Q1", "2023Q2"]}` or
+`{"start": "2010Q1", "end": "2024Q4"}`), the `sec_quarters` Variable
+(`2010Q1-2024Q4`), or the single `sec_year` / `sec_quarter` Variables. Each quarter
+moves through its own group, so a slow quarter holds back only itself; the
+`sec_downloads` and `snowflake_loads` pools bound how many quarters download or load
+at once.
 """
@@ -1,9 +1,70 @@
+import re
 from airflow.models import Variable
 
+QUARTER_PATTERN = re.compile(r"^\s*(\d{4})\s*Q?([1-4])\s*$", re.IGNORECASE)
+
 
 def load_airflow_variables(**context):
     """Loads SEC year & quarter and pushes them to XCom"""
     year = Variable.get('sec_year', default_var=2023)  # Default to 2023 if not set
     quarter = Variable.get('sec_quarter', default_var=1)  # Default to 1 if not set
     context['task_instance'].xcom_push(key='sec_year', value=year)
-    context['task_instance'].xcom_push(key='sec_quarter', value=quarter)
\ No newline at end of file
+    context['task_instance'].xcom_push(key='sec_quarter', value=quarter)
+
+
+def parse_quarter(value):
+    """(year, quarter) of "2023Q1" / "2023 Q1" / "20231" """
+    match = QUARTER_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid quarter: {value!r}, expected e.g. 2023Q1")
+    return int(match.group(1)), int(match.group(2))
+
+
+def quarter_range(start, end):
+    """Every quarter from start to end, both included"""
+    year, quarter = parse_quarter(start)
+    end_year, end_quarter = parse_quarter(end)
+    quarters = []
+    while (year, quarter) <= (end_year, end_quarter):
+        quarters.append((year, quarter))
+        year, quarter = (year + 1, 1) if quarter == 4 else (year, quarter + 1)
+    return quarters
+
+
+def parse_quarter_spec(spec):
+    """Quarters of a spec string: a range "2010Q1-2024Q4", a list "2023Q1,2023Q3", or both mixed"""
+    quarters = []
+    for part in str(spec).split(","):
+        if not part.strip():
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            quarters.extend(quarter_range(start, end))
+        else:
+            quarters.append(parse_quarter(part))
+    return quarters
+
+
+def load_quarter_list(**context):
+    """Quarters a DAG run processes, as [{"year": 2023, "quarter": 1}, ...] for task mapping.
+
+    Taken from the first of:
+      - the run conf: {"quarters": ["2023Q1", ...]} or {"start": "2010Q1", "end": "2024Q4"}
+      - the sec_quarters Variable: "2010Q1-2024Q4" or "2023Q1,2023Q3"
+      - the single quarter in the sec_year / sec_quarter Variables
+    """
+    conf = (context.get('dag_run').conf if context.get('dag_run') else None) or {}
+    if conf.get('quarters'):
+        quarters = [parse_quarter(value) for value in conf['quarters']]
+    elif conf.get('start'):
+        quarters = quarter_range(conf['start'], conf.get('end', conf['start']))
+    elif Variable.get('sec_quarters', default_var=''):
+        quarters = parse_quarter_spec(Variable.get('sec_quarters'))
+    else:
+        quarters = [(int(Variable.get('sec_year', default_var=2023)), int(Variable.get('sec_quarter', default_var=1)))]
+
+    quarters = sorted(set(quarters))
+    if not quarters:
+        raise ValueError("No quarters to process")
+    print(f"Processing {len(quarters)} quarters: {', '.join(f'{y}Q{q}' for y, q in quarters)}")
+    return [{"year": year, "quarter": quarter} for year, quarter in quarters]
@@ -4,6 +4,8 @@ import logging
 import boto3
 from dotenv import load_dotenv
 
+from snowflake_s3_integration import STORAGE_INTEGRATION, create_storage_integration
+
 # Load environment variables
 load_dotenv()
 
@@ -27,6 +29,42 @@ AWS_S3_BUCKET_NAME  = os.getenv('AWS_S3_BUCKET_NAME')
 # Initialize S3 Client
 s3_client = boto3.client('s3')
 
+# One stage over JSON_Conversion/ for every quarter, created once by setup_json_stage
+JSON_STAGE_NAME = "sec_json_stage"
+
+def connect_snowflake():
+    return snowflake.connector.connect(
+        user=SNOWFLAKE_USER,
+        password=SNOWFLAKE_PASSWORD,
+        account=SNOWFLAKE_ACCOUNT,
+        warehouse=SNOWFLAKE_WAREHOUSE,
+        database=SNOWFLAKE_DATABASE
+    )
+
+def setup_json_stage():
+    """
+    Creates the storage integration and the JSON stage the quarters load through.
+    Runs once, before the quarters' loads start: nothing is replaced, so a load
+    running at the same time never loses its stage mid-COPY.
+    """
+    ctx = connect_snowflake()
+    cs = ctx.cursor()
+    try:
+        cs.execute(f"USE SCHEMA {SCHEMA_NAME};")
+        logger.info("🔹 Creating storage integration...")
+        create_storage_integration(cs)
+        logger.info("🔹 Creating external stage...")
+        cs.execute(f"""
+        CREATE STAGE IF NOT EXISTS {JSON_STAGE_NAME}
+            STORAGE_INTEGRATION = {STORAGE_INTEGRATION}
+            URL = 's3://{AWS_S3_BUCKET_NAME}/JSON_Conversion/'
+            FILE_FORMAT = (TYPE = 'JSON');
+        """)
+        logger.info(f"✅ Stage {JSON_STAGE_NAME} ready.")
+    finally:
+        cs.close()
+        ctx.close()
+
 def get_latest_s3_folder():
     """
     Fetch the latest available year and quarter folder in S3.
@@ -73,25 +111,23 @@ def get_all_json_files(latest_year, latest_quarter):
     return json_files
 
 # --- Data Loading Function ---
-def load_json_data_to_snowflake():
+def load_json_data_to_snowflake(year=None, quarter=None):
+    """Loads one quarter's JSON files into Snowflake; the latest quarter in S3 when
+    year and quarter are not given."""
     try:
-        # Get latest S3 folder details
-        latest_year, latest_quarter = get_latest_s3_folder()
+        # Quarter folders are named q1..q4
+        if year is not None and quarter is not None:
+            latest_year, latest_quarter = str(year), f"q{quarter}"
+        else:
+            latest_year, latest_quarter = get_latest_s3_folder()
         json_files = get_all_json_files(latest_year, latest_quarter)
 
-        # Build dynamic names for table and stage.
+        # Build dynamic name for the table.
         # Expected table naming convention: <SCHEMA_NAME>.sec_data_<latest_year>_<latest_quarter>
         table_name = f"{SCHEMA_NAME}.sec_data_{latest_year}_{latest_quarter}"
-        stage_name = f"sec_data_{latest_year}_{latest_quarter}"  # for external stage
 
         # Connect to Snowflake
-        ctx = snowflake.connector.connect(
-            user=SNOWFLAKE_USER,
-            password=SNOWFLAKE_PASSWORD,
-            account=SNOWFLAKE_ACCOUNT,
-            warehouse=SNOWFLAKE_WAREHOUSE,
-            database=SNOWFLAKE_DATABASE
-        )
+        ctx = connect_snowflake()
         cs = ctx.cursor()
         logger.info("✅ Successfully connected to Snowflake.")
 
@@ -99,28 +135,6 @@ def load_json_data_to_snowflake():
         logger.info("🔹 Setting active schema...")
         cs.execute(f"USE SCHEMA {SCHEMA_NAME};")
 
-        # Create Storage Integration
-        logger.info("🔹 Creating storage integration...")
-        CREATE_STORAGE_INTEGRATION_SQL = f"""
-        CREATE OR REPLACE STORAGE INTEGRATION Snowflake_AWS_OBJ
-            TYPE = EXTERNAL_STAGE
-            STORAGE_PROVIDER = 'S3'
-            ENABLED = TRUE
-            STORAGE_AWS_ROLE_ARN = '{AWS_ROLE_ARN}'
-            STORAGE_ALLOWED_LOCATIONS = ('s3://{AWS_S3_BUCKET_NAME}/JSON_Conversion/');
-        """
-        cs.execute(CREATE_STORAGE_INTEGRATION_SQL)
-
-        # Create External Stage with dynamic name
-        logger.info("🔹 Creating external stage...")
-        CREATE_STAGE_SQL = f"""
-        CREATE OR REPLACE STAGE {stage_name}
-            STORAGE_INTEGRATION = Snowflake_AWS_OBJ
-            URL = 's3://{AWS_S3_BUCKET_NAME}/JSON_Conversion/'
-            FILE_FORMAT = (TYPE = 'JSON');
-        """
-        cs.execute(CREATE_STAGE_SQL)
-
         # Create Table (with structured columns; year and quarter omitted)
         logger.info("🔹 Creating table with structured columns (without year and quarter)...")
         CREATE_TABLE_SQL = f"""
@@ -142,7 +156,7 @@ def load_json_data_to_snowflake():
         logger.info(f"🔹 Copying JSON data from {len(json_files)} files into {table_name}...")
         COPY_INTO_SQL = f"""
         COPY INTO {table_name} (raw_json)
-        FROM @{stage_name}/{latest_year}/{latest_quarter}/
+        FROM @{JSON_STAGE_NAME}/{latest_year}/{latest_quarter}/
         FILE_FORMAT = (TYPE = 'JSON')
         PATTERN = '.*\\.json';
         """
@@ -271,4 +285,5 @@ def create_views(ctx, table_name, latest_year, latest_quarter):
         cs.close()
 
 if __name__ == "__main__":
+    setup_json_stage()
     load_json_data_to_snowflake()
@@ -0,0 +1,5 @@
+# Airflow pools bounding how many quarters run a step at the same time during a
+# backfill. airflow-init creates them from pools.json; their slots can be changed
+# under Admin > Pools without touching the DAGs.
+SEC_DOWNLOAD_POOL = 'sec_downloads'
+SNOWFLAKE_LOAD_POOL = 'snowflake_loads'
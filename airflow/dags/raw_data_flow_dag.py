@@ -1,11 +1,14 @@
 from airflow import DAG
+from airflow.decorators import task, task_group
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
 
-from load_airflow_variables import load_airflow_variables
+from load_airflow_variables import load_quarter_list
+from pipeline_pools import SEC_DOWNLOAD_POOL, SNOWFLAKE_LOAD_POOL
 from web_scrapper import download_quarterly_data
 from zip_ext_and_parq_store import SECDataProcessor
-from snowflake_raw_data_loader import SnowflakeLoader
+from snowflake_raw_data_loader import SnowflakeLoader, setup_s3_stage
+from backend_cache_notifier import invalidate_backend_cache
 
 # Default DAG arguments
 default_args = {
@@ -24,60 +27,51 @@ dag = DAG(
     catchup=False
 )
 
-task_load_variables = PythonOperator(
-    task_id='load_airflow_variables',
-    python_callable=load_airflow_variables,
-    provide_context=True,
+# **Step 1: Quarters to process** (run conf, sec_quarters Variable, or sec_year/sec_quarter)
+task_load_quarters = PythonOperator(
+    task_id='load_quarters',
+    python_callable=load_quarter_list,
     dag=dag
 )
 
-# **Step 2: Scrape SEC Data**
-def scrape_sec_data(**context):
-    """Fetches SEC ZIP files and stores them in S3"""
-    year = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_year')
-    quarter = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_quarter')
-    download_quarterly_data(year, quarter)
+# **Step 2: Snowflake objects shared by every quarter** (integration, file format, stage)
+@task
+def setup_snowflake_stage():
+    """Creates the storage integration, file format and stage once, before any
+    quarter loads, so parallel loads never replace them under each other"""
+    setup_s3_stage()
 
-task_scrape_sec = PythonOperator(
-    task_id='scrape_sec_data',
-    python_callable=scrape_sec_data,
-    provide_context=True,
-    dag=dag
-)
+# **Step 3: Scrape SEC Data**
+@task(pool=SEC_DOWNLOAD_POOL)
+def scrape_sec_data(period):
+    """Fetches one quarter's SEC ZIP file and stores it in S3"""
+    if not download_quarterly_data(period['year'], period['quarter']):
+        raise ValueError(f"Download failed for {period['year']}Q{period['quarter']}")
 
-# **Step 3: Extract & Convert Data**
-def extract_and_convert(**context):
-    """Extracts SEC ZIP files and converts to Parquet"""
-    year = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_year')
-    quarter = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_quarter')
+# **Step 4: Extract & Convert Data**
+@task
+def extract_and_convert(period):
+    """Extracts one quarter's SEC ZIP file and converts it to Parquet"""
     processor = SECDataProcessor()
-    processor.extract_zip_file(year, quarter)
+    processor.extract_zip_file(period['year'], period['quarter'])
 
-task_extract_convert = PythonOperator(
-    task_id='extract_and_convert',
-    python_callable=extract_and_convert,
-    provide_context=True,
-    dag=dag
-)
-
-# **Step 4: Load Data into Snowflake**
-def load_to_snowflake(**context):
-    """Loads Parquet data from S3 into Snowflake"""
-    year = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_year')
-    quarter = context['task_instance'].xcom_pull(task_ids='load_airflow_variables', key='sec_quarter')
+# **Step 5: Load Data into Snowflake**
+@task(pool=SNOWFLAKE_LOAD_POOL)
+def load_to_snowflake(period):
+    """Loads one quarter's Parquet data from S3 into Snowflake"""
+    year, quarter = period['year'], period['quarter']
     loader = SnowflakeLoader(year, quarter)
     loader.create_schema()
     loader.create_tables()
-    loader.setup_s3_integration()
     loader.load_data()
     loader.cleanup()
+    invalidate_backend_cache(year, quarter, 'RAW')
 
-task_load_snowflake = PythonOperator(
-    task_id='load_to_snowflake',
-    python_callable=load_to_snowflake,
-    provide_context=True,
-    dag=dag
-)
+# One scrape -> extract -> load chain per quarter; the pools bound how many
+# quarters download or load at the same time
+@task_group(group_id='process_quarter')
+def process_quarter(period):
+    scrape_sec_data(period) >> extract_and_convert(period) >> load_to_snowflake(period)
 
-# **Set Task Dependencies**
-task_load_variables >> task_scrape_sec >> task_extract_convert >> task_load_snowflake
\ No newline at end of file
+with dag:
+    setup_snowflake_stage() >> process_quarter.expand(period=task_load_quarters.output)
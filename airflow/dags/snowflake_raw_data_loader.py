@@ -3,6 +3,8 @@ import snowflake.connector
 from dotenv import load_dotenv
 import logging
 
+from snowflake_s3_integration import STORAGE_INTEGRATION, create_storage_integration
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,6 +12,54 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+SCHEMA_NAME = "SEC_DATA_RAW"
+# One stage over extracted/ for every quarter, created once by setup_s3_stage
+STAGE_NAME = "sec_extracted_stage"
+
+def connect_snowflake():
+    return snowflake.connector.connect(
+        user=os.getenv('SNOWFLAKE_USER'),
+        password=os.getenv('SNOWFLAKE_PASSWORD'),
+        account=os.getenv('SNOWFLAKE_ACCOUNT'),
+        warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+        database=os.getenv('SNOWFLAKE_DATABASE')
+    )
+
+def setup_s3_stage():
+    """Create the schema, storage integration, Parquet file format and stage the
+    quarters load through. Runs once, before the quarters' loads start: nothing is
+    replaced, so a load running at the same time never loses its stage mid-COPY."""
+    conn = connect_snowflake()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA_NAME}")
+        cur.execute(f"USE SCHEMA {SCHEMA_NAME}")
+        create_storage_integration(cur)
+
+        # Get the AWS IAM user for the integration
+        cur.execute(f"DESC INTEGRATION {STORAGE_INTEGRATION}")
+        logger.info("Integration Info:")
+        for info in cur.fetchall():
+            logger.info(str(info))
+
+        # Create file format for Parquet
+        cur.execute("""
+        CREATE FILE FORMAT IF NOT EXISTS parquet_format
+            TYPE = PARQUET
+            COMPRESSION = 'SNAPPY'
+        """)
+
+        cur.execute(f"""
+        CREATE STAGE IF NOT EXISTS {STAGE_NAME}
+            STORAGE_INTEGRATION = {STORAGE_INTEGRATION}
+            URL = 's3://{os.getenv('AWS_S3_BUCKET_NAME')}/extracted/'
+            FILE_FORMAT = parquet_format
+        """)
+        logger.info(f"Stage {STAGE_NAME} ready")
+    finally:
+        cur.close()
+        conn.close()
+
 class SnowflakeLoader:
     def __init__(self, year, quarter):
         """Initialize Snowflake connection and configurations"""
@@ -17,15 +67,9 @@ class SnowflakeLoader:
         self.quarter = quarter
         self.source_id = f"{year}Q{quarter}"
         
-        self.conn = snowflake.connector.connect(
-            user=os.getenv('SNOWFLAKE_USER'),
-            password=os.getenv('SNOWFLAKE_PASSWORD'),
-            account=os.getenv('SNOWFLAKE_ACCOUNT'),
-            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-            database=os.getenv('SNOWFLAKE_DATABASE')
-        )
+        self.conn = connect_snowflake()
         self.cur = self.conn.cursor()
-        self.schema_name = f"SEC_DATA_RAW"
+        self.schema_name = SCHEMA_NAME
         self.s3_bucket = os.getenv('AWS_S3_BUCKET_NAME')
         self.s3_path = f'extracted/{self.source_id}/'  
         
@@ -166,50 +210,10 @@ class SnowflakeLoader:
             logger.info(f"Creating table: {table_name}")
             self.cur.execute(ddl)
 
-    def setup_s3_integration(self):
-        """Setup Snowflake integration with S3"""
-        # Create storage integration
-        integration_command = f"""
-        CREATE OR REPLACE STORAGE INTEGRATION Snowflake_AWS_OBJ
-            TYPE = EXTERNAL_STAGE
-            STORAGE_PROVIDER = 'S3'
-            ENABLED = TRUE
-            STORAGE_AWS_ROLE_ARN = '{os.getenv('AWS_ROLE_ARN')}'
-            STORAGE_ALLOWED_LOCATIONS = ('s3://{self.s3_bucket}')
-        """
-        self.cur.execute(integration_command)
-
-        # Get the AWS IAM user for the integration
-        desc_integration_command = "DESC INTEGRATION Snowflake_AWS_OBJ"
-        self.cur.execute(desc_integration_command)
-        integration_info = self.cur.fetchall()
-        logger.info("Integration Info:")
-        for info in integration_info:
-            logger.info(str(info))
-
-        # Create file format for Parquet
-        file_format_command = """
-        CREATE OR REPLACE FILE FORMAT parquet_format
-            TYPE = PARQUET
-            COMPRESSION = 'SNAPPY'
-        """
-        self.cur.execute(file_format_command)
-
-        # Create stage with dynamic name
-        stage_name = f"sec_stage_{self.source_id}"
-        stage_command = f"""
-        CREATE OR REPLACE STAGE {stage_name}
-            STORAGE_INTEGRATION = Snowflake_AWS_OBJ
-            URL = 's3://{self.s3_bucket}/extracted/{self.source_id}/'
-            FILE_FORMAT = parquet_format
-        """
-        self.cur.execute(stage_command)
-        logger.info(f"Stage created for {self.source_id}")
-
     def load_data(self):
         """Load data from S3 parquet files into Snowflake tables"""
         table_suffix = f"_{self.source_id}"
-        stage_name = f"sec_stage_{self.source_id}"
+        stage_path = f"@{STAGE_NAME}/{self.source_id}"
         
         file_table_mapping = {
             'sub': f'sec_sub{table_suffix}',
@@ -221,7 +225,7 @@ class SnowflakeLoader:
         for file_type, table_name in file_table_mapping.items():
             logger.info(f"\nProcessing {file_type}.parquet into {table_name}")
             
-            file_check = f"SELECT COUNT(*) FROM @{stage_name}/{file_type}.parquet"
+            file_check = f"SELECT COUNT(*) FROM {stage_path}/{file_type}.parquet"
             try:
                 self.cur.execute(file_check)
                 file_count = self.cur.fetchone()[0]
@@ -232,7 +236,7 @@ class SnowflakeLoader:
             
             copy_command = f"""
             COPY INTO {table_name}
-            FROM @{stage_name}/{file_type}.parquet
+            FROM {stage_path}/{file_type}.parquet
             FILE_FORMAT = parquet_format
             MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
             ON_ERROR = CONTINUE;
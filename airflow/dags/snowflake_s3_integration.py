@@ -0,0 +1,26 @@
+import os
+
+# The storage integration every pipeline's stages go through. It allows the whole
+# bucket, so the raw (extracted/) and JSON (JSON_Conversion/) stages share it.
+STORAGE_INTEGRATION = 'Snowflake_AWS_OBJ'
+
+
+def create_storage_integration(cur):
+    """
+    Creates the storage integration when it does not exist yet. Never replaced: that
+    would drop it from under a COPY running in another task and change the external
+    ID the AWS role trusts.
+    """
+    allowed_location = f"s3://{os.getenv('AWS_S3_BUCKET_NAME')}/"
+    cur.execute(f"""
+    CREATE STORAGE INTEGRATION IF NOT EXISTS {STORAGE_INTEGRATION}
+        TYPE = EXTERNAL_STAGE
+        STORAGE_PROVIDER = 'S3'
+        ENABLED = TRUE
+        STORAGE_AWS_ROLE_ARN = '{os.getenv('AWS_ROLE_ARN')}'
+        STORAGE_ALLOWED_LOCATIONS = ('{allowed_location}')
+    """)
+    # Integrations created by the older loaders allowed only JSON_Conversion/ or the
+    # bucket without a trailing slash
+    cur.execute(f"ALTER STORAGE INTEGRATION {STORAGE_INTEGRATION} "
+                f"SET STORAGE_ALLOWED_LOCATIONS = ('{allowed_location}')")
@@ -1,6 +1,8 @@
 import boto3
 import os
 import io
+import json
+import hashlib
 import zipfile
 import pandas as pd
 import pyarrow as pa
@@ -16,6 +18,11 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Layout of the parsed files; manifests of an older layout are parsed again.
+# 2: rows sorted by adsh in row groups of PARQUET_ROW_GROUP_SIZE
+PARSED_FORMAT = 2
+PARQUET_ROW_GROUP_SIZE = int(os.getenv('PARQUET_ROW_GROUP_SIZE', 100000))
+
 class SECDataProcessor:
     def __init__(self):
         """Initialize the processor with configurations"""
@@ -25,6 +32,8 @@ class SECDataProcessor:
         # S3 paths
         self.RAW_PREFIX = 'raw/'
         self.EXTRACTED_PREFIX = 'extracted/'
+        # Written last, next to the Parquet files: which ZIP they were parsed from
+        self.MANIFEST_NAME = '_manifest.json'
         
         # File configurations
         self.FILE_TYPES = ['sub.txt', 'pre.txt', 'tag.txt', 'num.txt']
@@ -158,8 +167,44 @@ class SECDataProcessor:
 
         return df
 
-    def extract_zip_file(self, year, quarter):
-        """Extract specific ZIP file and convert to parquet format"""
+    def parsed_quarter_manifest(self, source_id):
+        """Manifest of a quarter's parsed Parquet files, or None if it has not been parsed"""
+        try:
+            obj = self.s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=f"{self.EXTRACTED_PREFIX}{source_id}/{self.MANIFEST_NAME}"
+            )
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return json.loads(obj['Body'].read())
+
+    def _parsed_files_present(self, source_id):
+        response = self.s3_client.list_objects_v2(
+            Bucket=self.bucket_name,
+            Prefix=f"{self.EXTRACTED_PREFIX}{source_id}/"
+        )
+        present = {obj['Key'] for obj in response.get('Contents', [])}
+        return all(self._parquet_path(source_id, file_name) in present for file_name in self.FILE_TYPES)
+
+    def _parquet_path(self, source_id, file_name):
+        file_type = file_name.replace('.txt', '')
+        return f"{self.EXTRACTED_PREFIX}{source_id}/{file_type}.parquet"
+
+    def _write_manifest(self, source_id, manifest):
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=f"{self.EXTRACTED_PREFIX}{source_id}/{self.MANIFEST_NAME}",
+            Body=json.dumps(manifest, indent=2)
+        )
+
+    def extract_zip_file(self, year, quarter, force=False):
+        """Extract specific ZIP file and convert to parquet format.
+
+        The Parquet files under extracted/{year}Q{quarter}/ are the parsed form of the
+        quarter shared by the raw loader, the dbt stage and the JSON builder. They are
+        keyed by the ZIP's checksum: when the ZIP is unchanged since the last parse
+        they are reused as they are, unless force is set. Returns the manifest.
+        """
         try:
             # Construct the specific ZIP file key
             zip_key = f"{self.RAW_PREFIX}{year}_Q{quarter}.zip"
@@ -176,14 +221,45 @@ class SECDataProcessor:
             except self.s3_client.exceptions.NoSuchKey:
                 logger.error(f"ZIP file not found: {zip_key}")
                 raise FileNotFoundError(f"ZIP file not found for {year} Q{quarter}")
-            
+
+            manifest = None if force else self.parsed_quarter_manifest(source_id)
+            if manifest and manifest.get('format') != PARSED_FORMAT:
+                manifest = None
+            # Same ETag, same object: no need to read the ZIP at all
+            if manifest and manifest.get('zip_etag') == zip_obj['ETag'] and self._parsed_files_present(source_id):
+                zip_obj['Body'].close()
+                logger.info(f"{source_id} already parsed from this ZIP (sha256 {manifest['zip_sha256']}), reusing it")
+                return manifest
+
+            zip_bytes = zip_obj['Body'].read()
+            zip_sha256 = hashlib.sha256(zip_bytes).hexdigest()
+            # A re-upload of the same bytes gets a new ETag but needs no new parse
+            if manifest and manifest.get('zip_sha256') == zip_sha256 and self._parsed_files_present(source_id):
+                manifest['zip_etag'] = zip_obj['ETag']
+                self._write_manifest(source_id, manifest)
+                logger.info(f"{source_id} already parsed from identical ZIP contents, reusing it")
+                return manifest
+
             # Process the ZIP file
-            with zipfile.ZipFile(io.BytesIO(zip_obj['Body'].read())) as zip_ref:
+            files = {}
+            with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zip_ref:
                 for file_name in zip_ref.namelist():
                     if file_name in self.FILE_TYPES:
-                        self._process_zip_file(zip_ref, file_name, source_id)
+                        files[file_name.replace('.txt', '')] = self._process_zip_file(zip_ref, file_name, source_id)
+
+            manifest = {
+                'source_id': source_id,
+                'zip_key': zip_key,
+                'zip_etag': zip_obj['ETag'],
+                'zip_sha256': zip_sha256,
+                'format': PARSED_FORMAT,
+                'parsed_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                'files': files
+            }
+            self._write_manifest(source_id, manifest)
                             
             logger.info(f"ZIP extraction completed successfully for {year} Q{quarter}")
+            return manifest
             
         except Exception as e:
             logger.error(f"Error in extract_zip_file: {str(e)}")
@@ -204,6 +280,11 @@ class SECDataProcessor:
 
                 # Standardize data types
                 df = self._standardize_data_types(df, file_name)
+
+                # Sorted by adsh (stable, file order within a submission), so the row
+                # group statistics let a reader filtering on adsh skip the other groups
+                if 'adsh' in df.columns:
+                    df = df.sort_values('adsh', kind='stable').reset_index(drop=True)
                 
                 # Convert to parquet
                 table = pa.Table.from_pandas(df)
@@ -211,14 +292,14 @@ class SECDataProcessor:
                 pq.write_table(
                     table, 
                     buffer, 
+                    row_group_size=PARQUET_ROW_GROUP_SIZE,
                     compression='snappy',
                     use_dictionary=True,
                     use_byte_stream_split=True
                 )
                 
                 # Define path for parquet file
-                file_type = file_name.replace('.txt', '')
-                parquet_path = f"{self.EXTRACTED_PREFIX}{source_id}/{file_type}.parquet"
+                parquet_path = self._parquet_path(source_id, file_name)
                 
                 # Upload to S3
                 self.s3_client.put_object(
@@ -228,6 +309,7 @@ class SECDataProcessor:
                 )
                 
                 logger.info(f"Processed and uploaded: {parquet_path}")
+                return {'key': parquet_path, 'rows': len(df)}
                     
         except Exception as e:
             logger.error(f"Error processing {file_name}: {str(e)}")
@@ -0,0 +1,22 @@
+{% macro changed_submissions_filter(source_alias='sub') %}
+  {#- On incremental runs only keep submissions that are not loaded yet, or that
+      were accepted again after the copy already sitting in the target table.
+      source_alias must expose adsh, accepted and source_file columns.
+      Tables built before the incremental models have no accepted/source_file
+      columns yet; the filter is skipped for them (on_schema_change adds the
+      columns during the run), see the README on the one-time full refresh. -#}
+  {% if is_incremental() %}
+    {% set loaded_columns = adapter.get_columns_in_relation(this) | map(attribute='name') | map('lower') | list %}
+    {% if 'accepted' in loaded_columns and 'source_file' in loaded_columns %}
+    AND NOT EXISTS (
+        SELECT 1
+        FROM {{ this }} AS loaded
+        WHERE loaded.source_file = {{ source_alias }}.source_file
+          AND loaded.adsh = {{ source_alias }}.adsh
+          AND loaded.accepted >= {{ source_alias }}.accepted
+    )
+    {% else %}
+      {% do log(this ~ " has no accepted/source_file columns yet, loading every submission; run once with FULL_REFRESH=true", info=True) %}
+    {% endif %}
+  {% endif %}
+{% endmacro %}
@@ -1,5 +1,9 @@
 
 {% macro copy_into_raw_num(stage_name, file_name) %}
+  {% do adapter.dispatch('copy_into_raw_num')(stage_name, file_name) %}
+{% endmacro %}
+
+{% macro default__copy_into_raw_num(stage_name, file_name) %}
   {% set table_name = 'RAW_NUM_' ~ file_name %}
   {% set stage_location = '@' ~ stage_name ~ '/num.parquet' %}
 
@@ -1,4 +1,8 @@
 {% macro copy_into_raw_pre(stage_name, file_name) %}
+  {% do adapter.dispatch('copy_into_raw_pre')(stage_name, file_name) %}
+{% endmacro %}
+
+{% macro default__copy_into_raw_pre(stage_name, file_name) %}
   {% set table_name = 'RAW_PRE_' ~ file_name %}
   {% set stage_location = '@' ~ stage_name ~ '/pre.parquet' %}
 
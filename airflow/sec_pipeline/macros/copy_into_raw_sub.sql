@@ -1,4 +1,8 @@
 {% macro copy_into_raw_sub(stage_name, file_name) %}
+  {% do adapter.dispatch('copy_into_raw_sub')(stage_name, file_name) %}
+{% endmacro %}
+
+{% macro default__copy_into_raw_sub(stage_name, file_name) %}
   {% set table_name = 'RAW_SUB_' ~ file_name %}
   {% set stage_location = '@' ~ stage_name ~ '/sub.parquet' %}
 
@@ -1,4 +1,8 @@
 {% macro create_file_format() %}
+  {% do adapter.dispatch('create_file_format')() %}
+{% endmacro %}
+
+{% macro default__create_file_format() %}
   {% set sql %}
       USE SCHEMA {{ target.schema }};
       CREATE OR REPLACE FILE FORMAT parquet_format
@@ -11,4 +15,4 @@
 
   -- Execute the query
   {% do run_query(sql) %}
-{% endmacro %}
\ No newline at end of file
+{% endmacro %}
@@ -1,4 +1,8 @@
 {% macro create_stage(stage_name) %}
+  {% do adapter.dispatch('create_stage')(stage_name) %}
+{% endmacro %}
+
+{% macro default__create_stage(stage_name) %}
   {% set full_stage_name = stage_name %}
   {% set year_quarter = stage_name.split('_')[-1] %}
   {% set s3_url = 's3://bigdata-team3-ass2-bucket/extracted/' ~ year_quarter %}
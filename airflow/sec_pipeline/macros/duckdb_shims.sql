@@ -0,0 +1,70 @@
+{#-
+  DuckDB versions of the Snowflake-only operations used by run_dbt_pipeline.sh,
+  so the project can run offline with --target local. There are no stages or
+  file formats in DuckDB: a stage name maps to a local directory holding the
+  Parquet files written by SECDataProcessor (<local_parquet_dir>/<YYYYQN>/).
+-#}
+
+{% macro local_stage_path(stage_name, file_type) %}
+  {% set year_quarter = stage_name.split('_')[-1] %}
+  {{ return(var('local_parquet_dir', 'extracted') ~ '/' ~ year_quarter ~ '/' ~ file_type ~ '.parquet') }}
+{% endmacro %}
+
+{% macro duckdb__create_file_format() %}
+  {% do log("DuckDB reads Parquet natively; no file format to create", info=True) %}
+{% endmacro %}
+
+{% macro duckdb__create_stage(stage_name) %}
+  {% set sql %}
+      SELECT COUNT(*) FROM glob('{{ local_stage_path(stage_name, '*') }}')
+  {% endset %}
+
+  {% set file_count = run_query(sql).columns[0].values()[0] %}
+  {% if file_count == 0 %}
+    {{ exceptions.raise_compiler_error("No Parquet files found for " ~ stage_name ~ " under " ~ var('local_parquet_dir', 'extracted')) }}
+  {% endif %}
+  {% do log("Using local stage " ~ local_stage_path(stage_name, '*') ~ " (" ~ file_count ~ " files)", info=True) %}
+{% endmacro %}
+
+{% macro duckdb__copy_parquet_into(table_name, parquet_path) %}
+  {#- Mirrors COPY INTO ... MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE ON_ERROR = CONTINUE:
+      only columns present on both sides are loaded and values that do not cast
+      become NULL instead of failing the load. -#}
+  {% set relation = api.Relation.create(database=target.database, schema=target.schema, identifier=table_name) %}
+  {% set target_columns = adapter.get_columns_in_relation(relation) %}
+  {% set parquet_columns = run_query("DESCRIBE SELECT * FROM read_parquet('" ~ parquet_path ~ "')").columns[0].values() | map('lower') | list %}
+
+  {% set insert_columns = [] %}
+  {% set select_columns = [] %}
+  {% for column in target_columns %}
+    {% if column.name | lower in parquet_columns %}
+      {% do insert_columns.append(column.name) %}
+      {% do select_columns.append('TRY_CAST("' ~ column.name | lower ~ '" AS ' ~ column.data_type ~ ')') %}
+    {% endif %}
+  {% endfor %}
+
+  {% set sql %}
+      INSERT INTO {{ relation }} ({{ insert_columns | join(', ') }})
+      SELECT {{ select_columns | join(', ') }}
+      FROM read_parquet('{{ parquet_path }}');
+  {% endset %}
+
+  {% do log("Executing INSERT INTO: " ~ sql, info=True) %}
+  {% do run_query(sql) %}
+{% endmacro %}
+
+{% macro duckdb__copy_into_raw_num(stage_name, file_name) %}
+  {% do duckdb__copy_parquet_into('RAW_NUM_' ~ file_name, local_stage_path(stage_name, 'num')) %}
+{% endmacro %}
+
+{% macro duckdb__copy_into_raw_pre(stage_name, file_name) %}
+  {% do duckdb__copy_parquet_into('RAW_PRE_' ~ file_name, local_stage_path(stage_name, 'pre')) %}
+{% endmacro %}
+
+{% macro duckdb__copy_into_raw_sub(stage_name, file_name) %}
+  {% do duckdb__copy_parquet_into('RAW_SUB_' ~ file_name, local_stage_path(stage_name, 'sub')) %}
+{% endmacro %}
+
+{% macro duckdb__copy_into_raw_tag(stage_name, file_name) %}
+  {% do duckdb__copy_parquet_into('RAW_TAG_' ~ file_name, local_stage_path(stage_name, 'tag')) %}
+{% endmacro %}
@@ -0,0 +1,47 @@
+{#-
+  Fact table layout switch. By default every quarter gets its own table
+  (BALANCE_SHEET_2023Q1, ...). With --vars '{"unified_fact_tables": true}' all
+  quarters land in one BALANCE_SHEET / INCOME_STATEMENT / CASH_FLOW table,
+  clustered on (source_file, cik), and a BALANCE_SHEET_2023Q1 style view is kept
+  per quarter so existing queries keep working.
+-#}
+
+{% macro fact_table_alias(base_name) %}
+  {%- if var('unified_fact_tables', false) -%}
+    {{ return(base_name) }}
+  {%- else -%}
+    {{ return(base_name ~ '_' ~ var('file_name', '2023Q1')) }}
+  {%- endif -%}
+{% endmacro %}
+
+{% macro fact_table_cluster_by() %}
+  {%- if var('unified_fact_tables', false) -%}
+    {{ return(['source_file', 'cik']) }}
+  {%- else -%}
+    {{ return(none) }}
+  {%- endif -%}
+{% endmacro %}
+
+{% macro fact_table_full_refresh() %}
+  {#- Never let --full-refresh drop a table holding every quarter; use
+      refresh_quarter to reload just the current quarter instead. -#}
+  {%- if var('unified_fact_tables', false) -%}
+    {{ return(false) }}
+  {%- else -%}
+    {{ return(none) }}
+  {%- endif -%}
+{% endmacro %}
+
+{% macro refresh_quarter_rows() %}
+  {%- if var('unified_fact_tables', false) and var('refresh_quarter', false) and is_incremental() -%}
+    DELETE FROM {{ this }} WHERE source_file = '{{ var('file_name', '2023Q1') }}'
+  {%- endif -%}
+{% endmacro %}
+
+{% macro create_quarter_view(base_name) %}
+  {%- if var('unified_fact_tables', false) -%}
+    {% set file_name = var('file_name', '2023Q1') %}
+    CREATE OR REPLACE VIEW {{ this.database }}.{{ this.schema }}.{{ base_name }}_{{ file_name }} AS
+    SELECT * FROM {{ this }} WHERE source_file = '{{ file_name }}'
+  {%- endif -%}
+{% endmacro %}
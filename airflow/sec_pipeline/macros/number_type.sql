@@ -0,0 +1,11 @@
+{% macro number_type(precision, scale) %}
+  {{- return(adapter.dispatch('number_type')(precision, scale)) -}}
+{% endmacro %}
+
+{% macro default__number_type(precision, scale) %}
+  {{- return('NUMBER(' ~ precision ~ ',' ~ scale ~ ')') -}}
+{% endmacro %}
+
+{% macro duckdb__number_type(precision, scale) %}
+  {{- return('DECIMAL(' ~ precision ~ ',' ~ scale ~ ')') -}}
+{% endmacro %}
@@ -1,53 +1,30 @@
-{% set file_name = var('file_name', '2023Q1') %}
-
 {{ config(
-    alias='INCOME_STATEMENT_' ~ file_name,
-    materialized='table'
+    alias=fact_table_alias('INCOME_STATEMENT'),
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key=['source_file', 'adsh'],
+    cluster_by=fact_table_cluster_by(),
+    full_refresh=fact_table_full_refresh(),
+    pre_hook="{{ refresh_quarter_rows() }}",
+    post_hook="{{ create_quarter_view('INCOME_STATEMENT') }}"
 ) }}
 
-WITH FilteredData AS (
-    SELECT 
-        num.adsh, 
-        sub.cik, 
-        sub.name AS company_name,
-        sub.filed AS filing_date, 
-        sub.fy AS fiscal_year, 
-        sub.fp AS fiscal_period, 
-        num.tag, 
-        num.uom AS unit_of_measure, 
-        num.ddate AS report_date, 
-        num.qtrs, 
-        pre.stmt AS statement_type, 
-        pre.plabel,
-        DENSE_RANK() OVER (PARTITION BY 
-            num.adsh, sub.cik, sub.name, sub.filed, sub.fy, sub.fp, 
-            num.tag, num.uom, num.ddate, num.qtrs, pre.stmt, pre.plabel 
-            ORDER BY num.ddate DESC
-        ) AS rn,
-        num.value
-    FROM {{ ref('raw_num_table') }} as num  -- Dynamically include the stage name
-    JOIN {{ ref('raw_sub_table') }} as sub  -- Dynamically include the stage name
-        ON num.adsh = sub.adsh
-    JOIN {{ ref('raw_pre_table') }} as pre  -- Dynamically include the stage name
-        ON num.adsh = pre.adsh 
-        AND num.tag = pre.tag
-    WHERE pre.stmt = 'IS' 
-)
-
 SELECT 
-    adsh, 
-    cik, 
-    company_name,
-    filing_date, 
-    fiscal_year, 
-    fiscal_period, 
-    tag, 
-    unit_of_measure, 
-    report_date, 
-    qtrs, 
-    statement_type, 
-    plabel, 
-    SUM(value) AS total_value
-FROM FilteredData
-GROUP BY adsh, cik, company_name, filing_date, fiscal_year, fiscal_period, 
-         tag, unit_of_measure, report_date, qtrs, statement_type, plabel, rn
+    facts.adsh, 
+    facts.cik, 
+    facts.company_name,
+    facts.filing_date, 
+    facts.fiscal_year, 
+    facts.fiscal_period, 
+    facts.accepted, 
+    facts.source_file, 
+    facts.tag, 
+    facts.unit_of_measure, 
+    facts.report_date, 
+    facts.qtrs, 
+    facts.statement_type, 
+    facts.plabel, 
+    facts.total_value
+FROM {{ ref('int_statement_facts') }} as facts
+WHERE facts.statement_type = 'IS' 
+{{ changed_submissions_filter('facts') }}
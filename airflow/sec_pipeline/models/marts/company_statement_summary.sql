@@ -0,0 +1,51 @@
+{% set file_name = var('file_name', '2023Q1') %}
+
+{{ config(
+    alias=fact_table_alias('COMPANY_STATEMENT_SUMMARY'),
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='source_file',
+    cluster_by=fact_table_cluster_by(),
+    full_refresh=fact_table_full_refresh(),
+    post_hook="{{ create_quarter_view('COMPANY_STATEMENT_SUMMARY') }}"
+) }}
+
+-- Company totals per statement for the dashboard, with both rankings so the
+-- top/bottom N companies can be read without touching the fact tables.
+WITH StatementFacts AS (
+    SELECT source_file, statement_type, cik, company_name, total_value
+    FROM {{ ref('balance_sheet_load') }}
+    WHERE source_file = '{{ file_name }}'
+    UNION ALL
+    SELECT source_file, statement_type, cik, company_name, total_value
+    FROM {{ ref('income_statement_load') }}
+    WHERE source_file = '{{ file_name }}'
+    UNION ALL
+    SELECT source_file, statement_type, cik, company_name, total_value
+    FROM {{ ref('cash_flow_load') }}
+    WHERE source_file = '{{ file_name }}'
+),
+
+CompanyTotals AS (
+    SELECT 
+        source_file, 
+        statement_type, 
+        company_name, 
+        MIN(cik) AS cik, 
+        COALESCE(SUM(total_value), 0) AS total_value
+    FROM StatementFacts
+    GROUP BY source_file, statement_type, company_name
+)
+
+SELECT 
+    source_file, 
+    statement_type, 
+    company_name, 
+    cik, 
+    total_value, 
+    ROW_NUMBER() OVER (PARTITION BY source_file, statement_type 
+                       ORDER BY total_value DESC, company_name) AS rank_desc,
+    ROW_NUMBER() OVER (PARTITION BY source_file, statement_type 
+                       ORDER BY total_value ASC, company_name) AS rank_asc,
+    COUNT(*) OVER (PARTITION BY source_file, statement_type) AS company_count
+FROM CompanyTotals
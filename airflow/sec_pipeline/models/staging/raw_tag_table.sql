@@ -7,8 +7,8 @@
 SELECT
     CAST(NULL AS VARCHAR(256)) AS tag,
     CAST(NULL AS VARCHAR(20)) AS version,
-    CAST(NULL AS NUMBER(1,0)) AS custom,
-    CAST(NULL AS NUMBER(1,0)) AS abstract,
+    CAST(NULL AS {{ number_type(1, 0) }}) AS custom,
+    CAST(NULL AS {{ number_type(1, 0) }}) AS abstract,
     CAST(NULL AS VARCHAR(20)) AS datatype,
     CAST(NULL AS CHAR(1)) AS iord,
     CAST(NULL AS CHAR(1)) AS crdr,
@@ -0,0 +1,44 @@
+#!/bin/bash
+
+set -e  # Exit script immediately on error
+
+# Same steps as run_dbt_pipeline.sh, but against the local DuckDB target so model
+# changes can be tested and profiled without a Snowflake account.
+# Usage: ./run_dbt_local.sh <year> <quarter> [parquet_dir]
+# parquet_dir must contain <YYYYQN>/{num,pre,sub,tag}.parquet as written by SECDataProcessor
+# (the parsed-quarter files the raw and JSON pipelines share).
+
+cd "$(dirname "$0")"
+export DBT_PROFILES_DIR="$(pwd)/profiles"
+
+YEAR=$1
+QUARTER=$2
+PARQUET_DIR=${3:-extracted}
+STAGE_NAME="sec_stage_${YEAR}Q${QUARTER}"
+FILE_NAME=${YEAR}Q${QUARTER}
+SCHEMA_NAME="SEC_DATA_DFT"
+VARS='{"stage_name": "'"$STAGE_NAME"'", "year": "'"$YEAR"'", "quarter": "'"$QUARTER"'", "file_name": "'"$FILE_NAME"'", "local_parquet_dir": "'"$PARQUET_DIR"'"}'
+
+echo -e "\n🚀 Step 0: Installing dependencies..."
+dbt deps
+
+echo -e "\n🚀 Step 1: Creating schema and checking local stage..."
+dbt run-operation create_schema --target local --args '{"schema_name": "'"$SCHEMA_NAME"'"}'
+dbt run-operation create_file_format --target local
+dbt run-operation create_stage --target local --vars "$VARS" --args '{"stage_name": "'"$STAGE_NAME"'"}'
+
+echo -e "\n🚀 Step 2: Running dbt models to create tables..."
+dbt run --target local --select models/staging --vars "$VARS"
+
+echo -e "\n🚀 Step 3: Copying data into tables..."
+for FILE_TYPE in num pre sub tag; do
+    dbt run-operation copy_into_raw_${FILE_TYPE} --target local --vars "$VARS" --args '{"stage_name": "'"$STAGE_NAME"'", "file_name": "'"$FILE_NAME"'"}'
+done
+
+echo -e "\n🚀 Step 4: Running dbt models to create fact tables..."
+dbt run --target local --select models/intermediate models/fact_data_load models/marts --vars "$VARS"
+
+echo -e "\n⏱️ Model timings:"
+python scripts/model_timing_report.py target/run_results.json
+
+echo -e "\n✅ Local run completed successfully!"
@@ -8,15 +8,25 @@ cd /opt/airflow/sec_pipeline/
 # Explicitly set the DBT profiles directory
 export DBT_PROFILES_DIR=/opt/airflow/sec_pipeline/profiles
 
-# Accept year and quarter as arguments
+# Accept year and quarter as arguments, plus an optional full refresh flag
 YEAR=$1
 QUARTER=$2
+FULL_REFRESH=${3:-false}
+# Set UNIFIED_FACT_TABLES=true to load every quarter into single fact tables
+UNIFIED_FACT_TABLES=${UNIFIED_FACT_TABLES:-false}
 STAGE_NAME="sec_stage_${YEAR}Q${QUARTER}"
 FILE_NAME=${YEAR}Q${QUARTER}
 SCHEMA_NAME="SEC_DATA_DFT"
 
-echo -e "\n🚀 Step 0: Installing dependencies..."
-dbt deps
+# Quarters can run side by side: give each its own compile target and log directory
+export DBT_TARGET_PATH=target/${FILE_NAME}
+export DBT_LOG_PATH=logs/${FILE_NAME}
+
+# The DAG installs packages once before mapping the quarters (SKIP_DBT_DEPS=true)
+if [ "${SKIP_DBT_DEPS:-false}" != "true" ]; then
+    echo -e "\n🚀 Step 0: Installing dependencies..."
+    dbt deps
+fi
 
 echo -e "\n🚀 Step 0.5: Creating schema..."
 dbt run-operation create_schema --args '{"schema_name": "'"$SCHEMA_NAME"'"}'
@@ -37,8 +47,20 @@ dbt run-operation copy_into_raw_pre --args '{"stage_name": "'"$STAGE_NAME"'", "f
 dbt run-operation copy_into_raw_sub --args '{"stage_name": "'"$STAGE_NAME"'", "file_name": "'"$FILE_NAME"'"}'
 dbt run-operation copy_into_raw_tag --args '{"stage_name": "'"$STAGE_NAME"'", "file_name": "'"$FILE_NAME"'"}'
 
+# Fact tables are incremental; a full refresh drops and rebuilds them (disaster recovery).
+# Unified fact tables are never dropped, only the current quarter's rows are reloaded.
+FULL_REFRESH_FLAG=""
+REFRESH_QUARTER=false
+if [ "$FULL_REFRESH" = "true" ]; then
+    FULL_REFRESH_FLAG="--full-refresh"
+    REFRESH_QUARTER=true
+fi
+
 echo -e "\n🚀 Step 5: Running dbt models to create fact tables..."
-dbt run --select models/fact_data_load --vars '{"stage_name": "'"$STAGE_NAME"'", "year": "'"$YEAR"'", "quarter": "'"$QUARTER"'", "file_name": "'"$FILE_NAME"'"}'
+dbt run --select models/intermediate models/fact_data_load $FULL_REFRESH_FLAG --vars '{"stage_name": "'"$STAGE_NAME"'", "year": "'"$YEAR"'", "quarter": "'"$QUARTER"'", "file_name": "'"$FILE_NAME"'", "unified_fact_tables": '"$UNIFIED_FACT_TABLES"', "refresh_quarter": '"$REFRESH_QUARTER"'}'
+
+echo -e "\n🚀 Step 5.5: Building dashboard summary marts..."
+dbt run --select models/marts --vars '{"stage_name": "'"$STAGE_NAME"'", "year": "'"$YEAR"'", "quarter": "'"$QUARTER"'", "file_name": "'"$FILE_NAME"'", "unified_fact_tables": '"$UNIFIED_FACT_TABLES"'}'
 
 echo -e "\n✅ Data load completed successfully!"
 
@@ -0,0 +1,32 @@
+import os
+import sys
+import time
+import duckdb
+
+
+def run_local_query(query, database_path=None):
+    """Run a query against the local DuckDB build of the project and time it"""
+    database_path = database_path or os.getenv('SEC_DUCKDB_PATH', 'sec_pipeline.duckdb')
+    conn = duckdb.connect(database_path, read_only=True)
+    try:
+        start_time = time.time()
+        df = conn.execute(query).fetchdf()
+        execution_time = time.time() - start_time
+        return df, execution_time
+    finally:
+        conn.close()
+
+
+def main():
+    """Usage: local_query.py "<sql>" [duckdb_path]"""
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        sys.exit(1)
+
+    df, execution_time = run_local_query(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(df)
+    print(f"\n{len(df)} rows in {execution_time:.3f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import sys
+import csv
+from datetime import datetime
+
+
+def load_model_timings(run_results_path):
+    """Read per-model timings from a dbt run_results.json artifact"""
+    with open(run_results_path) as f:
+        run_results = json.load(f)
+
+    timings = []
+    for result in run_results.get("results", []):
+        phases = {phase["name"]: phase for phase in result.get("timing", [])}
+        adapter_response = result.get("adapter_response") or {}
+        timings.append({
+            "model": result["unique_id"].split(".")[-1],
+            "status": result.get("status"),
+            "total_seconds": round(result.get("execution_time") or 0.0, 3),
+            "compile_seconds": round(_phase_seconds(phases.get("compile")), 3),
+            "execute_seconds": round(_phase_seconds(phases.get("execute")), 3),
+            "rows_affected": adapter_response.get("rows_affected"),
+        })
+
+    return sorted(timings, key=lambda row: row["total_seconds"], reverse=True)
+
+
+def _phase_seconds(phase):
+    """Duration of a compile/execute timing entry in seconds"""
+    if not phase or not phase.get("started_at") or not phase.get("completed_at"):
+        return 0.0
+    started = datetime.fromisoformat(phase["started_at"].replace("Z", "+00:00"))
+    completed = datetime.fromisoformat(phase["completed_at"].replace("Z", "+00:00"))
+    return (completed - started).total_seconds()
+
+
+def print_report(timings):
+    """Print the timings as a fixed-width table, slowest model first"""
+    header = f"{'model':<40} {'status':<8} {'total_s':>9} {'compile_s':>10} {'execute_s':>10} {'rows':>12}"
+    print(header)
+    print("-" * len(header))
+    for row in timings:
+        rows = "" if row["rows_affected"] is None else row["rows_affected"]
+        print(f"{row['model']:<40} {row['status']:<8} {row['total_seconds']:>9} "
+              f"{row['compile_seconds']:>10} {row['execute_seconds']:>10} {rows:>12}")
+    print("-" * len(header))
+    print(f"{'total':<40} {'':<8} {round(sum(r['total_seconds'] for r in timings), 3):>9}")
+
+
+def main():
+    """Usage: model_timing_report.py [run_results.json] [output.csv]"""
+    run_results_path = sys.argv[1] if len(sys.argv) > 1 else "target/run_results.json"
+    timings = load_model_timings(run_results_path)
+    print_report(timings)
+
+    # Optionally keep a CSV so timings can be compared between SQL changes
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(timings[0].keys()) if timings else ["model"])
+            writer.writeheader()
+            writer.writerows(timings)
+        print(f"Saved timings to {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
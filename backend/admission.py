@@ -0,0 +1,90 @@
+import os
+import re
+import json
+import pyarrow as pa
+from fastapi import HTTPException
+
+# Limits of the custom query path; every custom query is untrusted SQL from the dashboard
+CUSTOM_QUERY_TIMEOUT = int(os.getenv("CUSTOM_QUERY_TIMEOUT", 120))
+CUSTOM_QUERY_MAX_ROWS = int(os.getenv("CUSTOM_QUERY_MAX_ROWS", 100000))
+CUSTOM_QUERY_MAX_BYTES = int(os.getenv("CUSTOM_QUERY_MAX_BYTES", 64 * 1024 * 1024))
+# Queries waiting for a free custom query slot before new ones are turned away
+CUSTOM_QUERY_MAX_QUEUE = int(os.getenv("CUSTOM_QUERY_MAX_QUEUE", 8))
+# Largest scan EXPLAIN may estimate for a custom query (0 disables the check)
+CUSTOM_QUERY_MAX_SCAN_BYTES = int(os.getenv("CUSTOM_QUERY_MAX_SCAN_BYTES", 10 * 1024 ** 3))
+
+# Schema metadata key marking a capped result, kept through the cache
+TRUNCATED_METADATA_KEY = b"truncated"
+
+
+def is_select(query: str):
+    """Whether the statement is a query EXPLAIN accepts and the cache may keep"""
+    return query.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+# Functions and clauses whose result differs from run to run; queries using them are
+# never cached
+NON_DETERMINISTIC = re.compile(
+    r"\b(CURRENT_(TIMESTAMP|DATE|TIME|USER|ROLE|SESSION|WAREHOUSE)|LOCALTIME(STAMP)?|SYSDATE|SYSTIMESTAMP|"
+    r"GETDATE|NOW|RANDOM|RANDSTR|UNIFORM|NORMAL|ZIPF|UUID_STRING|SEQ[1248]|SAMPLE|TABLESAMPLE)\b",
+    re.IGNORECASE
+)
+
+
+def is_deterministic(query: str):
+    """Whether the query returns the same rows every time over unchanged tables (no
+    clock, random or sampling functions), so its result may be cached"""
+    return not NON_DETERMINISTIC.search(query)
+
+
+def scan_bytes_estimate(plan_json: str):
+    """Bytes Snowflake expects to scan, from an EXPLAIN USING JSON plan"""
+    plan = json.loads(plan_json)
+    return int(plan.get("GlobalStats", {}).get("bytesAssigned", 0))
+
+
+def check_scan_estimate(plan_json: str):
+    """Reject the query when its estimated scan is above CUSTOM_QUERY_MAX_SCAN_BYTES"""
+    estimate = scan_bytes_estimate(plan_json)
+    if CUSTOM_QUERY_MAX_SCAN_BYTES and estimate > CUSTOM_QUERY_MAX_SCAN_BYTES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Query would scan about {estimate / 1024 ** 3:.1f} GB, more than the "
+                   f"{CUSTOM_QUERY_MAX_SCAN_BYTES / 1024 ** 3:.1f} GB allowed; add filters or a LIMIT"
+        )
+    return estimate
+
+
+def cap_tables(tables, max_rows: int = CUSTOM_QUERY_MAX_ROWS, max_bytes: int = CUSTOM_QUERY_MAX_BYTES):
+    """Collect result chunks into one table of at most max_rows rows / max_bytes bytes.
+    Stops reading as soon as a limit is hit; the returned table then carries the
+    truncated flag in its schema metadata."""
+    collected = []
+    rows = 0
+    size = 0
+    truncated = False
+    for table in tables:
+        if rows + table.num_rows > max_rows:
+            table = table.slice(0, max_rows - rows)
+            truncated = True
+        if size + table.nbytes > max_bytes and table.num_rows:
+            # Keep the share of the chunk that still fits, by average row size
+            fitting = int(table.num_rows * (max_bytes - size) / table.nbytes)
+            table = table.slice(0, max(fitting, 0))
+            truncated = True
+        collected.append(table)
+        rows += table.num_rows
+        size += table.nbytes
+        if truncated:
+            break
+
+    schema = collected[0].schema
+    result = pa.concat_tables([t.cast(schema) if t.schema != schema else t for t in collected])
+    if truncated:
+        result = result.replace_schema_metadata({**(result.schema.metadata or {}), TRUNCATED_METADATA_KEY: b"true"})
+    return result
+
+
+def is_truncated(table):
+    """Whether cap_tables cut this result short"""
+    return (table.schema.metadata or {}).get(TRUNCATED_METADATA_KEY) == b"true"
@@ -0,0 +1,72 @@
+"""Compare /get-financial-data latency of the Snowflake RAW source with the DuckDB
+PARQUET source for one quarter.
+
+    python benchmark_sources.py --year 2023 --quarter Q1 --repeats 10 --invalidate
+"""
+import os
+import time
+import argparse
+import statistics
+import urllib.parse
+import urllib.request
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+
+def call(path, params, method="GET", headers=None):
+    """Request path once; returns (wall seconds, X-Execution-Time, X-Cache)"""
+    url = f"{API_BASE_URL}{path}?{urllib.parse.urlencode(params)}"
+    start = time.perf_counter()
+    with urllib.request.urlopen(urllib.request.Request(url, method=method, headers=headers or {})) as response:
+        response.read()
+        headers = response.headers
+    return time.perf_counter() - start, float(headers.get("X-Execution-Time", 0)), headers.get("X-Cache")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+def benchmark(source, args):
+    params = {"year": args.year, "quarter": args.quarter, "data_type": args.data_type, "source": source}
+    if args.page_size:
+        params["page_size"] = args.page_size
+    walls, executions, hits = [], [], 0
+    for _ in range(args.repeats):
+        if args.invalidate:
+            call("/cache/invalidate", {"year": args.year, "quarter": args.quarter, "source": source}, method="POST",
+                 headers={"X-Admin-Token": os.getenv("CACHE_ADMIN_TOKEN", "")})
+        wall, execution, cache = call("/get-financial-data", params)
+        walls.append(wall)
+        executions.append(execution)
+        hits += cache == "HIT"
+    return {
+        "source": source,
+        "p50": percentile(walls, 50),
+        "p95": percentile(walls, 95),
+        "execution_p50": statistics.median(executions),
+        "cache_hits": hits
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--quarter", required=True)
+    parser.add_argument("--data-type", default="Balance Sheet")
+    parser.add_argument("--sources", default="RAW,PARQUET")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--page-size", type=int)
+    parser.add_argument("--invalidate", action="store_true", help="drop cached results before every request")
+    args = parser.parse_args()
+
+    print(f"{'source':<10} {'p50 s':>8} {'p95 s':>8} {'exec p50':>9} {'hits':>5}")
+    for source in args.sources.split(","):
+        result = benchmark(source.strip(), args)
+        print(f"{result['source']:<10} {result['p50']:>8.3f} {result['p95']:>8.3f} "
+              f"{result['execution_p50']:>9.3f} {result['cache_hits']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import re
+import time
+import threading
+from fastapi import HTTPException
+from query_templates import qmark
+
+# Schema of each data source
+SOURCE_SCHEMAS = {
+    "RAW": "SEC_DATA_RAW",
+    "JSON": "SEC_DATA_JSON",
+    "FACT TABLES": "SEC_DATA_DFT"
+}
+
+# Quarter suffix of a table name: SEC_NUM_2023Q1, SEC_DATA_2023_Q1, VIEW_CASH_FLOW_2023_Q1
+QUARTER_PATTERN = re.compile(r"_(\d{4})_?Q([1-4])$")
+
+SAMPLE_ROWS = 3
+
+
+def normalize_source(source: str):
+    """Canonical data source name; the endpoints have used "Raw"/"RAW", "Fact Tables"/"FACT TABLES"."""
+    name = source.strip().upper().replace("_", " ")
+    if name not in SOURCE_SCHEMAS:
+        raise HTTPException(status_code=400, detail="Invalid data source")
+    return name
+
+
+def quarter_tables(source: str, year: int, quarter: str):
+    """Tables holding one quarter of a source, as listed by /get-table-info"""
+    q = quarter.upper().replace("Q", "")
+    suffix = f"{year}Q{q}"
+    if source == "RAW":
+        return [f"SEC_NUM_{suffix}", f"SEC_PRE_{suffix}", f"SEC_SUB_{suffix}", f"SEC_TAG_{suffix}"]
+    if source == "JSON":
+        return [f"SEC_DATA_{year}_Q{q}"]
+    return [f"BALANCE_SHEET_{suffix}", f"INCOME_STATEMENT_{suffix}", f"CASH_FLOW_{suffix}"]
+
+
+def summary_tables(source: str, year: int, quarter: str):
+    """dbt summary marts /get-financial-summary reads for one quarter of a source,
+    built after its fact tables"""
+    if source != "FACT TABLES":
+        return []
+    q = quarter.upper().replace("Q", "")
+    return [f"COMPANY_STATEMENT_SUMMARY_{year}Q{q}"]
+
+
+# Tables a quarter needs before /get-financial-data can serve it
+def required_tables(source: str, year: int, quarter: str):
+    tables = quarter_tables(source, year, quarter)
+    return tables[:3] if source == "RAW" else tables
+
+
+class TableCatalog:
+    """In-memory catalog of the loaded tables, their columns, row counts and load
+    times, read from INFORMATION_SCHEMA in a single query.
+
+    The snapshot is refreshed once it is older than refresh_seconds, or on the next
+    use after mark_stale() (called when a loader reports a new quarter). Sample rows
+    are read once per table and kept until the table changes.
+    """
+
+    def __init__(self, connect, refresh_seconds: int):
+        self.connect = connect
+        self.refresh_seconds = refresh_seconds
+        self._tables = {}  # (schema, table) -> {"type", "row_count", "last_altered", "columns"}
+        self._samples = {}  # (schema, table) -> (last_altered, rows)
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def mark_stale(self):
+        self._loaded_at = None
+
+    def _snapshot(self):
+        with self._lock:
+            if self._loaded_at is None or time.time() - self._loaded_at > self.refresh_seconds:
+                self._tables = self._read_catalog()
+                self._loaded_at = time.time()
+            return self._tables
+
+    def _read_catalog(self):
+        schemas = list(SOURCE_SCHEMAS.values())
+        params = {f"s{i}": schema for i, schema in enumerate(schemas)}
+        placeholders = ", ".join(f"%(s{i})s" for i in range(len(schemas)))
+        conn = self.connect(None)
+        cur = conn.cursor()
+        try:
+            cur.execute(*qmark(f"""
+            SELECT t.table_schema, t.table_name, t.table_type, t.row_count, t.last_altered,
+                   c.column_name, c.data_type
+            FROM information_schema.tables t
+            JOIN information_schema.columns c
+              ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+            WHERE t.table_schema IN ({placeholders})
+            ORDER BY t.table_schema, t.table_name, c.ordinal_position
+            """, params))
+            tables = {}
+            for schema, table, table_type, row_count, last_altered, column, data_type in cur.fetchall():
+                entry = tables.setdefault((schema, table), {
+                    "type": table_type,
+                    "row_count": row_count,
+                    "last_altered": last_altered,
+                    "columns": []
+                })
+                entry["columns"].append({"name": column, "type": data_type})
+            print(f"Catalog refreshed: {len(tables)} tables")
+            return tables
+        finally:
+            cur.close()
+            conn.close()
+
+    def table(self, source: str, table: str):
+        """Catalog entry of a table of source, or None if it is not loaded"""
+        return self._snapshot().get((SOURCE_SCHEMAS[source], table.upper()))
+
+    def is_available(self, source: str, year: int, quarter: str):
+        """Whether every table /get-financial-data reads for the quarter is loaded"""
+        return all(self.table(source, name) is not None for name in required_tables(source, year, quarter))
+
+    def loaded_quarters(self, source: str):
+        """(year, quarter) pairs of source that have all their tables, oldest first"""
+        schema = SOURCE_SCHEMAS[source]
+        candidates = set()
+        for table_schema, table in self._snapshot():
+            match = QUARTER_PATTERN.search(table)
+            if table_schema == schema and match:
+                candidates.add((int(match.group(1)), int(match.group(2))))
+        return sorted(quarter for quarter in candidates if self.is_available(source, quarter[0], f"Q{quarter[1]}"))
+
+    def last_altered(self, source: str, tables):
+        """Latest load time among the given tables of source, None if none are loaded"""
+        times = [entry["last_altered"] for entry in (self.table(source, name) for name in tables) if entry]
+        return max(times) if times else None
+
+    def latest_altered(self, source: str = None):
+        """Latest load time of any table of source (of every source without one), None
+        if nothing is loaded"""
+        schemas = [SOURCE_SCHEMAS[source]] if source else list(SOURCE_SCHEMAS.values())
+        times = [entry["last_altered"] for (schema, _), entry in self._snapshot().items() if schema in schemas]
+        return max(times) if times else None
+
+    def table_info(self, source: str, year: int, quarter: str):
+        """Columns and sample rows of the quarter's loaded tables"""
+        schema = SOURCE_SCHEMAS[source]
+        info = []
+        for name in quarter_tables(source, year, quarter):
+            entry = self.table(source, name)
+            if entry is None:
+                continue
+            info.append({"name": name, "columns": entry["columns"],
+                         "sample_data": self._sample_rows(schema, name, entry["last_altered"])})
+        return info
+
+    def _sample_rows(self, schema: str, table: str, last_altered):
+        cached = self._samples.get((schema, table))
+        if cached is not None and cached[0] == last_altered:
+            return cached[1]
+        conn = self.connect(schema)
+        cur = conn.cursor()
+        try:
+            # schema and table come from the catalog, not from the request
+            cur.execute(f"SELECT * FROM {schema}.{table} LIMIT {SAMPLE_ROWS}")
+            columns = [desc[0] for desc in cur.description]
+            rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
+        self._samples[(schema, table)] = (last_altered, rows)
+        return rows
@@ -0,0 +1,137 @@
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+# Bodies smaller than this are sent as they are
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
+
+def available_encodings():
+    """Encodings this server can produce, most preferred first"""
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str):
+    """Content coding to use for an Accept-Encoding header, or None for identity"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    candidates = [(weights.get(coding, weights.get("*", 0.0)), -rank, coding)
+                  for rank, coding in enumerate(available_encodings())]
+    weight, _, coding = max(candidates)
+    return coding if weight > 0 else None
+
+
+def compressor(encoding: str):
+    """(compress, flush) functions of a streaming compressor for encoding. flush ends
+    the current block so a streamed chunk can be decoded on arrival."""
+    if encoding == "zstd":
+        obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return obj.compress, lambda final: obj.flush() if final else obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return obj.compress, lambda final: obj.flush() if final else obj.flush(zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Compress response bodies with zstd or gzip, whichever the client accepts.
+
+    Streamed bodies are compressed chunk by chunk and flushed after each chunk, so
+    NDJSON and Arrow streams still arrive progressively. Strong ETags get the coding
+    appended (as "<tag>-gzip"), since the compressed bytes differ from the identity
+    representation; conditional.py strips it again when comparing validators.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match", "")
+        await self.app(scope, receive, CompressingSender(send, encoding, self.minimum_size, if_none_match))
+
+
+class CompressingSender:
+    """ASGI send wrapper that holds the response start until the first body chunk
+    shows whether the response is worth compressing"""
+
+    def __init__(self, send, encoding: str, minimum_size: int, if_none_match: str = ""):
+        self.send = send
+        self.if_none_match = if_none_match
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compress = None
+        self.passthrough = False
+
+    def tag_encoding(self, headers):
+        etag = headers.get("etag")
+        if etag and etag.endswith('"') and not etag.startswith("W/"):
+            headers["ETag"] = f'{etag[:-1]}-{self.encoding}"'
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            # Already encoded bodies and 304s, which have no body, go out unchanged
+            self.passthrough = "content-encoding" in headers or message["status"] in (204, 304)
+            if self.passthrough:
+                if message["status"] == 304:
+                    # Echo the validator the client holds: small bodies went out uncompressed
+                    headers = MutableHeaders(scope=message)
+                    etag = headers.get("etag")
+                    if etag and f'{etag[:-1]}-{self.encoding}"' in self.if_none_match:
+                        self.tag_encoding(headers)
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compress is None:
+            headers = MutableHeaders(scope=self.start)
+            if "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            self.compress, self.flush = compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            self.tag_encoding(headers)
+            if "content-length" in headers:
+                del headers["content-length"]
+            if not more_body:
+                body = self.compress(body) + self.flush(True)
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(self.start)
+
+        chunk = self.compress(body) + self.flush(not more_body)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
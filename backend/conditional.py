@@ -0,0 +1,52 @@
+import hashlib
+from fastapi import Request, Response
+from compression import available_encodings
+
+# Clients may keep loaded-quarter responses but must revalidate them before reuse
+CACHE_CONTROL = "no-cache"
+VARY = "Accept, Accept-Encoding"
+
+
+def entity_tag(request: Request, manifest):
+    """Strong ETag of a response over loaded quarter data: the route, its query
+    parameters and negotiated media type, and the load manifest of the tables read
+    (their LAST_ALTERED times). None when there is no manifest to derive it from."""
+    if manifest is None:
+        return None
+    params = sorted(request.query_params.multi_items())
+    identity = repr((request.url.path, params, request.headers.get("accept", ""), manifest))
+    return f'"{hashlib.sha256(identity.encode()).hexdigest()[:32]}"'
+
+
+def validator_headers(etag):
+    """Headers that let the client revalidate the response with If-None-Match"""
+    if etag is None:
+        return {}
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": VARY}
+
+
+def _opaque_tag(tag: str):
+    """Tag without the weak prefix or the content coding CompressionMiddleware appended"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for encoding in available_encodings():
+        if tag.endswith(f'-{encoding}"'):
+            return tag[:-len(encoding) - 2] + '"'
+    return tag
+
+
+def is_not_modified(request: Request, etag):
+    """Whether the request's If-None-Match already names etag (weak comparison, as
+    RFC 9110 specifies for If-None-Match)"""
+    if_none_match = request.headers.get("if-none-match")
+    if etag is None or not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_opaque_tag(tag) == etag for tag in if_none_match.split(","))
+
+
+def not_modified_response(etag):
+    """Body-less 304 carrying the validators again"""
+    return Response(status_code=304, headers=validator_headers(etag))
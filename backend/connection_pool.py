@@ -0,0 +1,73 @@
+import time
+import threading
+
+
+class PooledConnection:
+    """A pooled Snowflake connection; close() hands it back to the pool instead of
+    ending the session"""
+
+    def __init__(self, pool, schema_name, conn):
+        self._pool = pool
+        self._schema_name = schema_name
+        self._conn = conn
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._schema_name, self._conn)
+
+
+class ConnectionPool:
+    """Keeps up to max_idle open connections per schema so requests skip the Snowflake
+    login. Concurrency is bounded by the route slots, not by the pool: when no idle
+    connection is left a new one is opened. Only queries that leave the session state
+    alone may use pooled connections."""
+
+    def __init__(self, connect, max_idle: int, max_idle_seconds: int):
+        self.connect = connect
+        self.max_idle = max_idle
+        self.max_idle_seconds = max_idle_seconds
+        self._idle = {}  # schema -> [(conn, released_at)]
+        self._lock = threading.Lock()
+        self.metrics = {"opened": 0, "reused": 0, "discarded": 0}
+
+    def acquire(self, schema_name: str):
+        """An open connection for schema_name, reused when one is idle"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(schema_name)
+                if not idle:
+                    self.metrics["opened"] += 1
+                    break
+                conn, released_at = idle.pop()
+            if time.time() - released_at > self.max_idle_seconds or conn.is_closed():
+                self._discard(conn)
+                continue
+            with self._lock:
+                self.metrics["reused"] += 1
+            return PooledConnection(self, schema_name, conn)
+        return PooledConnection(self, schema_name, self.connect(schema_name))
+
+    def release(self, schema_name: str, conn):
+        with self._lock:
+            idle = self._idle.setdefault(schema_name, [])
+            if len(idle) < self.max_idle and not conn.is_closed():
+                idle.append((conn, time.time()))
+                return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self.metrics["discarded"] += 1
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"Error closing pooled connection: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, "idle": sum(len(idle) for idle in self._idle.values())}
@@ -0,0 +1,159 @@
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram
+
+# Phases a request's time is split into; each phase is timed exclusive of nested ones
+PHASES = ("connect", "execute", "fetch", "transform", "serialize")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUEST_SECONDS = Histogram(
+    "backend_request_duration_seconds", "Request time including the streamed body",
+    ["route", "method", "status"], buckets=LATENCY_BUCKETS
+)
+PHASE_SECONDS = Histogram(
+    "backend_request_phase_seconds", "Time per request spent in each phase",
+    ["route", "phase"], buckets=LATENCY_BUCKETS
+)
+RESPONSE_ROWS = Counter("backend_response_rows_total", "Result rows sent", ["route"])
+RESPONSE_BYTES = Counter("backend_response_bytes_total", "Response body bytes sent", ["route"])
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Phase times, result size and query ids of one request"""
+
+    def __init__(self):
+        self.phases = {}
+        self.rows = 0
+        self.bytes = 0
+        self.query_ids = []
+        self._stack = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a phase. Time spent in a phase nested inside it is only charged to the
+        inner one, so the phases add up to the request time."""
+        now = time.perf_counter()
+        with self._lock:
+            if self._stack:
+                self._charge(self._stack[-1], now)
+            self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            with self._lock:
+                self._charge(self._stack.pop(), now)
+                if self._stack:
+                    self._stack[-1][1] = now
+
+    def _charge(self, entry, now):
+        name, started = entry
+        self.phases[name] = self.phases.get(name, 0.0) + (now - started)
+        entry[1] = now
+
+    def add_rows(self, rows: int):
+        with self._lock:
+            self.rows += rows
+
+    def add_bytes(self, size: int):
+        with self._lock:
+            self.bytes += size
+
+    def add_query_id(self, query_id: str):
+        with self._lock:
+            self.query_ids.append(query_id)
+
+    def merge(self, other):
+        """Add another request part's phases, rows and query ids to these"""
+        with self._lock:
+            for name, seconds in other.phases.items():
+                self.phases[name] = self.phases.get(name, 0.0) + seconds
+            self.rows += other.rows
+            self.bytes += other.bytes
+            self.query_ids.extend(other.query_ids)
+
+
+def start_request():
+    """Start collecting timings for the request being handled; returns them"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+@contextmanager
+def part_timings():
+    """Time one of several concurrent parts of a request (e.g. a batch item) on its
+    own, then add it to the request. Must run in the part's own task."""
+    parent = current_timings()
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        parent.merge(timings)
+
+
+def current_timings():
+    """Timings of the request being handled (a throwaway instance outside requests)"""
+    return _current.get() or RequestTimings()
+
+
+def phase(name: str):
+    """Time a phase of the current request"""
+    return current_timings().phase(name)
+
+
+def timed_iter(iterable, name: str):
+    """Charge the time spent producing each item to a phase. The request is looked up
+    now, so the iterator may be consumed on another thread."""
+    return _timed_iter(iter(iterable), name, current_timings())
+
+
+def _timed_iter(iterator, name, timings):
+    while True:
+        with timings.phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def counted_tables(tables):
+    """Pass result tables through, adding their rows to the current request"""
+    return _counted_tables(tables, current_timings())
+
+
+def _counted_tables(tables, timings):
+    for table in tables:
+        timings.add_rows(table.num_rows)
+        yield table
+
+
+def finish_request(timings: RequestTimings, route: str, method: str, status: int, duration: float, **fields):
+    """Record the request in the metrics and write its structured access log line"""
+    REQUEST_SECONDS.labels(route, method, str(status)).observe(duration)
+    for name, seconds in timings.phases.items():
+        PHASE_SECONDS.labels(route, name).observe(seconds)
+    RESPONSE_ROWS.labels(route).inc(timings.rows)
+    RESPONSE_BYTES.labels(route).inc(timings.bytes)
+    print(json.dumps({
+        "type": "access",
+        "route": route,
+        "method": method,
+        "status": status,
+        "duration_ms": round(duration * 1000, 2),
+        "phases_ms": {name: round(seconds * 1000, 2) for name, seconds in timings.phases.items()},
+        "rows": timings.rows,
+        "bytes": timings.bytes,
+        "query_ids": timings.query_ids,
+        **fields
+    }))
@@ -1,25 +1,53 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Header, Response
+from fastapi.responses import StreamingResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from dotenv import load_dotenv
 import snowflake.connector
 import os
-import numpy as np
 from pydantic import BaseModel
 import time
+import asyncio
+import functools
+import itertools
+import contextlib
+from typing import Optional, List
+from result_cache import ResultCache, normalize_sql
+from result_formats import (JsonLayout, NDJSON_MEDIA_TYPE, dumps, table_columns, sanitize_float_values, iter_arrow_tables, concat_arrow_tables, close_after,
+                            respond_with_tables)
+from pagination import MAX_PAGE_SIZE, FILTER_COLUMNS, paginate_query, next_cursor
+from tickers import resolve_cik, resolve_symbols
+from query_runner import run_blocking, route_slot, execute_query, set_statement_timeout
+from admission import (CUSTOM_QUERY_TIMEOUT, CUSTOM_QUERY_MAX_ROWS, CUSTOM_QUERY_MAX_QUEUE, is_select, is_deterministic,
+                       check_scan_estimate, cap_tables, is_truncated)
+from single_flight import SingleFlight
+from catalog import TableCatalog, SOURCE_SCHEMAS, normalize_source, quarter_tables, summary_tables
+from connection_pool import ConnectionPool
+from parquet_engine import ParquetEngine, PARQUET_QUERY_TIMEOUT
+from query_templates import statement_query, statement_totals_query, quarter_suffix
+from compression import CompressionMiddleware
+from conditional import entity_tag, validator_headers, is_not_modified, not_modified_response
+from time_series import (SERIES_SOURCES, MAX_SERIES_TAGS, series_cache_tag, build_series_query, covered_quarters,
+                         merge_series, align_series)
+from instrumentation import start_request, finish_request, phase, current_timings, part_timings
  
 app = FastAPI()
 load_dotenv()
+# Added before the instrumentation middleware so it runs inside it: /metrics counts compressed bytes
+app.add_middleware(CompressionMiddleware)
  
  
 def get_snowflake_connection(schema_name: str):
     try:
-        conn = snowflake.connector.connect(
-            user=os.getenv('SNOWFLAKE_USER'),
-            password=os.getenv('SNOWFLAKE_PASSWORD'),
-            account=os.getenv('SNOWFLAKE_ACCOUNT'),
-            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-            database=os.getenv('SNOWFLAKE_DATABASE'),
-            schema=schema_name  # Set schema dynamically
-        )
+        with phase("connect"):
+            conn = snowflake.connector.connect(
+                user=os.getenv('SNOWFLAKE_USER'),
+                password=os.getenv('SNOWFLAKE_PASSWORD'),
+                account=os.getenv('SNOWFLAKE_ACCOUNT'),
+                warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+                database=os.getenv('SNOWFLAKE_DATABASE'),
+                schema=schema_name,  # Set schema dynamically
+                paramstyle="qmark"  # server-side binds, see query_templates.qmark
+            )
         print(f"Successfully connected to Snowflake with schema {schema_name}.")
         return conn
     except Exception as e:
@@ -29,85 +57,161 @@ def get_snowflake_connection(schema_name: str):
  
 class QueryModel(BaseModel):
     query: str
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Time every request through its streamed body, then export it to /metrics and
+    write one structured access log line"""
+    timings = start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    body = response.body_iterator
+
+    async def instrumented_body():
+        try:
+            async for chunk in body:
+                timings.add_bytes(len(chunk))
+                yield chunk
+        finally:
+            finish_request(timings, route_path, request.method, response.status_code,
+                           time.perf_counter() - started, cache=response.headers.get("X-Cache"))
+
+    response.body_iterator = instrumented_body()
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request and phase latency histograms, rows and bytes sent"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
    
    
-def sanitize_float_values(data):
-    """Convert special float values to None."""
-    for item in data:
-        for key, value in item.items():
-            if isinstance(value, float) and (np.isnan(value) or np.isinf(value)):
-                item[key] = None
-    return data
- 
- 
+# Loaded tables, columns and load times; refreshed periodically and when a loader reports
+table_catalog = TableCatalog(get_snowflake_connection, int(os.getenv("CATALOG_REFRESH_SECONDS", 600)))
+
+# Open sessions reused by the statement endpoints, whose queries are fully qualified
+connection_pool = ConnectionPool(
+    get_snowflake_connection,
+    max_idle=int(os.getenv("SNOWFLAKE_POOL_SIZE", 8)),
+    max_idle_seconds=int(os.getenv("SNOWFLAKE_POOL_IDLE_SECONDS", 900))
+)
+
+# Identical statement queries running at the same time share one Snowflake execution
+query_flights = SingleFlight()
+
+# In-process DuckDB over the extracted Parquet files, the PARQUET data source
+parquet_engine = ParquetEngine()
+
+# Cache tag for custom query results, which may read any quarter
+CUSTOM_QUERY_CACHE_TAG = "custom"
+
+
+def quarter_cache_tag(source: str, suffix: str):
+    """Cache tag of one source's data for one quarter, e.g. FACT_TABLES-2023Q1"""
+    return f"{source.upper().replace(' ', '_')}-{suffix}"
+
+
+def cache_source_version(tags):
+    """Load times of the tables behind a cached result, from its cache tags. The disk
+    tier serves an entry only while they are unchanged, so a reload the backend missed
+    the invalidation of (sent while it was down) is not hidden by old files."""
+    versions = []
+    for tag in sorted(tags):
+        name, _, scope = tag.rpartition("-")
+        if tag == CUSTOM_QUERY_CACHE_TAG:
+            modified = table_catalog.latest_altered()
+        elif scope == "SERIES":
+            modified = table_catalog.latest_altered(normalize_source(name))
+        elif name == "PARQUET":
+            modified = parquet_engine.last_modified(scope)
+        else:
+            # Summary results share the quarter's tag, so the marts count too
+            source = normalize_source(name)
+            year, quarter = int(scope[:4]), scope[4:]
+            modified = table_catalog.last_altered(source, quarter_tables(source, year, quarter) +
+                                                  summary_tables(source, year, quarter))
+        if modified is None:
+            return None
+        versions.append(f"{tag}={modified}")
+    return ";".join(versions)
+
+
+# Results of loaded quarters never change; keep them until the loader invalidates them
+result_cache = ResultCache(
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+    disk_dir=os.getenv("RESULT_CACHE_DIR"),
+    source_version=cache_source_version
+)
+
+
+def quarter_manifest(source: str, year: int, quarter: str, summary: bool = False):
+    """Load manifest a quarter's responses are validated against: the latest
+    LAST_ALTERED of its tables from the catalog (file times for PARQUET), with
+    summary also of the summary marts. None when the quarter is not loaded, which
+    leaves the response without an ETag."""
+    try:
+        if source == "PARQUET":
+            modified = parquet_engine.last_modified(quarter_suffix(year, quarter))
+        else:
+            source = normalize_source(source)
+            tables = quarter_tables(source, year, quarter)
+            if summary:
+                tables += summary_tables(source, year, quarter)
+            modified = table_catalog.last_altered(source, tables)
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Serve the data without validators rather than fail the request
+        print(f"Could not read the load manifest: {str(e)}")
+        return None
+    return None if modified is None else (source, str(modified))
+
+
 @app.get("/check-availability")
 async def check_data_availability(source: str, year: int, quarter: str):
+    """Answered from the table catalog: whether the quarter's tables are loaded"""
     try:
-        conn = get_snowflake_connection()
-        cur = conn.cursor()
-       
-        # Query to check if data exists for the given parameters
-        query = f"""
-        SELECT COUNT(*)
-        FROM sec_tag_data_raw
-        WHERE source_file = '{year}Q{quarter.replace("Q", "")}'
-        """
-       
-        cur.execute(query)
-        count = cur.fetchone()[0]
-       
-        return {"available": count > 0}
+        suffix = quarter_suffix(year, quarter)
+        if source.upper() == "PARQUET":
+            return {"available": await run_blocking(parquet_engine.is_available, suffix)}
+        available = await run_blocking(table_catalog.is_available, normalize_source(source), year, quarter)
+        return {"available": available}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
  
 @app.get("/get-table-info")
 async def get_table_info(data_source: str, year: int, quarter: str):
+    """Columns and sample rows of a quarter's tables, from the table catalog"""
     try:
-        if data_source == "RAW":
-            schema_name = "SEC_DATA_RAW"
-        elif data_source == "JSON":
-            schema_name = "SEC_DATA_JSON"
-        elif data_source == "Fact Tables":
-            schema_name = "SEC_DATA_DFT"
-        conn = get_snowflake_connection(schema_name)
-        cur = conn.cursor()
-       
-        stage_name = f"{year}Q{quarter.replace('Q', '')}"
-        if data_source == "Raw":
-            tables = [f"SEC_NUM_{stage_name}", f"SEC_PRE_{stage_name}", f"SEC_SUB_{stage_name}", f"SEC_TAG_{stage_name}"]
-        elif data_source == "JSON":
-            tables = [f"SEC_DATA_{stage_name}"]
-        elif data_source == "Fact Tables":
-            tables = [f"BALANCE_SHEET_{stage_name}", f"INCOME_STATEMENT_{stage_name}", f"CASH_FLOW_{stage_name}"]
-        else:
-            raise HTTPException(status_code=400, detail="Invalid data source")
-       
-        table_info = []
-        for table in tables:
-            result = cur.execute(f"DESCRIBE TABLE {schema_name}.{table}")
-            columns = [{"name": row[0], "type": row[1]} for row in cur.fetchall()]
-           
-            cur.execute(f"SELECT * FROM {schema_name}.{table} LIMIT 3")
-            sample_data = [dict(zip([desc[0] for desc in cur.description], row)) for row in cur.fetchall()]
-           
-            table_info.append({"name": table, "columns": columns, "sample_data": sample_data})
-       
+        source = normalize_source(data_source)
+        async with route_slot("table-info"):
+            table_info = await run_blocking(table_catalog.table_info, source, year, quarter)
+        for table in table_info:
+            sanitize_float_values(table["sample_data"])
         return table_info
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch table info")
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
-           
+
+
+def custom_query_response(request: Request, table, cache_status: str, layout: str):
+    """Capped custom query result; X-Truncated (and truncated in JSON bodies) tells
+    whether rows were dropped to stay under the row/byte limits"""
+    truncated = is_truncated(table)
+    headers = {"X-Cache": cache_status, "X-Truncated": "true" if truncated else "false"}
+    return respond_with_tables(request, [table], headers=headers, layout=layout, truncated=truncated,
+                               row_limit=CUSTOM_QUERY_MAX_ROWS)
+
+
 @app.post("/execute-custom-query")
-async def execute_custom_query(query_model: QueryModel, data_source: str):
+async def execute_custom_query(request: Request, query_model: QueryModel, data_source: str,
+                               layout: JsonLayout = "rows"):
     try:
         if data_source == "Raw":
             schema_name = "SEC_DATA_RAW"
@@ -115,16 +219,41 @@ async def execute_custom_query(query_model: QueryModel, data_source: str):
             schema_name = "SEC_DATA_JSON"
         elif data_source == "Fact Tables":
             schema_name = "SEC_DATA_DFT"
-        conn = get_snowflake_connection(schema_name)
-        cur = conn.cursor()
         query = query_model.query
-        cur.execute(query)
-        columns = [desc[0] for desc in cur.description]
-        rows = cur.fetchall()
-        results = [dict(zip(columns, row)) for row in rows]
-        # Sanitize float values
-        sanitized_results = sanitize_float_values(results)
-        return {"data": sanitized_results}
+        if data_source == "Parquet":
+            # Local files: nothing worth caching, but the slots, deadline and result caps apply
+            await run_blocking(parquet_engine.refresh)
+            table = await run_parquet_query("custom-query", cap_tables, query, timeout=CUSTOM_QUERY_TIMEOUT,
+                                            max_queue=CUSTOM_QUERY_MAX_QUEUE)
+            return await run_blocking(custom_query_response, request, table, "MISS", layout)
+
+        cache_key = ("sql", data_source, normalize_sql(query))
+        cache_tags = (CUSTOM_QUERY_CACHE_TAG,)
+
+        cached = await run_blocking(result_cache.get, cache_key, cache_tags)
+        if cached is not None:
+            return await run_blocking(custom_query_response, request, cached, "HIT", layout)
+
+        # Bounded concurrency with a bounded queue in front of it; beyond that, 429
+        async with route_slot("custom-query", max_queue=CUSTOM_QUERY_MAX_QUEUE):
+            conn = await run_blocking(get_snowflake_connection, schema_name)
+            cur = conn.cursor()
+            await run_blocking(set_statement_timeout, conn, CUSTOM_QUERY_TIMEOUT)
+
+            if is_select(query):
+                # Reject whole-table scans before they reach the warehouse
+                await execute_query(conn, cur, f"EXPLAIN USING JSON {query}", request=request)
+                check_scan_estimate((await run_blocking(cur.fetchone))[0])
+
+            await execute_query(conn, cur, query, request=request, timeout=CUSTOM_QUERY_TIMEOUT)
+
+        # Only up to the row/byte caps is ever read from the result
+        table = await run_blocking(cap_tables, iter_arrow_tables(cur))
+        if is_select(query) and is_deterministic(query):
+            await run_blocking(result_cache.put, cache_key, table, cache_tags)
+        return await run_blocking(custom_query_response, request, table, "MISS", layout)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to execute query")
     finally:
@@ -134,107 +263,683 @@ async def execute_custom_query(query_model: QueryModel, data_source: str):
             conn.close()
            
                        
+async def run_shared_query(schema_name: str, query: str, params, flight):
+    """Execute a statement query on a pooled connection; returns its query id and time"""
+    async with route_slot("financial-data"):
+        conn = await run_blocking(connection_pool.acquire, schema_name)
+        cur = conn.cursor()
+        try:
+            start_time = time.time()
+            print(f"Executing query: {query}")
+            query_id = await execute_query(conn, cur, query, params, request=flight)
+            return query_id, time.time() - start_time
+        finally:
+            cur.close()
+            conn.close()
+
+
+async def run_statement_query(request: Request, cache_key, schema_name: str, query: str, params=None):
+    """Run a statement query, or join the identical one already running. Concurrent
+    requests for the same key wait for one execution, then each reads the finished
+    query's result by its id. Returns (query id, execution time, joined)."""
+    with phase("execute"):
+        (query_id, execution_time), joined = await query_flights.do(
+            cache_key, functools.partial(run_shared_query, schema_name, query, params), request)
+    if joined:
+        current_timings().add_query_id(query_id)
+    return query_id, execution_time, joined
+
+
+def paged_response(request: Request, source: str, table, page_size: Optional[int], headers: dict,
+                   execution_time: float, layout: str):
+    """Response for one page; the cursor of the following page goes in X-Next-Cursor
+    and, for JSON bodies, in next_cursor"""
+    cursor = next_cursor(source, table, page_size)
+    if cursor:
+        headers["X-Next-Cursor"] = cursor
+    return respond_with_tables(request, [table], headers=headers, layout=layout, execution_time=execution_time,
+                               next_cursor=cursor)
+
+
+def fetch_dicts(cur):
+    """Fetch the remaining cursor rows as a list of column -> value dicts"""
+    columns = [desc[0] for desc in cur.description]
+    with phase("fetch"):
+        rows = cur.fetchall()
+    current_timings().add_rows(len(rows))
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def financial_data_filters(source: str, cik: Optional[int], symbol: Optional[str], tag: Optional[str],
+                           adsh: Optional[List[str]]):
+    """Filters of a /get-financial-data request. Sources without a symbol column get
+    the symbol resolved to its CIK, sources without a cik column (JSON) the CIK
+    resolved to its symbols."""
+    filters = {"cik": cik, "symbol": symbol, "tag": tag, "adsh": adsh}
+    if cik is not None and "cik" not in FILTER_COLUMNS.get(source, {}):
+        symbols = resolve_symbols(cik)
+        if not symbols:
+            raise HTTPException(status_code=400, detail=f"No ticker symbol for CIK {cik}")
+        if symbol and symbol.strip().lower() not in symbols:
+            raise HTTPException(status_code=400, detail="cik and symbol refer to different companies")
+        filters["symbol"] = symbol or symbols
+        filters["cik"] = None
+    if symbol and "symbol" not in FILTER_COLUMNS.get(source, {}):
+        resolved = resolve_cik(symbol)
+        if resolved is None:
+            raise HTTPException(status_code=400, detail=f"Unknown ticker symbol: {symbol}")
+        if cik is not None and cik != resolved:
+            raise HTTPException(status_code=400, detail="cik and symbol refer to different companies")
+        filters["cik"] = resolved
+        filters["symbol"] = None
+    return {name: value for name, value in filters.items() if value}
+
+
+async def run_parquet_query(route: str, consume, query: str, params=None, timeout: int = PARQUET_QUERY_TIMEOUT,
+                            max_queue: int = None):
+    """Run a DuckDB query in one of the route's slots and return consume(tables) of its
+    result. Past timeout seconds, or when the handler is cancelled, the query is
+    interrupted so it stops holding an executor thread."""
+    async with route_slot(route, max_queue=max_queue):
+        cur = parquet_engine.cursor()
+        tables = parquet_engine.iter_tables(query, params, cur=cur)
+        future = asyncio.ensure_future(run_blocking(consume, tables))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            cur.interrupt()
+            # The worker thread lets go of the generator once DuckDB stops
+            await asyncio.wait([future])
+            with contextlib.suppress(Exception):
+                future.result()
+            if isinstance(e, asyncio.TimeoutError):
+                raise HTTPException(status_code=504, detail=f"Query exceeded the {timeout} second time limit")
+            raise
+        finally:
+            if future.done():
+                tables.close()
+
+
+async def parquet_financial_data(request: Request, year: int, quarter: str, query: str, params, cache_key,
+                                 cache_tags, paged: bool, page_size: Optional[int], layout: str, validators: dict):
+    """/get-financial-data for the PARQUET source, answered in process by DuckDB"""
+    suffix = quarter_suffix(year, quarter)
+    if not await run_blocking(parquet_engine.is_available, suffix):
+        raise HTTPException(status_code=404, detail=f"No Parquet files for {suffix}")
+
+    start_time = time.time()
+    tables = parquet_engine.iter_tables(query, params)
+    if paged:
+        table = await run_blocking(concat_arrow_tables, tables)
+        execution_time = time.time() - start_time
+        await run_blocking(result_cache.put, cache_key, table, cache_tags)
+        headers = {"X-Cache": "MISS", "X-Execution-Time": str(execution_time), **validators}
+        return await run_blocking(paged_response, request, "PARQUET", table, page_size, headers, execution_time, layout)
+
+    # DuckDB runs the query when the first batch is pulled
+    first = await run_blocking(next, tables)
+    execution_time = time.time() - start_time
+    tables = result_cache.tee(itertools.chain([first], tables), cache_key, cache_tags)
+    headers = {"X-Cache": "MISS", "X-Execution-Time": str(execution_time), **validators}
+    return await run_blocking(respond_with_tables, request, tables, headers=headers, layout=layout,
+                              execution_time=execution_time)
+
+
 @app.get("/get-financial-data")
-async def get_financial_data(year: int, quarter: str, data_type: str, source: str):
+async def get_financial_data(request: Request, year: int, quarter: str, data_type: str, source: str,
+                             cik: Optional[int] = None, symbol: Optional[str] = None, tag: Optional[str] = None,
+                             adsh: Optional[List[str]] = Query(None),
+                             page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                             cursor: Optional[str] = None,
+                             layout: JsonLayout = "rows"):
+    handed_off = False
     try:
-        schema_name = None
-        query = None
-        if source == "RAW":
-            schema_name = "SEC_DATA_RAW"
-        elif source == "FACT TABLES":
-            schema_name = "SEC_DATA_DFT"
-        elif source == "JSON":
-            schema_name = "SEC_DATA_JSON"
-        conn = get_snowflake_connection(schema_name)
+        schema_name, query, params = statement_query(source, data_type, year, quarter)
+        cache_key = ("data", source, year, quarter_suffix(year, quarter), data_type)
+        cache_tags = (quarter_cache_tag(source, quarter_suffix(year, quarter)),)
+
+        # Loaded quarters only change on a reload, so repeat views are revalidated
+        etag = entity_tag(request, await run_blocking(quarter_manifest, source, year, quarter))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        validators = validator_headers(etag)
+
+        filters = financial_data_filters(source, cik, symbol, tag, adsh)
+        paged = bool(filters or page_size or cursor)
+        if paged:
+            # Filtered and paged requests let the warehouse do the work, all values bound
+            _, base_query, params = statement_query(source, data_type, year, quarter, ordered=False)
+            query, page_params = paginate_query(source, base_query, filters, page_size, cursor)
+            params = {**params, **page_params}
+            cache_key += (tuple(sorted((name, str(value)) for name, value in filters.items())), page_size, cursor)
+
+        cached = await run_blocking(result_cache.get, cache_key, cache_tags)
+        if cached is not None:
+            headers = {"X-Cache": "HIT", "X-Execution-Time": "0", **validators}
+            if not paged:
+                return await run_blocking(respond_with_tables, request, [cached], headers=headers, layout=layout,
+                                          execution_time=0)
+            return await run_blocking(paged_response, request, source, cached, page_size, headers, 0, layout)
+
+        if source == "PARQUET":
+            return await parquet_financial_data(request, year, quarter, query, params, cache_key, cache_tags,
+                                                paged, page_size, layout, validators)
+
+        query_id, execution_time, joined = await run_statement_query(request, cache_key, schema_name, query, params)
+        conn = await run_blocking(connection_pool.acquire, schema_name)
         cur = conn.cursor()
-       
-        start_time = time.time()
-        if source == "RAW":
-            # Existing logic for RAW data
-            stmt_type = {
-                "Income Statement": "IC",
-                "Balance Sheet": "BS",
-                "Cash Flow": "CF"
-            }.get(data_type)
-           
-            if not stmt_type:
-                raise HTTPException(status_code=400, detail="Invalid data type")
-           
-            query = f"""
-            SELECT
-                s.adsh, s.cik, s.name, s.sic, s.countryba, s.stprba, s.cityba, s.filed,
-                p.line, p.plabel, n.tag, n.version, n.ddate, n.qtrs, n.uom, n.value
-            FROM
-                {schema_name}.sec_sub_{year}Q{quarter.replace('Q', '')} s
-            JOIN
-                {schema_name}.sec_pre_{year}Q{quarter.replace('Q', '')} p ON s.adsh = p.adsh
-            JOIN
-                {schema_name}.sec_num_{year}Q{quarter.replace('Q', '')} n ON s.adsh = n.adsh AND p.tag = n.tag AND p.version = n.version
-            WHERE
-                p.stmt = '{stmt_type}'
-            ORDER BY
-                s.adsh, p.line;
-            """
-        elif source == "FACT TABLES":
-            # Existing logic for FACT data
-            table_name = {
-                "Balance Sheet": f"BALANCE_SHEET_{year}Q{quarter.replace('Q', '')}",
-                "Income Statement": f"INCOME_STATEMENT_{year}Q{quarter.replace('Q', '')}",
-                "Cash Flow": f"CASH_FLOW_{year}Q{quarter.replace('Q', '')}"
-            }.get(data_type)
-           
-            if not table_name:
-                raise HTTPException(status_code=400, detail="Invalid data type")
-           
-            query = f"SELECT * FROM {schema_name}.{table_name}"
-       
-        elif source == "JSON":
-            # Logic for JSON data
-            view_name = {
-                "Balance Sheet": f"view_balance_sheet_{year}_Q{quarter.replace('Q', '')}",
-                "Income Statement": f"view_income_statement_{year}_Q{quarter.replace('Q', '')}",
-                "Cash Flow": f"view_cash_flow_{year}_Q{quarter.replace('Q', '')}"
-            }.get(data_type)
-           
-            if not view_name:
-                raise HTTPException(status_code=400, detail="Invalid data type")
-           
-            query = f"SELECT * FROM {schema_name}.{view_name}"
-       
-        print(f"Executing query: {query}")
-        cur.execute(query)
-        execution_time = time.time() - start_time
-        columns = [desc[0] for desc in cur.description]
-        rows = cur.fetchall()
-        results = [dict(zip(columns, row)) for row in rows]
-       
-        sanitized_results = sanitize_float_values(results)
-       
-        return {"data": sanitized_results, "execution_time": execution_time}
+        await run_blocking(cur.get_results_from_sfqid, query_id)
+        headers = {"X-Cache": "MISS", "X-Execution-Time": str(execution_time),
+                   "X-Coalesced": "true" if joined else "false", **validators}
+
+        if paged:
+            # A page is bounded by page_size, so it is materialized to find the next cursor
+            table = await run_blocking(concat_arrow_tables, iter_arrow_tables(cur))
+            if not joined:
+                await run_blocking(result_cache.put, cache_key, table, cache_tags)
+            return await run_blocking(paged_response, request, source, table, page_size, headers, execution_time,
+                                      layout)
+
+        tables = iter_arrow_tables(cur)
+        if not joined:
+            tables = result_cache.tee(tables, cache_key, cache_tags)
+        # The response owns the connection from here on, streamed or not
+        handed_off = True
+        return await run_blocking(
+            respond_with_tables,
+            request,
+            close_after(tables, conn, cur),
+            headers=headers,
+            layout=layout,
+            execution_time=execution_time
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error executing query: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch data from the database")
+    finally:
+        if not handed_off:
+            if 'cur' in locals():
+                cur.close()
+            if 'conn' in locals():
+                conn.close()
+
+
+class StatementSpec(BaseModel):
+    year: int
+    quarter: str
+    data_type: str
+    source: str
+
+
+class BatchModel(BaseModel):
+    requests: List[StatementSpec]
+    # Only each statement's row count and value total, computed in the warehouse
+    aggregate: bool = False
+
+
+# Statements one batch request may ask for
+MAX_BATCH_SPECS = int(os.getenv("MAX_BATCH_SPECS", 24))
+# Rows and bytes of whole statements one batch request may return, split evenly
+# between its specs; a spec over its share gets an error line instead of its rows
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", 500000))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", 256 * 1024 * 1024))
+
+
+def batch_spec_query(spec: StatementSpec, aggregate: bool):
+    """Schema, query, bind variables and cache key of one batch spec"""
+    suffix = quarter_suffix(spec.year, spec.quarter)
+    if aggregate:
+        schema_name, query, params = statement_totals_query(spec.source, spec.data_type, spec.year, spec.quarter)
+        return schema_name, query, params, ("totals", spec.source, spec.year, suffix, spec.data_type)
+    schema_name, query, params = statement_query(spec.source, spec.data_type, spec.year, spec.quarter)
+    return schema_name, query, params, ("data", spec.source, spec.year, suffix, spec.data_type)
+
+
+async def statement_table(request: Request, spec: StatementSpec, aggregate: bool, max_rows: int, max_bytes: int):
+    """Result of one batch spec, from the cache, DuckDB or the warehouse; at most
+    max_rows rows / max_bytes bytes of it are read (see cap_tables). Returns the
+    table, execution time, cache status and whether it is over those limits."""
+    schema_name, query, params, cache_key = batch_spec_query(spec, aggregate)
+    suffix = quarter_suffix(spec.year, spec.quarter)
+    cache_tags = (quarter_cache_tag(spec.source, suffix),)
+    capped = functools.partial(cap_tables, max_rows=max_rows, max_bytes=max_bytes)
+
+    cached = await run_blocking(result_cache.get, cache_key, cache_tags)
+    if cached is not None:
+        return cached, 0, "HIT", cached.num_rows > max_rows or cached.nbytes > max_bytes
+
+    if spec.source == "PARQUET":
+        # Answered in process by DuckDB, not by the warehouse
+        if not await run_blocking(parquet_engine.is_available, suffix):
+            raise HTTPException(status_code=404, detail=f"No Parquet files for {suffix}")
+        start_time = time.time()
+        table = await run_parquet_query("parquet", capped, query, params)
+        joined = False
+        execution_time = time.time() - start_time
+    else:
+        query_id, execution_time, joined = await run_statement_query(request, cache_key, schema_name, query, params)
+        conn = await run_blocking(connection_pool.acquire, schema_name)
+        cur = conn.cursor()
+        try:
+            await run_blocking(cur.get_results_from_sfqid, query_id)
+            table = await run_blocking(capped, iter_arrow_tables(cur))
+        finally:
+            cur.close()
+            conn.close()
+    truncated = is_truncated(table)
+    if not joined and not truncated:
+        await run_blocking(result_cache.put, cache_key, table, cache_tags)
+    return table, execution_time, "MISS", truncated
+
+
+async def batch_item(request: Request, index: int, spec: StatementSpec, aggregate: bool, max_rows: int,
+                     max_bytes: int):
+    """One NDJSON line of a batch response: the spec's result in the columns layout, or its error"""
+    with part_timings():
+        tag = {"index": index, "spec": spec.model_dump()}
+        try:
+            # Bounds how many specs hold a materialized statement at once
+            async with route_slot("batch"):
+                table, execution_time, cache_status, truncated = await statement_table(
+                    request, spec, aggregate, max_rows, max_bytes)
+                if truncated:
+                    return dumps({**tag, "status": 413,
+                                  "error": f"More than {max_rows} rows or {max_bytes} bytes; ask for fewer "
+                                           f"statements or aggregate totals"}) + b"\n"
+                return await run_blocking(lambda: dumps({**tag, "cache": cache_status,
+                                                         "execution_time": execution_time,
+                                                         **table_columns(table)}) + b"\n")
+        except HTTPException as e:
+            return dumps({**tag, "status": e.status_code, "error": e.detail}) + b"\n"
+        except Exception as e:
+            print(f"Error in batch item {index}: {str(e)}")
+            return dumps({**tag, "status": 500, "error": "Failed to fetch data from the database"}) + b"\n"
+
+
+@app.post("/get-financial-data/batch")
+async def get_financial_data_batch(request: Request, batch: BatchModel):
+    """Several statements/quarters at once. The specs run concurrently on the shared
+    connection pool and each result is streamed as one NDJSON line, tagged with the
+    spec's index, as soon as it is ready. With aggregate, each line holds only the
+    statement's ROW_COUNT and TOTAL_VALUE; otherwise the whole statements, within
+    MAX_BATCH_ROWS / MAX_BATCH_BYTES for the batch."""
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="No requests in batch")
+    if len(batch.requests) > MAX_BATCH_SPECS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SPECS} requests per batch")
+
+    max_rows = MAX_BATCH_ROWS // len(batch.requests)
+    max_bytes = MAX_BATCH_BYTES // len(batch.requests)
+    tasks = [asyncio.ensure_future(batch_item(request, index, spec, batch.aggregate, max_rows, max_bytes))
+             for index, spec in enumerate(batch.requests)]
+
+    async def lines():
+        try:
+            for next_item in asyncio.as_completed(tasks):
+                yield await next_item
+        finally:
+            # Client gone: stop whatever is still running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/company-time-series")
+async def get_company_time_series(request: Request, tags: List[str] = Query(...), cik: Optional[int] = None,
+                                  symbol: Optional[str] = None, source: str = "RAW", qtrs: Optional[int] = None):
+    """One company's values for the given tags across every loaded quarter, aligned
+    by period. Each (cik, tag) series is cached with the quarters it covers, so later
+    calls only query quarters loaded since."""
+    try:
+        source = normalize_source(source)
+        if source not in SERIES_SOURCES:
+            raise HTTPException(status_code=400, detail=f"Time series are not available for {source}")
+        if len(tags) > MAX_SERIES_TAGS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_SERIES_TAGS} tags per request")
+        if symbol:
+            cik = financial_data_filters(source, cik, symbol, None, None)["cik"]
+        if cik is None:
+            raise HTTPException(status_code=400, detail="cik or symbol is required")
+        tags = list(dict.fromkeys(tags))
+
+        quarters = [f"{year}Q{q}" for year, q in await run_blocking(table_catalog.loaded_quarters, source)]
+        cache_tags = (series_cache_tag(source),)
+        cached = {tag: await run_blocking(result_cache.get, ("series", source, cik, tag), cache_tags) for tag in tags}
+        missing = sorted({quarter for tag in tags for quarter in quarters
+                          if cached[tag] is None or quarter not in covered_quarters(cached[tag])})
+
+        execution_time = 0
+        if missing:
+            query, params = build_series_query(source, missing, tags)
+            params["cik"] = cik
+            async with route_slot("time-series"):
+                conn = await run_blocking(connection_pool.acquire, SOURCE_SCHEMAS[source])
+                cur = conn.cursor()
+                try:
+                    start_time = time.time()
+                    await execute_query(conn, cur, query, params, request=request)
+                    execution_time = time.time() - start_time
+                    fetched = await run_blocking(concat_arrow_tables, iter_arrow_tables(cur))
+                finally:
+                    cur.close()
+                    conn.close()
+            for tag in tags:
+                cached[tag] = merge_series(cached[tag], fetched, tag, missing)
+                await run_blocking(result_cache.put, ("series", source, cik, tag), cached[tag], cache_tags)
+
+        series = await run_blocking(align_series, list(cached.values()), tags, qtrs)
+        body = {"cik": cik, "source": source, "quarters": quarters, "queried_quarters": missing,
+                **series, "execution_time": execution_time}
+        return Response(content=dumps(body), media_type="application/json",
+                        headers={"X-Cache": "MISS" if missing else "HIT"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error building time series: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch time series from the database")
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(year: int, quarter: str, source: Optional[str] = None,
+                           x_admin_token: Optional[str] = Header(None)):
+    """Called by the Airflow loaders once a quarter has been (re)loaded. Drops that
+    quarter's cached results for the given source (or all sources) and every cached
+    custom query result."""
+    admin_token = os.getenv("CACHE_ADMIN_TOKEN")
+    if admin_token and x_admin_token != admin_token:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    suffix = quarter_suffix(year, quarter)
+    sources = [source] if source else ["RAW", "JSON", "FACT TABLES", "PARQUET"]
+    dropped = sum(result_cache.invalidate(quarter_cache_tag(name, suffix)) for name in sources)
+    dropped += result_cache.invalidate(CUSTOM_QUERY_CACHE_TAG)
+    dropped += sum(result_cache.invalidate(series_cache_tag(name)) for name in sources if name in SERIES_SOURCES)
+    table_catalog.mark_stale()
+    return {"invalidated": dropped}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Counters of the result cache, query coalescing and the connection pool"""
+    return {**result_cache.stats(), "single_flight": query_flights.stats(), "connection_pool": connection_pool.stats()}
+
+
+# Company and value columns the dashboard charts aggregate, per data source
+SUMMARY_COLUMNS = {
+    "RAW": ("NAME", "VALUE"),
+    "PARQUET": ("NAME", "VALUE"),
+    "JSON": ("COMPANY_NAME", "VALUE"),
+    "FACT TABLES": ("COMPANY_NAME", "TOTAL_VALUE")
+}
+
+# Statement codes used by the dbt fact tables and summary marts
+FACT_STATEMENT_TYPES = {
+    "Balance Sheet": "BS",
+    "Income Statement": "IS",
+    "Cash Flow": "CF"
+}
+
+
+def summarize_company_totals(company_totals, top_n: int):
+    """Split ranked company totals into the top/bottom N rows and the pie chart slices
+    (top N companies plus an "Other" bucket)."""
+    companies = [row for row in company_totals if row["RANK_DESC"] <= top_n or row["RANK_ASC"] <= top_n]
+    pie = [{"SLICE_NAME": row["COMPANY_NAME"], "SLICE_VALUE": row["TOTAL_VALUE"]}
+           for row in company_totals if row["RANK_DESC"] <= top_n]
+    others = [row["TOTAL_VALUE"] for row in company_totals if row["RANK_DESC"] > top_n]
+    if others:
+        pie.append({"SLICE_NAME": "Other", "SLICE_VALUE": sum(others)})
+    return companies, pie
+
+
+def company_totals_query(query: str, name_col: str, value_col: str):
+    """Ranked per-company totals of a statement query, aggregated where the data lives"""
+    return f"""
+    WITH base AS ({query}),
+    totals AS (
+        SELECT {name_col} AS company_name, COALESCE(SUM({value_col}), 0) AS total_value
+        FROM base
+        GROUP BY {name_col}
+    )
+    SELECT
+        company_name,
+        total_value,
+        ROW_NUMBER() OVER (ORDER BY total_value DESC, company_name) AS rank_desc,
+        ROW_NUMBER() OVER (ORDER BY total_value ASC, company_name) AS rank_asc,
+        COUNT(*) OVER () AS company_count
+    FROM totals
+    ORDER BY rank_desc
+    """
+
+
+def company_rows_query(query: str, params: dict, name_col: str, companies):
+    """Statement rows of the given companies, passed as bind variables. Returns the
+    SQL text and its parameters."""
+    names = {f"company{i}": name for i, name in enumerate(companies)}
+    sql = f"""
+    SELECT *
+    FROM ({query}) f
+    WHERE f.{name_col} IN ({", ".join(f"%({name})s" for name in names)})
+    """
+    return sql, {**params, **names}
+
+
+def top_company_rows_query(source: str, schema_name: str, query: str, params: dict, suffix: str,
+                           data_type: str, top_n: int):
+    """Statement rows of the top_n companies by total value, selected in a single
+    query so it can be paged. Returns the SQL text and its parameters."""
+    name_col, value_col = SUMMARY_COLUMNS[source]
+    if source == "FACT TABLES":
+        sql = f"""
+        SELECT f.*
+        FROM ({query}) f
+        WHERE f.company_name IN (
+            SELECT company_name
+            FROM {schema_name}.COMPANY_STATEMENT_SUMMARY_{suffix}
+            WHERE statement_type = %(stmt)s AND rank_desc <= %(top_n)s
+        )
+        """
+        return sql, {**params, "stmt": FACT_STATEMENT_TYPES[data_type], "top_n": top_n}
+    sql = f"""
+    SELECT f.*
+    FROM ({query}) f
+    WHERE f.{name_col} IN (
+        SELECT t.company_name
+        FROM ({company_totals_query(query, name_col, value_col)}) t
+        WHERE t.rank_desc <= %(top_n)s
+    )
+    """
+    return sql, {**params, "top_n": top_n}
+
+
+async def summary_rows(request: Request, conn, cur, schema_name: str, query: str, query_params: dict,
+                       suffix: str, data_type: str, source: str, top_n: int, include_rows: bool = True):
+    """Company totals, pie slices and top company rows behind /get-financial-summary"""
+    name_col, value_col = SUMMARY_COLUMNS[source]
+    if source == "FACT TABLES":
+        # Precomputed by the dbt summary marts
+        params = {**query_params, "stmt": FACT_STATEMENT_TYPES[data_type], "top_n": top_n}
+        await execute_query(conn, cur, f"""
+        SELECT company_name, cik, total_value, rank_desc, rank_asc, company_count
+        FROM {schema_name}.COMPANY_STATEMENT_SUMMARY_{suffix}
+        WHERE statement_type = %(stmt)s AND (rank_desc <= %(top_n)s OR rank_asc <= %(top_n)s)
+        ORDER BY rank_desc
+        """, params, request=request)
+        companies = await run_blocking(fetch_dicts, cur)
+
+        # Split from the per-company mart so top_n shapes the pie as for the other sources
+        await execute_query(conn, cur, f"""
+        SELECT
+            CASE WHEN rank_desc <= %(top_n)s THEN company_name ELSE 'Other' END AS slice_name,
+            SUM(total_value) AS slice_value
+        FROM {schema_name}.COMPANY_STATEMENT_SUMMARY_{suffix}
+        WHERE statement_type = %(stmt)s
+        GROUP BY 1
+        ORDER BY MIN(rank_desc)
+        """, params, request=request)
+        pie = await run_blocking(fetch_dicts, cur)
+
+        top_rows = []
+        if include_rows:
+            rows_query, rows_params = top_company_rows_query(source, schema_name, query, query_params, suffix,
+                                                             data_type, top_n)
+            await execute_query(conn, cur, rows_query, rows_params, request=request)
+            top_rows = await run_blocking(fetch_dicts, cur)
+    else:
+        # No marts for RAW/JSON: aggregate in the warehouse and only ship the totals
+        await execute_query(conn, cur, company_totals_query(query, name_col, value_col), query_params,
+                            request=request)
+        companies, pie = summarize_company_totals(await run_blocking(fetch_dicts, cur), top_n)
+
+        top_companies = [row["COMPANY_NAME"] for row in companies if row["RANK_DESC"] <= top_n]
+        top_rows = []
+        if top_companies and include_rows:
+            rows_query, rows_params = company_rows_query(query, query_params, name_col, top_companies)
+            await execute_query(conn, cur, rows_query, rows_params, request=request)
+            top_rows = await run_blocking(fetch_dicts, cur)
+    return companies, pie, top_rows
+
+
+def parquet_summary_rows(query: str, params: dict, top_n: int, include_rows: bool = True):
+    """summary_rows for the PARQUET source, aggregated by DuckDB"""
+    name_col, value_col = SUMMARY_COLUMNS["RAW"]
+    companies, pie = summarize_company_totals(
+        parquet_engine.fetch_dicts(company_totals_query(query, name_col, value_col), params), top_n)
+    top_companies = [row["COMPANY_NAME"] for row in companies if row["RANK_DESC"] <= top_n]
+    top_rows = []
+    if top_companies and include_rows:
+        top_rows = parquet_engine.fetch_dicts(*company_rows_query(query, params, name_col, top_companies))
+    current_timings().add_rows(len(companies) + len(pie) + len(top_rows))
+    return companies, pie, top_rows
+
+
+@app.get("/get-financial-summary")
+async def get_financial_summary(request: Request, year: int, quarter: str, data_type: str, source: str,
+                                top_n: int = Query(10, ge=1, le=100), include_rows: bool = True):
+    """Company totals, top/bottom N rankings, pie slices and the detail rows of the
+    top N companies, so the dashboard does not need the whole statement. With
+    include_rows=false only the aggregates are returned; the rows can then be paged
+    through /get-financial-summary/rows."""
+    try:
+        schema_name, query, params = statement_query(source, data_type, year, quarter, ordered=False)
+        name_col, value_col = SUMMARY_COLUMNS[source]
+        suffix = quarter_suffix(year, quarter)
+        etag = entity_tag(request, await run_blocking(quarter_manifest, source, year, quarter,
+                                                      summary=True))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+        start_time = time.time()
+        if source == "PARQUET":
+            if not await run_blocking(parquet_engine.is_available, suffix):
+                raise HTTPException(status_code=404, detail=f"No Parquet files for {suffix}")
+            companies, pie, top_rows = await run_blocking(parquet_summary_rows, query, params, top_n, include_rows)
+        else:
+            conn = await run_blocking(connection_pool.acquire, schema_name)
+            cur = conn.cursor()
+            async with route_slot("financial-summary"):
+                companies, pie, top_rows = await summary_rows(request, conn, cur, schema_name, query, params,
+                                                              suffix, data_type, source, top_n, include_rows)
+        execution_time = time.time() - start_time
+
+        body = {
+            "companies": sanitize_float_values(companies),
+            "pie": sanitize_float_values(pie),
+            "top_rows": sanitize_float_values(top_rows),
+            "name_col": name_col,
+            "value_col": value_col,
+            "execution_time": execution_time
+        }
+        return Response(content=dumps(body), media_type="application/json", headers=validator_headers(etag))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error building summary: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch summary from the database")
     finally:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
             conn.close()
-           
-           
-@app.get("/query-data")
-async def execute_query(query: str = Query(..., min_length=1)):
+
+
+@app.get("/get-financial-summary/rows")
+async def get_financial_summary_rows(request: Request, year: int, quarter: str, data_type: str, source: str,
+                                     top_n: int = Query(10, ge=1, le=100),
+                                     page_size: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+                                     cursor: Optional[str] = None,
+                                     layout: JsonLayout = "rows"):
+    """One page of the top N companies' statement rows, keyset paged like
+    /get-financial-data, so the dashboard can show the first rows right away and
+    fetch the rest on demand"""
     try:
-        conn = get_snowflake_connection()
+        schema_name, query, params = statement_query(source, data_type, year, quarter, ordered=False)
+        suffix = quarter_suffix(year, quarter)
+        cache_key = ("summary-rows", source, year, suffix, data_type, top_n, page_size, cursor)
+        cache_tags = (quarter_cache_tag(source, suffix),)
+
+        etag = entity_tag(request, await run_blocking(quarter_manifest, source, year, quarter,
+                                                      summary=True))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        validators = validator_headers(etag)
+
+        cached = await run_blocking(result_cache.get, cache_key, cache_tags)
+        if cached is not None:
+            headers = {"X-Cache": "HIT", "X-Execution-Time": "0", **validators}
+            return await run_blocking(paged_response, request, source, cached, page_size, headers, 0, layout)
+
+        rows_query, rows_params = top_company_rows_query(source, schema_name, query, params, suffix, data_type,
+                                                         top_n)
+        page_query, page_params = paginate_query(source, rows_query, {}, page_size, cursor)
+        params = {**rows_params, **page_params}
+        if source == "PARQUET":
+            return await parquet_financial_data(request, year, quarter, page_query, params, cache_key, cache_tags,
+                                                True, page_size, layout, validators)
+
+        query_id, execution_time, joined = await run_statement_query(request, cache_key, schema_name, page_query,
+                                                                     params)
+        conn = await run_blocking(connection_pool.acquire, schema_name)
         cur = conn.cursor()
-       
-        # Execute the query
-        cur.execute(query)
+        await run_blocking(cur.get_results_from_sfqid, query_id)
+        table = await run_blocking(concat_arrow_tables, iter_arrow_tables(cur))
+        if not joined:
+            await run_blocking(result_cache.put, cache_key, table, cache_tags)
+        headers = {"X-Cache": "MISS", "X-Execution-Time": str(execution_time),
+                   "X-Coalesced": "true" if joined else "false", **validators}
+        return await run_blocking(paged_response, request, source, table, page_size, headers, execution_time, layout)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error fetching summary rows: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch summary rows from the database")
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+
+@app.get("/query-data")
+async def query_data(request: Request, query: str = Query(..., min_length=1), data_source: str = "Fact Tables"):
+    try:
+        schema_name = SOURCE_SCHEMAS[normalize_source(data_source)]
+
+        # Execute the query; a connection of its own, as for /execute-custom-query,
+        # since the SQL may change the session
+        async with route_slot("custom-query"):
+            conn = await run_blocking(get_snowflake_connection, schema_name)
+            cur = conn.cursor()
+            await execute_query(conn, cur, query, request=request)
        
         # Fetch column names
         columns = [desc[0] for desc in cur.description]
        
         # Fetch all rows
-        rows = cur.fetchall()
+        rows = await run_blocking(cur.fetchall)
        
         # Convert to list of dictionaries
         results = [dict(zip(columns, row)) for row in rows]
@@ -243,6 +948,8 @@ async def execute_query(query: str = Query(..., min_length=1)):
         sanitized_results = sanitize_float_values(results)
        
         return {"data": sanitized_results}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
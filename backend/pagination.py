@@ -0,0 +1,115 @@
+import json
+import base64
+from fastapi import HTTPException
+from result_formats import json_default
+
+# Filters /get-financial-data understands, mapped to the result column they apply to
+FILTER_COLUMNS = {
+    "RAW": {"cik": "cik", "adsh": "adsh", "tag": "tag"},
+    "FACT TABLES": {"cik": "cik", "adsh": "adsh", "tag": "tag"},
+    "JSON": {"symbol": "symbol", "tag": "concept"}
+}
+FILTER_COLUMNS["PARQUET"] = FILTER_COLUMNS["RAW"]
+
+# Keyset order per source. Leading with (adsh, line) keeps the RAW order the endpoint
+# always had; the remaining columns break ties so pages never overlap. A pre row is
+# unique per (adsh, report, line), a num row per (adsh, tag, version, ddate, qtrs,
+# uom, segments, coreg).
+KEYSET_COLUMNS = {
+    "RAW": ["adsh", "line", "report", "tag", "version", "ddate", "qtrs", "uom", "coreg", "segments"],
+    "FACT TABLES": ["adsh", "tag", "report_date", "qtrs", "unit_of_measure", "plabel"],
+    "JSON": ["symbol", "concept", "label", "info", "unit"]
+}
+KEYSET_COLUMNS["PARQUET"] = KEYSET_COLUMNS["RAW"]
+
+# Keyset columns that can be NULL are compared as '' so no row falls between pages
+NULLABLE_KEYSET_COLUMNS = {
+    "RAW": {"coreg", "segments"},
+    "JSON": {"label", "info", "unit"}
+}
+NULLABLE_KEYSET_COLUMNS["PARQUET"] = NULLABLE_KEYSET_COLUMNS["RAW"]
+
+MAX_PAGE_SIZE = 50000
+
+
+def encode_cursor(values):
+    """Opaque page cursor holding the keyset values of the last row sent"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=json_default).encode()).decode()
+
+
+def decode_cursor(cursor: str, source: str):
+    """Keyset values from a cursor produced by encode_cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid page cursor")
+    if not isinstance(values, list) or len(values) != len(KEYSET_COLUMNS[source]):
+        raise HTTPException(status_code=400, detail="Invalid page cursor")
+    return values
+
+
+def keyset_expressions(source: str):
+    """SQL expressions the keyset is ordered and compared on"""
+    nullable = NULLABLE_KEYSET_COLUMNS.get(source, set())
+    return [f"COALESCE(f.{column}, '')" if column in nullable else f"f.{column}"
+            for column in KEYSET_COLUMNS[source]]
+
+
+def keyset_predicate(expressions):
+    """(e1, e2, ...) > (:k0, :k1, ...) expanded into AND/OR form, since Snowflake has
+    no row value comparison"""
+    terms = []
+    for i, expression in enumerate(expressions):
+        equal_prefix = [f"{expressions[j]} = %(k{j})s" for j in range(i)]
+        terms.append("(" + " AND ".join(equal_prefix + [f"{expression} > %(k{i})s"]) + ")")
+    return "(" + " OR ".join(terms) + ")"
+
+
+def paginate_query(source: str, query: str, filters: dict, page_size: int = None, cursor: str = None):
+    """Wrap a statement query with filters and keyset pagination. Every value is a
+    bind variable. Returns the SQL text and its parameters."""
+    allowed = FILTER_COLUMNS[source]
+    conditions = []
+    params = {}
+    for name, value in filters.items():
+        if value is None or value == []:
+            continue
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Filter '{name}' is not supported for {source}")
+        column = allowed[name]
+        if isinstance(value, list):
+            placeholders = []
+            for i, item in enumerate(value):
+                params[f"{name}{i}"] = item
+                placeholders.append(f"%({name}{i})s")
+            conditions.append(f"f.{column} IN ({', '.join(placeholders)})")
+        else:
+            params[name] = value
+            conditions.append(f"f.{column} = %({name})s")
+
+    keyset = keyset_expressions(source)
+    if cursor:
+        for i, value in enumerate(decode_cursor(cursor, source)):
+            params[f"k{i}"] = value
+        conditions.append(keyset_predicate(keyset))
+
+    sql = f"SELECT * FROM ({query}) f"
+    if conditions:
+        sql += "\nWHERE " + "\n  AND ".join(conditions)
+    sql += "\nORDER BY " + ", ".join(keyset)
+    if page_size:
+        sql += f"\nLIMIT {int(page_size)}"
+    return sql, params
+
+
+def next_cursor(source: str, table, page_size: int):
+    """Cursor of the page after this one, or None when this was the last page"""
+    if not page_size or table.num_rows < page_size:
+        return None
+    last_row = table.slice(table.num_rows - 1).to_pylist()[0]
+    nullable = NULLABLE_KEYSET_COLUMNS.get(source, set())
+    values = []
+    for column in KEYSET_COLUMNS[source]:
+        value = last_row[column.upper()]
+        values.append("" if value is None and column in nullable else value)
+    return encode_cursor(values)
@@ -0,0 +1,133 @@
+import os
+import re
+import threading
+import duckdb
+import pyarrow as pa
+
+# Where SECDataProcessor writes the typed Parquet files, {year}Q{q}/{sub,pre,num,tag}.parquet.
+# A local directory or an s3:// prefix (S3_ENDPOINT points DuckDB at an S3 stand-in such as MinIO).
+PARQUET_DIR = os.getenv("PARQUET_DIR", "extracted").rstrip("/")
+PARQUET_FILE_TYPES = ("sub", "pre", "num", "tag")
+# Views are created under the Snowflake schema name so the RAW statement SQL runs unchanged
+PARQUET_SCHEMA = "SEC_DATA_RAW"
+PARQUET_BATCH_SIZE = int(os.getenv("PARQUET_BATCH_SIZE", 100000))
+# Seconds a DuckDB query may run before it is interrupted
+PARQUET_QUERY_TIMEOUT = int(os.getenv("PARQUET_QUERY_TIMEOUT", 120))
+# Columns the raw SQL reads that older quarters' files lack (num.txt gained segments in 2024)
+OPTIONAL_COLUMNS = {"num": ("coreg", "segments")}
+
+QUARTER_DIR_PATTERN = re.compile(r"(\d{4}Q[1-4])/(sub|pre|num|tag)\.parquet$")
+
+
+def duckdb_params(query: str):
+    """Rewrite the connector's pyformat placeholders (%(name)s, %s) into DuckDB's ($name, ?)"""
+    return re.sub(r"%\((\w+)\)s", r"$\1", query).replace("%s", "?")
+
+
+def upper_case_columns(table):
+    """Column names as Snowflake reports unquoted identifiers, so both engines return the same names"""
+    return table.rename_columns([name.upper() for name in table.column_names])
+
+
+class ParquetEngine:
+    """In-process DuckDB over the extracted Parquet files.
+
+    Every quarter found under PARQUET_DIR gets the views SEC_DATA_RAW.sec_{sub,pre,num,tag}_{year}Q{q},
+    named like the Snowflake raw tables, so the same SQL answers from either engine.
+    Queries run on per-call cursors of one in-memory database, which DuckDB allows
+    from several threads at once.
+    """
+
+    def __init__(self, parquet_dir: str = PARQUET_DIR):
+        self.parquet_dir = parquet_dir
+        self._db = duckdb.connect(":memory:")
+        self._quarters = set()
+        self._lock = threading.Lock()
+        if parquet_dir.startswith("s3://"):
+            self._configure_s3()
+        self._db.execute(f"CREATE SCHEMA IF NOT EXISTS {PARQUET_SCHEMA}")
+
+    def _configure_s3(self):
+        self._db.execute("INSTALL httpfs")
+        self._db.execute("LOAD httpfs")
+        settings = {
+            "s3_region": os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
+            "s3_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+            "s3_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+            "s3_endpoint": os.getenv("S3_ENDPOINT"),
+        }
+        for name, value in settings.items():
+            if value:
+                self._db.execute(f"SET {name} = '{value}'")
+        if os.getenv("S3_ENDPOINT"):
+            self._db.execute("SET s3_url_style = 'path'")
+            self._db.execute(f"SET s3_use_ssl = {os.getenv('S3_USE_SSL', 'false')}")
+
+    def refresh(self):
+        """Find the quarters with all four files and create views for new ones"""
+        files = self._db.cursor().execute(f"SELECT file FROM glob('{self.parquet_dir}/*/*.parquet')").fetchall()
+        found = {}
+        for (path,) in files:
+            match = QUARTER_DIR_PATTERN.search(path.replace("\\", "/"))
+            if match:
+                found.setdefault(match.group(1), set()).add(match.group(2))
+        with self._lock:
+            for suffix, file_types in found.items():
+                if suffix in self._quarters or file_types != set(PARQUET_FILE_TYPES):
+                    continue
+                for file_type in PARQUET_FILE_TYPES:
+                    source = f"read_parquet('{self.parquet_dir}/{suffix}/{file_type}.parquet')"
+                    columns = {row[0].lower() for row in self._db.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()}
+                    missing = "".join(f", CAST(NULL AS VARCHAR) AS {column}"
+                                      for column in OPTIONAL_COLUMNS.get(file_type, ()) if column not in columns)
+                    self._db.execute(f"""
+                    CREATE OR REPLACE VIEW {PARQUET_SCHEMA}.sec_{file_type}_{suffix} AS
+                    SELECT *{missing} FROM {source}
+                    """)
+                self._quarters.add(suffix)
+        return sorted(self._quarters)
+
+    def is_available(self, suffix: str):
+        """Whether a quarter's Parquet files are there, looking again if it is not known yet"""
+        return suffix in self._quarters or suffix in self.refresh()
+
+    def last_modified(self, suffix: str):
+        """Latest modification time of a quarter's local Parquet files, None for S3 or missing files"""
+        if self.parquet_dir.startswith("s3://") or not self.is_available(suffix):
+            return None
+        return max(os.path.getmtime(f"{self.parquet_dir}/{suffix}/{file_type}.parquet")
+                   for file_type in PARQUET_FILE_TYPES)
+
+    def loaded_quarters(self):
+        """(year, quarter) pairs with Parquet files, oldest first"""
+        return [(int(suffix[:4]), int(suffix[5])) for suffix in self.refresh()]
+
+    def cursor(self):
+        """A new cursor of the shared database; another thread may interrupt() its query"""
+        return self._db.cursor()
+
+    def iter_tables(self, query: str, params=None, cur=None):
+        """Run query and yield its result as Arrow tables of up to PARQUET_BATCH_SIZE rows.
+        An empty result still yields one empty table carrying the columns. The query
+        runs on cur when given, which is closed afterwards."""
+        cur = cur or self._db.cursor()
+        try:
+            reader = cur.execute(duckdb_params(query), params).fetch_record_batch(PARQUET_BATCH_SIZE)
+            empty = True
+            for batch in reader:
+                empty = False
+                yield upper_case_columns(pa.Table.from_batches([batch]))
+            if empty:
+                yield upper_case_columns(reader.schema.empty_table())
+        finally:
+            cur.close()
+
+    def fetch_dicts(self, query: str, params=None):
+        """Run query and return its rows as column -> value dicts"""
+        cur = self._db.cursor()
+        try:
+            cur.execute(duckdb_params(query), params)
+            columns = [desc[0].upper() for desc in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+        finally:
+            cur.close()
@@ -0,0 +1,139 @@
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Request
+from instrumentation import phase, current_timings
+from query_templates import qmark
+
+# The Snowflake connector blocks, so all of its calls run on this pool instead of the event loop
+QUERY_EXECUTOR_THREADS = int(os.getenv("QUERY_EXECUTOR_THREADS", 32))
+executor = ThreadPoolExecutor(max_workers=QUERY_EXECUTOR_THREADS, thread_name_prefix="snowflake")
+
+# Concurrent queries allowed per route, overridable with e.g. FINANCIAL_DATA_CONCURRENCY
+ROUTE_CONCURRENCY = {
+    "financial-data": 8,
+    "financial-summary": 8,
+    "custom-query": 4,
+    "table-info": 4,
+    "time-series": 4,
+    "parquet": 4,
+    # Batch specs materialized at once, over all batch requests
+    "batch": 4
+}
+DEFAULT_ROUTE_CONCURRENCY = 4
+
+# Status polling interval of a running query, doubled up to the maximum
+POLL_INTERVAL = float(os.getenv("QUERY_POLL_INTERVAL", 0.05))
+MAX_POLL_INTERVAL = float(os.getenv("QUERY_MAX_POLL_INTERVAL", 1.0))
+
+_route_semaphores = {}
+_route_waiting = {}
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the query executor and wait for it without blocking the loop"""
+    loop = asyncio.get_running_loop()
+    # Carry the request context (timings) over to the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def route_limit(route: str):
+    """Concurrency limit of a route"""
+    env_name = f"{route.upper().replace('-', '_')}_CONCURRENCY"
+    return int(os.getenv(env_name, ROUTE_CONCURRENCY.get(route, DEFAULT_ROUTE_CONCURRENCY)))
+
+
+@asynccontextmanager
+async def route_slot(route: str, max_queue: int = None):
+    """Hold one of the route's query slots; requests over the limit wait for a free one.
+    With max_queue, a request that would find max_queue others already waiting is
+    rejected with 429 instead."""
+    if route not in _route_semaphores:
+        _route_semaphores[route] = asyncio.Semaphore(route_limit(route))
+        _route_waiting[route] = 0
+    semaphore = _route_semaphores[route]
+    if max_queue is not None and semaphore.locked() and _route_waiting[route] >= max_queue:
+        raise HTTPException(status_code=429, detail="Too many queries queued, try again shortly",
+                            headers={"Retry-After": "5"})
+    _route_waiting[route] += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _route_waiting[route] -= 1
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def set_statement_timeout(conn, seconds: int):
+    """Have Snowflake itself abort any statement of this session after seconds"""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {int(seconds)}")
+    finally:
+        cur.close()
+
+
+def cancel_query(conn, query_id: str):
+    """Ask Snowflake to stop a running query"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT SYSTEM$CANCEL_QUERY(?)", (query_id,))
+        print(f"Cancelled query {query_id}")
+    except Exception as e:
+        print(f"Failed to cancel query {query_id}: {str(e)}")
+    finally:
+        cur.close()
+
+
+async def execute_query(conn, cur, query: str, params=None, request: Request = None, timeout: int = None):
+    """Submit query asynchronously and poll its status while other requests are served.
+    If the client goes away, the handler is cancelled or the query runs longer than
+    timeout seconds, the query is cancelled in Snowflake. Once it finishes the cursor
+    holds its result, as after cur.execute(). Returns the Snowflake query id."""
+    with phase("execute"):
+        return await _execute_query(conn, cur, query, params, request, timeout)
+
+
+async def _execute_query(conn, cur, query, params, request, timeout):
+    submitted = await run_blocking(cur.execute_async, *qmark(query, params))
+    query_id = submitted["queryId"]
+    current_timings().add_query_id(query_id)
+    deadline = time.monotonic() + timeout if timeout else None
+    delay = POLL_INTERVAL
+    try:
+        while True:
+            status = await run_blocking(conn.get_query_status_throw_if_error, query_id)
+            if not conn.is_still_running(status):
+                break
+            if request is not None and await request.is_disconnected():
+                raise ClientDisconnected()
+            if deadline is not None and time.monotonic() > deadline:
+                raise QueryTimeout()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_POLL_INTERVAL)
+    except (ClientDisconnected, QueryTimeout, asyncio.CancelledError) as e:
+        await asyncio.shield(run_blocking(cancel_query, conn, query_id))
+        if isinstance(e, ClientDisconnected):
+            # nginx's "client closed request"; nobody is left to read it
+            raise HTTPException(status_code=499, detail="Client closed request")
+        if isinstance(e, QueryTimeout):
+            raise HTTPException(status_code=504, detail=f"Query exceeded the {timeout} second time limit")
+        raise
+
+    await run_blocking(cur.get_results_from_sfqid, query_id)
+    return query_id
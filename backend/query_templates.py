@@ -0,0 +1,147 @@
+import re
+from typing import NamedTuple
+from fastapi import HTTPException
+
+# Quarter argument of the endpoints: "Q1".."Q4" or "1".."4"
+QUARTER_ARG = re.compile(r"^Q?([1-4])$", re.IGNORECASE)
+MIN_YEAR, MAX_YEAR = 2009, 2100
+
+# Table names are the only part of a statement query that cannot be a bind variable
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+# pyformat placeholders, %(name)s and %s, as written in the backend's queries
+PYFORMAT_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s")
+
+RAW_STATEMENT_TYPES = {
+    "Income Statement": "IC",
+    "Balance Sheet": "BS",
+    "Cash Flow": "CF"
+}
+
+FACT_STATEMENT_TABLES = {
+    "Balance Sheet": "BALANCE_SHEET",
+    "Income Statement": "INCOME_STATEMENT",
+    "Cash Flow": "CASH_FLOW"
+}
+
+# Column the batch endpoint's totals sum, per source (the others have value)
+STATEMENT_VALUE_COLUMNS = {"FACT TABLES": "TOTAL_VALUE"}
+
+JSON_STATEMENT_VIEWS = {
+    "Balance Sheet": "view_balance_sheet",
+    "Income Statement": "view_income_statement",
+    "Cash Flow": "view_cash_flow"
+}
+
+
+def canonical(sql: str):
+    """Single-spaced SQL text. Templates hold no string literals, so this is safe and
+    makes the text independent of how the template is indented."""
+    return " ".join(sql.split())
+
+
+class StatementTemplate(NamedTuple):
+    """Canonical SQL of one statement of a source. {schema} and the quarter
+    placeholders are identifiers filled in by render(); values are bind variables."""
+    schema: str
+    sql: str
+    params: dict
+    order_by: str = None
+
+
+RAW_STATEMENT_SQL = canonical("""
+    SELECT
+        s.adsh, s.cik, s.name, s.sic, s.countryba, s.stprba, s.cityba, s.filed,
+        p.report, p.line, p.plabel, n.tag, n.version, n.ddate, n.qtrs, n.uom, n.coreg, n.segments, n.value
+    FROM {schema}.sec_sub_{suffix} s
+    JOIN {schema}.sec_pre_{suffix} p ON s.adsh = p.adsh
+    JOIN {schema}.sec_num_{suffix} n ON s.adsh = n.adsh AND p.tag = n.tag AND p.version = n.version
+    WHERE p.stmt = %(stmt)s
+""")
+
+
+def _registry():
+    templates = {}
+    for data_type, stmt_type in RAW_STATEMENT_TYPES.items():
+        # The Parquet views carry the raw table names
+        for source in ("RAW", "PARQUET"):
+            templates[(source, data_type)] = StatementTemplate(
+                "SEC_DATA_RAW", RAW_STATEMENT_SQL, {"stmt": stmt_type}, "s.adsh, p.line")
+    for data_type, table in FACT_STATEMENT_TABLES.items():
+        templates[("FACT TABLES", data_type)] = StatementTemplate(
+            "SEC_DATA_DFT", f"SELECT * FROM {{schema}}.{table}_{{suffix}}", {})
+    for data_type, view in JSON_STATEMENT_VIEWS.items():
+        templates[("JSON", data_type)] = StatementTemplate(
+            "SEC_DATA_JSON", f"SELECT * FROM {{schema}}.{view}_{{year}}_Q{{q}}", {})
+    return templates
+
+
+# (source, data_type) -> StatementTemplate
+STATEMENT_TEMPLATES = _registry()
+
+
+def parse_quarter(year: int, quarter: str):
+    """Validated (year, quarter number) of a request"""
+    match = QUARTER_ARG.match(str(quarter).strip())
+    if not match or not MIN_YEAR <= int(year) <= MAX_YEAR:
+        raise HTTPException(status_code=400, detail="Invalid year or quarter")
+    return int(year), int(match.group(1))
+
+
+def quarter_suffix(year: int, quarter: str):
+    """Table suffix used for a quarter, e.g. 2023Q1"""
+    year, q = parse_quarter(year, quarter)
+    return f"{year}Q{q}"
+
+
+def identifier(name: str):
+    """name, if it is a plain (optionally schema qualified) SQL identifier"""
+    if not IDENTIFIER.match(name):
+        raise HTTPException(status_code=400, detail=f"Invalid table name: {name}")
+    return name
+
+
+def statement_query(source: str, data_type: str, year: int, quarter: str, ordered: bool = True):
+    """Schema, canonical SQL text and bind variables of one statement of one quarter.
+    The same logical request always renders the same text, so Snowflake can answer
+    repeats from its result cache."""
+    template = STATEMENT_TEMPLATES.get((source, data_type))
+    if template is None:
+        if source not in {name for name, _ in STATEMENT_TEMPLATES}:
+            raise HTTPException(status_code=400, detail="Invalid data source")
+        raise HTTPException(status_code=400, detail="Invalid data type")
+    year, q = parse_quarter(year, quarter)
+    parts = {"schema": identifier(template.schema), "suffix": f"{year}Q{q}", "year": year, "q": q}
+    sql = template.sql.format(**parts)
+    for table in re.findall(r"(?:FROM|JOIN) (\S+)", sql):
+        identifier(table)
+    if ordered and template.order_by:
+        sql += f" ORDER BY {template.order_by}"
+    return template.schema, sql, dict(template.params)
+
+
+def statement_totals_query(source: str, data_type: str, year: int, quarter: str):
+    """Schema, SQL and bind variables of the row count (ROW_COUNT) and value total
+    (TOTAL_VALUE) of one statement of one quarter, computed where the data lives"""
+    schema, sql, params = statement_query(source, data_type, year, quarter, ordered=False)
+    value = STATEMENT_VALUE_COLUMNS.get(source, "value")
+    return schema, f"SELECT COUNT(*) AS ROW_COUNT, SUM({value}) AS TOTAL_VALUE FROM ({sql}) statement_rows", params
+
+
+def qmark(query: str, params):
+    """Rewrite pyformat placeholders to Snowflake's server-side ? binds. The connector
+    interpolates pyformat values into the text on the client, which makes every
+    literal a different statement; with qmark the text stays the same."""
+    if not params:
+        return query, None
+    values = []
+
+    def bind(match):
+        if match.group(1) is None:
+            values.append(positional.pop(0))
+        else:
+            values.append(params[match.group(1)])
+        return "?"
+
+    positional = list(params) if not isinstance(params, dict) else []
+    return PYFORMAT_PLACEHOLDER.sub(bind, query), values
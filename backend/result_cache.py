@@ -0,0 +1,197 @@
+import os
+import re
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Schema metadata key of a disk entry's source version
+SOURCE_VERSION_METADATA_KEY = b"source_version"
+
+
+def normalize_sql(query: str):
+    """Canonical form of a custom query used as cache key: whitespace outside string
+    literals collapsed, trailing semicolons dropped. Keywords are not case folded so
+    quoted identifiers keep their meaning."""
+    parts = re.split(r"('(?:[^']|'')*')", query.strip())
+    normalized = "".join(part if part.startswith("'") else re.sub(r"\s+", " ", part) for part in parts)
+    return normalized.strip().rstrip(";").strip()
+
+
+class ResultCache:
+    """Two tier cache of query results (pyarrow Tables).
+
+    Loaded quarters never change, so results are kept until the loader for that
+    quarter tells the backend to invalidate them. The memory tier is an LRU bounded
+    by total table bytes; the optional disk tier keeps every entry as a Parquet file
+    so results survive evictions and restarts.
+
+    An invalidation sent while the backend was down never reaches the disk tier, so
+    each file carries source_version(tags) of when it was written (the load times of
+    the tables behind it) and is served only while that still matches. Without
+    source_version, or when it returns None, nothing is read back from disk.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str = None, max_entry_bytes: int = None, source_version=None):
+        self.max_bytes = max_bytes
+        self.source_version = source_version
+        # A single result may not take more than a quarter of the memory tier
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (table, tags)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.metrics = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "puts": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "oversized_skips": 0,
+            "stale_disk_entries": 0
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key, tags):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+        # Tags are part of the file name so invalidation does not need an index
+        return os.path.join(self.disk_dir, f"{'__'.join(sorted(tags))}--{digest}.parquet")
+
+    def get(self, key, tags=()):
+        """Cached table for key, or None. tags must match the ones used in put()."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return self._entries[key][0]
+
+        if self.disk_dir:
+            path = self._disk_path(key, tags)
+            if os.path.exists(path):
+                try:
+                    table = pq.read_table(path)
+                except Exception as e:
+                    print(f"Discarding unreadable cache file {path}: {str(e)}")
+                    os.remove(path)
+                else:
+                    table, version = self._split_version(table)
+                    current = self._current_version(tags)
+                    if current is None or version != current:
+                        if current is not None:
+                            # Written before a reload this backend never heard of
+                            with contextlib.suppress(FileNotFoundError):
+                                os.remove(path)
+                            with self._lock:
+                                self.metrics["stale_disk_entries"] += 1
+                        with self._lock:
+                            self.metrics["misses"] += 1
+                        return None
+                    with self._lock:
+                        self.metrics["disk_hits"] += 1
+                    self._put_memory(key, table, tags)
+                    return table
+
+        with self._lock:
+            self.metrics["misses"] += 1
+        return None
+
+    def put(self, key, table, tags=()):
+        """Store a result. Results bigger than max_entry_bytes are not cached."""
+        if table.nbytes > self.max_entry_bytes:
+            with self._lock:
+                self.metrics["oversized_skips"] += 1
+            return False
+
+        with self._lock:
+            self.metrics["puts"] += 1
+        self._put_memory(key, table, tags)
+        if self.disk_dir:
+            version = self._current_version(tags)
+            if version is not None:
+                try:
+                    metadata = {**(table.schema.metadata or {}), SOURCE_VERSION_METADATA_KEY: version.encode()}
+                    pq.write_table(table.replace_schema_metadata(metadata), self._disk_path(key, tags),
+                                   compression="zstd")
+                except Exception as e:
+                    print(f"Failed to write cache file for {key}: {str(e)}")
+        return True
+
+    def _current_version(self, tags):
+        """source_version(tags), or None when it is not known"""
+        if self.source_version is None:
+            return None
+        try:
+            return self.source_version(tags)
+        except Exception as e:
+            print(f"Could not read the source version of {tags}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _split_version(table):
+        """A disk entry without its source version, and the version"""
+        metadata = dict(table.schema.metadata or {})
+        version = metadata.pop(SOURCE_VERSION_METADATA_KEY, b"").decode() or None
+        return table.replace_schema_metadata(metadata or None), version
+
+    def tee(self, tables, key, tags=()):
+        """Pass result chunks through while collecting them; once the result is fully
+        consumed it is cached, unless it grew past max_entry_bytes on the way."""
+        collected = []
+        collected_bytes = 0
+        for table in tables:
+            if collected is not None:
+                collected_bytes += table.nbytes
+                if collected_bytes > self.max_entry_bytes:
+                    collected = None
+                    with self._lock:
+                        self.metrics["oversized_skips"] += 1
+                else:
+                    collected.append(table)
+            yield table
+        if collected:
+            schema = collected[0].schema
+            self.put(key, pa.concat_tables([t.cast(schema) if t.schema != schema else t for t in collected]), tags)
+
+    def _put_memory(self, key, table, tags):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[0].nbytes
+            self._entries[key] = (table, tuple(tags))
+            self._bytes += table.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.metrics["evictions"] += 1
+
+    def invalidate(self, tag: str):
+        """Drop every entry carrying tag from both tiers. Returns the number of memory entries dropped."""
+        with self._lock:
+            keys = [key for key, (_, tags) in self._entries.items() if tag in tags]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[0].nbytes
+            self.metrics["invalidations"] += len(keys)
+
+        if self.disk_dir:
+            for file_name in os.listdir(self.disk_dir):
+                if tag in file_name.split("--")[0].split("__"):
+                    os.remove(os.path.join(self.disk_dir, file_name))
+        return len(keys)
+
+    def stats(self):
+        """Hit/miss counters and current size of the memory tier"""
+        with self._lock:
+            lookups = self.metrics["memory_hits"] + self.metrics["disk_hits"] + self.metrics["misses"]
+            hits = self.metrics["memory_hits"] + self.metrics["disk_hits"]
+            return {
+                **self.metrics,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.disk_dir)
+            }
@@ -0,0 +1,176 @@
+import os
+import io
+import decimal
+import datetime
+from typing import Literal
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from instrumentation import phase, current_timings, timed_iter, counted_tables
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Rows per streamed NDJSON chunk
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 10000))
+# JSON body layouts: a list of row dicts, or {"columns": [...], "data": {column: [values]}}
+JsonLayout = Literal["rows", "columns"]
+
+
+def sanitize_float_values(data):
+    """Convert special float values to None."""
+    for item in data:
+        for key, value in item.items():
+            if isinstance(value, float) and (np.isnan(value) or np.isinf(value)):
+                item[key] = None
+    return data
+
+
+def sanitize_arrow_table(table):
+    """JSON-ready copy of a result table, computed per column: NaN/Inf become null and
+    decimals become float64"""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_decimal(column.type):
+            column = pc.cast(column, pa.float64())
+        if pa.types.is_floating(column.type):
+            column = pc.if_else(pc.is_finite(column), column, pa.scalar(None, column.type))
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+def accepts(request: Request, media_type: str):
+    """Whether the client asked for media_type in its Accept header"""
+    return media_type in request.headers.get("accept", "")
+
+
+def json_default(value):
+    """JSON encoding for the non-native values the connector returns"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def normalize_arrow_table(table):
+    """Snowflake sizes integer columns per result chunk (int8, int16, ...); widen
+    them to int64 so every chunk of one result shares a single schema."""
+    fields = [pa.field(field.name, pa.int64()) if pa.types.is_integer(field.type) else field
+              for field in table.schema]
+    return table.cast(pa.schema(fields))
+
+
+def iter_arrow_tables(cur):
+    """Normalized Arrow tables of the cursor result, one per Snowflake result chunk.
+    An empty result still yields one empty table carrying the column names."""
+    if getattr(cur, "_query_result_format", "arrow") != "arrow":
+        # SHOW, DESCRIBE and DDL results come back as JSON, which fetch_arrow_batches rejects
+        return _iter_arrow_tables(cur, _fetchall_tables(cur), current_timings())
+    return _iter_arrow_tables(cur, timed_iter(cur.fetch_arrow_batches(), "fetch"), current_timings())
+
+
+def _column_array(values):
+    """Arrow array of one fetched column; mixed values fall back to their text"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def _fetchall_tables(cur):
+    """The cursor's rows as one Arrow table, for results not in the Arrow format"""
+    with phase("fetch"):
+        rows = cur.fetchall()
+    if rows:
+        names = [desc[0] for desc in cur.description]
+        yield pa.table([_column_array([row[i] for row in rows]) for i in range(len(names))], names=names)
+
+
+def _iter_arrow_tables(cur, batches, timings):
+    empty = True
+    for table in batches:
+        empty = False
+        with timings.phase("transform"):
+            table = normalize_arrow_table(table)
+        yield table
+    if empty:
+        yield pa.table({desc[0]: pa.array([], type=pa.string()) for desc in cur.description})
+
+
+def concat_arrow_tables(tables):
+    """Concatenate result chunks into one table using the first chunk's schema"""
+    tables = list(tables)
+    schema = tables[0].schema
+    return pa.concat_tables([table.cast(schema) if table.schema != schema else table for table in tables])
+
+
+def close_after(tables, conn, cur):
+    """Pass tables through and close the cursor and connection once they are consumed"""
+    try:
+        yield from tables
+    finally:
+        cur.close()
+        conn.close()
+
+
+def table_rows(table):
+    """Result table as the row-dict layout of the JSON responses"""
+    return sanitize_arrow_table(table).to_pylist()
+
+
+def table_columns(table):
+    """Result table as the column-oriented layout of the JSON responses"""
+    return {"columns": table.column_names, "data": sanitize_arrow_table(table).to_pydict()}
+
+
+def dumps(value):
+    """Encode a response body with orjson"""
+    return orjson.dumps(value, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def ndjson_chunks(tables):
+    """Yield the rows as NDJSON, STREAM_BATCH_SIZE rows at a time, so memory stays
+    flat however many rows the quarter has."""
+    for table in tables:
+        for batch in sanitize_arrow_table(table).to_batches(max_chunksize=STREAM_BATCH_SIZE):
+            yield b"".join(dumps(row) + b"\n" for row in batch.to_pylist())
+
+
+def arrow_chunks(tables):
+    """Yield the result as an Arrow IPC stream, one record batch per result chunk.
+    NaN/Inf stay as native float values."""
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+    for table in tables:
+        if writer is None:
+            schema = table.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_table(table.cast(schema) if table.schema != schema else table)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate(0)
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
+
+
+def respond_with_tables(request: Request, tables, headers=None, layout: str = "rows", **extra):
+    """Send the result in the format negotiated through the Accept header: an Arrow
+    IPC stream, NDJSON, or a JSON body with extra fields. The JSON body is
+    {"data": [row dicts]} or, with layout="columns", {"columns": [...], "data": {...}}."""
+    tables = counted_tables(tables)
+    if accepts(request, ARROW_MEDIA_TYPE):
+        return StreamingResponse(timed_iter(arrow_chunks(tables), "serialize"), media_type=ARROW_MEDIA_TYPE,
+                                 headers=headers)
+    if accepts(request, NDJSON_MEDIA_TYPE):
+        return StreamingResponse(timed_iter(ndjson_chunks(tables), "serialize"), media_type=NDJSON_MEDIA_TYPE,
+                                 headers=headers)
+    table = concat_arrow_tables(tables)
+    with phase("transform"):
+        body = table_columns(table) if layout == "columns" else {"data": table_rows(table)}
+    with phase("serialize"):
+        return Response(content=dumps({**body, **extra}), media_type="application/json", headers=headers)
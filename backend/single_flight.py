@@ -0,0 +1,68 @@
+import asyncio
+
+
+class _Flight:
+    """One in-flight execution and the requests waiting for it"""
+
+    def __init__(self):
+        self.requests = []
+        self.task = None
+
+    async def is_disconnected(self):
+        """True once every waiting client has gone away, so the shared query can be
+        cancelled without failing anyone who is still listening"""
+        if not self.requests:
+            return False
+        for request in self.requests:
+            if not await request.is_disconnected():
+                return False
+        return True
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the work; callers arriving while it runs wait
+    for the same result instead of starting their own. The work runs as its own task,
+    so a caller going away does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.metrics = {
+            "executions": 0,
+            "joined_waiters": 0,
+            "max_waiters": 0
+        }
+
+    async def do(self, key, func, request=None):
+        """Run func(flight) once per key at a time. flight can stand in for the request
+        in execute_query(). Returns (result, joined) where joined tells whether this
+        call waited on another caller's execution."""
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if not joined:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(self._run(key, flight, func))
+            self.metrics["executions"] += 1
+        else:
+            self.metrics["joined_waiters"] += 1
+        if request is not None:
+            flight.requests.append(request)
+        self.metrics["max_waiters"] = max(self.metrics["max_waiters"], len(flight.requests) - 1)
+        return await asyncio.shield(flight.task), joined
+
+    async def _run(self, key, flight, func):
+        try:
+            return await func(flight)
+        finally:
+            self._flights.pop(key, None)
+
+    def stats(self):
+        """Execution and waiter counters, and the number of keys running right now"""
+        return {
+            **self.metrics,
+            "in_flight": len(self._flights),
+            "waiting": sum(max(len(flight.requests) - 1, 0) for flight in self._flights.values())
+        }
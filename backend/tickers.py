@@ -0,0 +1,48 @@
+import os
+from fastapi import HTTPException
+
+# Same "symbol<TAB>cik" file the JSON pipeline uses to attach symbols to filings; it
+# ships next to this module, so the backend image (built from backend/) has it
+TICKER_FILE = os.getenv("TICKER_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ticker.txt"))
+
+_symbol_to_cik = None
+
+
+def load_tickers(path: str = TICKER_FILE):
+    """Read the ticker file into a symbol -> cik dict (empty if the file is missing)"""
+    mapping = {}
+    if not os.path.exists(path):
+        print(f"ERROR: ticker file not found at {path}; symbol filters are unavailable until "
+              f"it is there (set TICKER_FILE to its location)")
+        return mapping
+    with open(path) as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) == 2 and parts[1].isdigit():
+                mapping[parts[0].upper()] = int(parts[1])
+    if not mapping:
+        print(f"ERROR: ticker file {path} holds no symbol<TAB>cik lines")
+    return mapping
+
+
+def symbol_map():
+    """symbol -> cik of the ticker file. Without a ticker file no symbol can be
+    resolved: 503 rather than calling every symbol unknown."""
+    global _symbol_to_cik
+    if not _symbol_to_cik:
+        # Read again until it loads, in case the file is mounted after startup
+        _symbol_to_cik = load_tickers()
+        if not _symbol_to_cik:
+            raise HTTPException(status_code=503, detail="Ticker symbols are not available on this server")
+    return _symbol_to_cik
+
+
+def resolve_cik(symbol: str):
+    """CIK for a ticker symbol, or None if it is unknown"""
+    return symbol_map().get(symbol.strip().upper())
+
+
+def resolve_symbols(cik: int):
+    """Ticker symbols of a CIK, lower case as the ticker file, and so the JSON data,
+    has them (a company may list several share classes); empty if it has none"""
+    return sorted(symbol.lower() for symbol, symbol_cik in symbol_map().items() if symbol_cik == int(cik))
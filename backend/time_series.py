@@ -0,0 +1,92 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from result_formats import concat_arrow_tables, sanitize_arrow_table
+
+# Sources a company time series can be read from
+SERIES_SOURCES = ("RAW", "FACT TABLES")
+MAX_SERIES_TAGS = 20
+
+# Schema metadata key listing the quarters a cached (cik, tag) series covers
+QUARTERS_METADATA_KEY = b"quarters"
+
+FACT_STATEMENT_TABLES = ("BALANCE_SHEET", "INCOME_STATEMENT", "CASH_FLOW")
+
+
+def series_cache_tag(source: str):
+    """Cache tag of every cached time series of a source"""
+    return f"{source.upper().replace(' ', '_')}-SERIES"
+
+
+def build_series_query(source: str, suffixes, tags):
+    """UNION ALL over the given quarters, each branch pruned to the company and tags.
+    Every branch returns SOURCE_FILE, ADSH, FILED, TAG, DDATE, QTRS, UOM, VALUE."""
+    params = {f"tag{i}": tag for i, tag in enumerate(tags)}
+    tag_list = ", ".join(f"%(tag{i})s" for i in range(len(tags)))
+    branches = []
+    for suffix in suffixes:
+        if source == "RAW":
+            branches.append(f"""
+            SELECT '{suffix}' AS source_file, s.adsh, s.filed, n.tag, n.ddate, n.qtrs, n.uom, n.value
+            FROM SEC_DATA_RAW.sec_sub_{suffix} s
+            JOIN SEC_DATA_RAW.sec_num_{suffix} n ON n.adsh = s.adsh
+            WHERE s.cik = %(cik)s AND n.tag IN ({tag_list}) AND n.segments IS NULL AND n.coreg IS NULL
+            """)
+        else:
+            for table in FACT_STATEMENT_TABLES:
+                branches.append(f"""
+                SELECT '{suffix}' AS source_file, adsh, filing_date AS filed, tag, report_date AS ddate, qtrs,
+                       unit_of_measure AS uom, total_value AS value
+                FROM SEC_DATA_DFT.{table}_{suffix}
+                WHERE cik = %(cik)s AND tag IN ({tag_list})
+                """)
+    return "\nUNION ALL\n".join(branches), params
+
+
+def covered_quarters(table):
+    """Quarters a cached series table covers"""
+    value = (table.schema.metadata or {}).get(QUARTERS_METADATA_KEY, b"")
+    return set(value.decode().split(",")) if value else set()
+
+
+def with_quarters(table, quarters):
+    """The table marked as covering quarters"""
+    metadata = {**(table.schema.metadata or {}), QUARTERS_METADATA_KEY: ",".join(sorted(quarters)).encode()}
+    return table.replace_schema_metadata(metadata)
+
+
+def merge_series(cached, fetched, tag: str, fetched_quarters):
+    """Series of one tag: cached rows of the quarters not fetched again plus the
+    fetched rows, marked with all the quarters now covered"""
+    rows = fetched.filter(pc.equal(fetched["TAG"], tag)) if fetched.num_rows else fetched
+    quarters = set(fetched_quarters)
+    parts = [rows]
+    if cached is not None:
+        quarters |= covered_quarters(cached)
+        kept = cached.filter(pc.invert(pc.is_in(cached["SOURCE_FILE"], value_set=pa.array(list(fetched_quarters)))))
+        parts.append(kept.replace_schema_metadata(None))
+    # Empty parts may carry placeholder column types; let a part with rows set the schema
+    parts = sorted(parts, key=lambda part: part.num_rows, reverse=True)
+    non_empty = [part for part in parts if part.num_rows] or parts[:1]
+    return with_quarters(concat_arrow_tables(non_empty), quarters)
+
+
+def align_series(tables, tags, qtrs: int = None):
+    """One aligned time series: a row per (DDATE, QTRS) period and a column per tag.
+    A value restated in later filings is taken from the latest filing, and each tag
+    keeps only its most common unit."""
+    frames = [sanitize_arrow_table(table.replace_schema_metadata(None)).to_pandas() for table in tables if table.num_rows]
+    columns = ["DDATE", "QTRS", *tags]
+    if not frames:
+        return {"units": {}, "columns": columns, "data": {column: [] for column in columns}}
+
+    df = pd.concat(frames, ignore_index=True)
+    if qtrs is not None:
+        df = df[df["QTRS"] == qtrs]
+    units = {tag: group["UOM"].mode().iloc[0] for tag, group in df.groupby("TAG") if not group["UOM"].mode().empty}
+    df = df[df["UOM"] == df["TAG"].map(units)]
+    latest = df.sort_values(["FILED", "SOURCE_FILE"]).drop_duplicates(["TAG", "DDATE", "QTRS"], keep="last")
+    aligned = latest.pivot(index=["DDATE", "QTRS"], columns="TAG", values="VALUE").reindex(columns=list(tags))
+    aligned = aligned.sort_index().reset_index()
+    aligned = aligned.astype(object).where(aligned.notna(), None)
+    return {"units": units, "columns": columns, "data": {column: aligned[column].tolist() for column in columns}}
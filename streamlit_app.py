@@ -2,8 +2,12 @@ import streamlit as st
 import requests
 import pandas as pd
 import plotly.express as px
+import pyarrow as pa
 from datetime import datetime
 import os
+import json
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,10 +15,93 @@ load_dotenv()
 # API endpoints
 API_BASE_URL = "https://dynaledger-fast-api-930030449616.us-east1.run.app"
 
+# Results are requested as Arrow IPC streams instead of JSON row dicts
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Responses kept for revalidation with If-None-Match, most recent last
+VALIDATED_RESPONSES_MAX = 20
+# Headers of a stored response the fetchers read back
+VALIDATED_HEADERS = ("ETag", "Content-Type", "X-Execution-Time", "X-Next-Cursor", "X-Truncated")
+
+# Client side cache of backend results. Entries are keyed by the request
+# parameters and the session's data version, which "Refresh data" bumps.
+CACHE_TTL_SECONDS = int(os.getenv("CLIENT_CACHE_TTL_SECONDS", 600))
+CACHE_MAX_ENTRIES = int(os.getenv("CLIENT_CACHE_MAX_ENTRIES", 64))
+
+class BackendError(Exception):
+    """Non-success response of the backend. Raised inside the cached fetchers so
+    failures are reported but never cached."""
+    def __init__(self, response):
+        super().__init__(response.text)
+        self.status_code = response.status_code
+        self.text = response.text
+
+@st.cache_resource
+def http_session():
+    """Keep-alive session shared by every rerun and user, so requests reuse the
+    open TLS connections to the backend instead of opening new ones"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_resource
+def validated_responses():
+    """Body and headers of the last response per request that carried an ETag, most
+    recent last, with the lock every session takes to read or change them"""
+    return OrderedDict(), threading.Lock()
+
+def stored_response(stored):
+    """A 200 response rebuilt from a validated_responses entry"""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers = requests.structures.CaseInsensitiveDict(stored["headers"])
+    response._content = stored["content"]
+    response.encoding = "utf-8"
+    return response
+
+def data_version():
+    """Part of every cache key; bumped by the "Refresh data" button"""
+    return st.session_state.get("data_version", 0)
+
+def get_with_validators(path, params, headers=None):
+    """GET that sends back the ETag of the last response to the same request. The
+    backend answers 304 while the quarter is unchanged; the stored response is then
+    returned, so a repeat view only costs the round trip."""
+    headers = dict(headers or {})
+    key = (path, tuple(sorted((name, str(value)) for name, value in params.items())), headers.get("Accept"))
+    stored_responses, lock = validated_responses()
+    with lock:
+        stored = stored_responses.get(key)
+    if stored is not None:
+        headers["If-None-Match"] = stored["headers"]["ETag"]
+    response = http_session().get(f"{API_BASE_URL}{path}", params=params, headers=headers)
+    if response.status_code == 304 and stored is not None:
+        with lock:
+            if key in stored_responses:
+                stored_responses.move_to_end(key)
+        return stored_response(stored)
+    if response.status_code == 200 and "ETag" in response.headers:
+        # Only the body and the headers read back are kept, not the response object
+        entry = {"headers": {name: response.headers[name] for name in VALIDATED_HEADERS if name in response.headers},
+                 "content": response.content}
+        with lock:
+            stored_responses[key] = entry
+            stored_responses.move_to_end(key)
+            while len(stored_responses) > VALIDATED_RESPONSES_MAX:
+                stored_responses.popitem(last=False)
+    return response
+
+def read_arrow_response(response):
+    """Decode an Arrow IPC stream response into a DataFrame without a JSON round trip"""
+    table = pa.ipc.open_stream(response.content).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
 def check_data_availability(source, year, quarter):
     """Check if data is available in Snowflake"""
     try:
-        response = requests.get(
+        response = http_session().get(
             f"{API_BASE_URL}/check-availability",
             params={"source": source, "year": year, "quarter": quarter}
         )
@@ -23,35 +110,178 @@ def check_data_availability(source, year, quarter):
         st.error(f"Error checking data availability: {str(e)}")
         return False
 
-def fetch_financial_data(year, quarter, data_type, source):
-    """Fetch financial data based on the selected parameters"""
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_financial_data(year, quarter, data_type, source, filters, page_size, cursor, version):
+    params = {"year": year, "quarter": quarter, "data_type": data_type, "source": source}
+    params.update(filters)
+    if page_size:
+        params["page_size"] = page_size
+    if cursor:
+        params["cursor"] = cursor
+    response = get_with_validators("/get-financial-data", params, headers={"Accept": ARROW_MEDIA_TYPE})
+    if response.status_code != 200:
+        raise BackendError(response)
+    if response.headers.get("content-type", "").startswith(ARROW_MEDIA_TYPE):
+        return {
+            "data": read_arrow_response(response),
+            "execution_time": float(response.headers.get("X-Execution-Time", 0)),
+            "next_cursor": response.headers.get("X-Next-Cursor")
+        }
+    return response.json()
+
+def fetch_financial_data(year, quarter, data_type, source, filters=None, page_size=None, cursor=None):
+    """Fetch financial data based on the selected parameters. With page_size the
+    result is one page; next_cursor requests the page after it."""
+    filters = tuple(sorted((name, value) for name, value in (filters or {}).items() if value))
     try:
-        response = requests.get(
-            f"{API_BASE_URL}/get-financial-data",
-            params={"year": year, "quarter": quarter, "data_type": data_type, "source": source}
-        )
-        if response.status_code == 200:
-            return response.json()
+        return cached_financial_data(year, quarter, data_type, source, filters, page_size, cursor, data_version())
+    except BackendError as e:
+        st.error(f"Failed to fetch data: {e.text}")
+        return None
+    except Exception as e:
+        st.error(f"Error fetching data: {str(e)}")
+        return None
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_financial_summary(year, quarter, data_type, source, top_n, include_rows, version):
+    response = get_with_validators(
+        "/get-financial-summary",
+        {"year": year, "quarter": quarter, "data_type": data_type, "source": source, "top_n": top_n,
+         "include_rows": str(include_rows).lower()}
+    )
+    if response.status_code != 200:
+        raise BackendError(response)
+    return response.json()
+
+def fetch_financial_summary(year, quarter, data_type, source, top_n=10, include_rows=True):
+    """Fetch precomputed company totals, rankings and pie slices for the dashboard.
+    Without include_rows only the aggregates come back, see fetch_summary_rows."""
+    try:
+        return cached_financial_summary(year, quarter, data_type, source, top_n, include_rows, data_version())
+    except BackendError as e:
+        st.error(f"Failed to fetch summary: {e.text}")
+        return None
+    except Exception as e:
+        st.error(f"Error fetching summary: {str(e)}")
+        return None
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_summary_rows(year, quarter, data_type, source, top_n, page_size, cursor, version):
+    params = {"year": year, "quarter": quarter, "data_type": data_type, "source": source, "top_n": top_n,
+              "page_size": page_size}
+    if cursor:
+        params["cursor"] = cursor
+    response = get_with_validators("/get-financial-summary/rows", params, headers={"Accept": ARROW_MEDIA_TYPE})
+    if response.status_code != 200:
+        raise BackendError(response)
+    if response.headers.get("content-type", "").startswith(ARROW_MEDIA_TYPE):
+        return {"data": read_arrow_response(response), "next_cursor": response.headers.get("X-Next-Cursor")}
+    return response.json()
+
+def fetch_summary_rows(year, quarter, data_type, source, top_n=10, page_size=1000, cursor=None):
+    """Fetch one page of the top companies' rows; next_cursor requests the page after it"""
+    try:
+        return cached_summary_rows(year, quarter, data_type, source, top_n, page_size, cursor, data_version())
+    except BackendError as e:
+        st.error(f"Failed to fetch rows: {e.text}")
+        return None
+    except Exception as e:
+        st.error(f"Error fetching rows: {str(e)}")
+        return None
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_financial_batch(specs, aggregate, version):
+    response = http_session().post(
+        f"{API_BASE_URL}/get-financial-data/batch",
+        json={"requests": [dict(spec) for spec in specs], "aggregate": aggregate},
+        stream=True
+    )
+    if response.status_code != 200:
+        raise BackendError(response)
+    results = [None] * len(specs)
+    errors = []
+    for line in response.iter_lines():
+        if not line:
+            continue
+        item = json.loads(line)
+        if "error" in item:
+            errors.append(item)
         else:
-            st.error(f"Failed to fetch data: {response.text}")
-            return None
+            results[item["index"]] = pd.DataFrame(item["data"], columns=item["columns"])
+    return results, errors
+
+def fetch_financial_batch(specs, aggregate=False):
+    """Fetch several statements/quarters in one request. The backend runs them
+    concurrently and streams one tagged result per line; returns one DataFrame
+    per spec, in spec order (None for failed specs). With aggregate, each DataFrame
+    is one row of ROW_COUNT and TOTAL_VALUE, computed by the backend."""
+    try:
+        results, errors = cached_financial_batch(tuple(tuple(spec.items()) for spec in specs), aggregate,
+                                                 data_version())
+    except BackendError as e:
+        st.error(f"Failed to fetch data: {e.text}")
+        return [None] * len(specs)
     except Exception as e:
         st.error(f"Error fetching data: {str(e)}")
+        return [None] * len(specs)
+    for item in errors:
+        spec = item["spec"]
+        st.warning(f"{spec['data_type']} {spec['year']} {spec['quarter']}: {item['error']}")
+    return results
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_company_time_series(company, tags, source, qtrs, version):
+    params = {"tags": list(tags), "source": source}
+    if company.isdigit():
+        params["cik"] = company
+    else:
+        params["symbol"] = company
+    if qtrs is not None:
+        params["qtrs"] = qtrs
+    response = http_session().get(f"{API_BASE_URL}/company-time-series", params=params)
+    if response.status_code != 200:
+        raise BackendError(response)
+    return response.json()
+
+def fetch_company_time_series(company, tags, source, qtrs=None):
+    """Fetch one company's values for the given tags across all loaded quarters"""
+    try:
+        return cached_company_time_series(company, tuple(tags), source, qtrs, data_version())
+    except BackendError as e:
+        st.error(f"Failed to fetch time series: {e.text}")
         return None
-    
+    except Exception as e:
+        st.error(f"Error fetching time series: {str(e)}")
+        return None
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_custom_query(query, data_source, version):
+    response = http_session().post(
+        f"{API_BASE_URL}/execute-custom-query",
+        json={"query": query},
+        params={"data_source": data_source},
+        headers={"Accept": ARROW_MEDIA_TYPE}
+    )
+    if response.status_code != 200:
+        raise BackendError(response)
+    if response.headers.get("content-type", "").startswith(ARROW_MEDIA_TYPE):
+        df = read_arrow_response(response)
+    else:
+        df = pd.DataFrame(response.json()["data"])
+    # The backend caps custom query results and flags when it cut rows
+    df.attrs["truncated"] = response.headers.get("X-Truncated") == "true"
+    return df
+
 def execute_custom_query(query, data_source):
     """Execute custom query against Snowflake"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/execute-custom-query",
-            json={"query": query},
-            params={"data_source": data_source}
-        )
-        if response.status_code == 200:
-            return pd.DataFrame(response.json()["data"])
+        return cached_custom_query(query, data_source, data_version())
+    except BackendError as e:
+        if e.status_code == 429:
+            st.warning("The backend is busy running other queries. Please try again in a few seconds.")
         else:
-            st.error(f"Query failed: {response.text}")
-            return None
+            st.error(f"Query failed: {e.text}")
+        return None
     except Exception as e:
         st.error(f"Error executing query: {str(e)}")
         return None
@@ -146,6 +376,8 @@ def display_table_schemas(data_source):
         {"name": "FILING_DATE", "type": "NUMBER(38,0)"},
         {"name": "FISCAL_YEAR", "type": "NUMBER(38,0)"},
         {"name": "FISCAL_PERIOD", "type": "VARCHAR(2)"},
+        {"name": "ACCEPTED", "type": "VARCHAR(30)"},
+        {"name": "SOURCE_FILE", "type": "VARCHAR(20)"},
         {"name": "TAG", "type": "VARCHAR(256)"},
         {"name": "UNIT_OF_MEASURE", "type": "VARCHAR(20)"},
         {"name": "REPORT_DATE", "type": "NUMBER(8,0)"},
@@ -155,7 +387,7 @@ def display_table_schemas(data_source):
         {"name": "TOTAL_VALUE", "type": "NUMBER(38,10)"}
     ]
 
-    if data_source == "Raw":
+    if data_source in ("Raw", "Parquet"):
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             table_name, columns = list(raw_table_schema.items())[0]
@@ -210,6 +442,80 @@ def display_table_schemas(data_source):
             """)
         df = pd.DataFrame(fact_table_schema)
         st.dataframe(df, height=300, width=600)
+# Rows per page of the top company rows, and how many rows the grid holds at once
+TOP_ROWS_PAGE_SIZE = 1000
+GRID_WINDOW_ROWS = 5000
+
+def render_summary(year, quarter, data_type, source):
+    """Charts of the company aggregates, drawn before any statement rows are fetched"""
+    with st.spinner("Loading company totals..."):
+        summary = fetch_financial_summary(year, quarter, data_type, source, include_rows=False)
+    if not summary:
+        return
+    df_companies = pd.DataFrame(summary["companies"])
+    execution_time = summary.get("execution_time", 0)
+    st.write(f"Query executed in {execution_time} seconds.")
+    if df_companies.empty:
+        st.warning("No data available for the selected criteria.")
+        return
+
+    st.subheader(f"({data_type} for {year} {quarter})")
+
+    # Company totals and rankings are computed by the backend
+    name_col, value_col = 'COMPANY_NAME', 'TOTAL_VALUE'
+
+    # Top and bottom 10 companies, both ordered by total value
+    top_10 = df_companies[df_companies['RANK_DESC'] <= 10].sort_values(by='RANK_DESC')
+    bottom_10 = df_companies[df_companies['RANK_ASC'] <= 10].sort_values(by=value_col, ascending=False)
+
+    # Create a bar chart for top 10 companies
+    st.subheader("Top 10 Companies")
+    fig_top = px.bar(top_10, x=name_col, y=value_col, title=f"Top 10 {data_type} Overview")
+    st.plotly_chart(fig_top, use_container_width=True)
+
+    # Create a bar chart for bottom 10 companies
+    st.subheader("Bottom 10 Companies")
+    fig_bottom = px.bar(bottom_10, x=name_col, y=value_col, title=f"Bottom 10 {data_type} Overview")
+    st.plotly_chart(fig_bottom, use_container_width=True)
+
+    # Summary graph: top companies plus an "Other" bucket
+    st.subheader("Summary Graph")
+    summary_df = pd.DataFrame(summary["pie"])
+    fig_summary = px.pie(summary_df, values='SLICE_VALUE', names='SLICE_NAME', title="Company Value Distribution")
+    st.plotly_chart(fig_summary, use_container_width=True)
+
+def render_top_rows(year, quarter, data_type, source):
+    """Rows of the top 10 companies, one page at a time. "Load more rows" appends the
+    next page; the grid only ever holds the last GRID_WINDOW_ROWS loaded rows."""
+    st.subheader("Top 10 Company Rows")
+    cursors = st.session_state["explorer_cursors"]
+    pages = []
+    # Pages older than the window are not sent to the browser again
+    window_pages = max(1, GRID_WINDOW_ROWS // TOP_ROWS_PAGE_SIZE)
+    for cursor in cursors[-window_pages:]:
+        with st.spinner("Loading rows..."):
+            page = fetch_summary_rows(year, quarter, data_type, source, page_size=TOP_ROWS_PAGE_SIZE, cursor=cursor)
+        if not page:
+            return
+        pages.append(page)
+    frames = [pd.DataFrame(page["data"]) for page in pages]
+    df_rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    if df_rows.empty:
+        st.caption("No rows.")
+        return
+    first_row = (len(cursors) - len(pages)) * TOP_ROWS_PAGE_SIZE + 1
+    st.caption(f"Rows {first_row}-{first_row + len(df_rows) - 1}")
+    st.dataframe(df_rows, height=400)
+
+    next_cursor = pages[-1].get("next_cursor") if pages else None
+    if next_cursor:
+        if st.button("Load more rows"):
+            cursors.append(next_cursor)
+            st.rerun()
+    else:
+        st.caption("All rows loaded.")
+
 def main():
     st.set_page_config(
         page_title="SEC Financial Data Explorer",
@@ -218,9 +524,14 @@ def main():
     )
 
     st.title("SEC Financial Data Explorer")
+
+    # Results are cached for CACHE_TTL_SECONDS; refreshing fetches them again for this session
+    if st.sidebar.button("Refresh data"):
+        st.session_state["data_version"] = data_version() + 1
+    st.sidebar.caption(f"Results are cached for {CACHE_TTL_SECONDS // 60} minutes.")
     
     # Create tabs for different functionalities
-    tab1, tab2 = st.tabs(["Data Explorer", "Custom Query"])
+    tab1, tab2, tab3 = st.tabs(["Data Explorer", "Custom Query", "Company History"])
     
     with tab1:
         st.header("Data Explorer")
@@ -230,7 +541,7 @@ def main():
         with col1:
             source = st.selectbox(
                 "Select Data Source",
-                ["RAW", "JSON", "FACT TABLES"],
+                ["RAW", "JSON", "FACT TABLES", "PARQUET"],
                 key="data_explorer_source"
             )
         with col2:
@@ -253,62 +564,91 @@ def main():
                 key="data_explorer_data_type"
             )
 
+        # The loaded selection stays on screen across reruns; every fetch below is
+        # answered from the client cache once it has been made
+        explorer_key = (source, year, quarter, data_type)
         if st.button("Load Data"):
-            data = fetch_financial_data(year, quarter, data_type, source)
-            if data:
-                df = pd.DataFrame(data["data"])
-                execution_time = data.get("execution_time", 0)
-                st.write(f"Query executed in {execution_time} seconds.")
-                
-                if not df.empty:
-                    st.subheader(f"({data_type} for {year} {quarter})")
-                    
-                    # Adjust column names based on the data source
-                    if source == "FACT TABLES":
-                        name_col, value_col = 'COMPANY_NAME', 'TOTAL_VALUE'
-                    elif source == "JSON":
-                        name_col, value_col = 'COMPANY_NAME', 'VALUE'
-                    else:  # RAW
-                        name_col, value_col = 'NAME', 'VALUE'
-                    
-                    if name_col in df.columns and value_col in df.columns:
-                        df_aggregated = df.groupby(name_col).agg({value_col: 'sum'}).reset_index()
-        
-                        # Sort by total value and select top 10 companies
-                        top_10_companies = df_aggregated.nlargest(10, value_col)[name_col]
-                        
-                        # Filter the original DataFrame to include only rows for the top 10 companies
-                        df_top_10 = df[df[name_col].isin(top_10_companies)]
-                        st.dataframe(df_top_10)
-                        
-                        # Sort data to get top and bottom 10 companies
-                        df_sorted = df_aggregated.sort_values(by=value_col, ascending=False)
-                        top_10 = df_sorted.head(10)
-                        bottom_10 = df_sorted.tail(10)
-                        
-                        # Create a bar chart for top 10 companies
-                        st.subheader("Top 10 Companies")
-                        fig_top = px.bar(top_10, x=name_col, y=value_col, title=f"Top 10 {data_type} Overview")
-                        st.plotly_chart(fig_top, use_container_width=True)
-                        
-                        # Create a bar chart for bottom 10 companies
-                        st.subheader("Bottom 10 Companies")
-                        fig_bottom = px.bar(bottom_10, x=name_col, y=value_col, title=f"Bottom 10 {data_type} Overview")
-                        st.plotly_chart(fig_bottom, use_container_width=True)
-                        
-                        # Optional: Add a summary graph
-                        st.subheader("Summary Graph")
-                        summary_df = df.groupby(name_col).agg({value_col: 'sum'}).reset_index()
-                        fig_summary = px.pie(summary_df, values=value_col, names=name_col, title="Company Value Distribution")
-                        st.plotly_chart(fig_summary, use_container_width=True)
-                    else:
-                        st.warning(f"The data does not contain '{name_col}' or '{value_col}' columns.")
-                else:
-                    st.warning("No data available for the selected criteria.")
+            st.session_state["explorer_key"] = explorer_key
+            st.session_state["explorer_cursors"] = [None]
+        if st.session_state.get("explorer_key") == explorer_key:
+            render_summary(year, quarter, data_type, source)
+            render_top_rows(year, quarter, data_type, source)
+
+        # Row level browsing, one page at a time, filtered in the warehouse
+        st.subheader("Browse Rows")
+        fcol1, fcol2, fcol3 = st.columns(3)
+        with fcol1:
+            company_filter = st.text_input("CIK or ticker symbol", key="browse_company")
+        with fcol2:
+            tag_filter = st.text_input("Tag", key="browse_tag")
+        with fcol3:
+            page_size = st.selectbox("Rows per page", [100, 500, 1000, 5000], key="browse_page_size")
+
+        filters = {"tag": tag_filter.strip()}
+        company_filter = company_filter.strip()
+        if company_filter.isdigit():
+            filters["cik"] = company_filter
+        elif company_filter:
+            filters["symbol"] = company_filter
+
+        # Cursors of the pages visited so far; any change of selection starts over
+        browse_key = (source, year, quarter, data_type, tuple(sorted(filters.items())), page_size)
+        if st.session_state.get("browse_key") != browse_key:
+            st.session_state["browse_key"] = browse_key
+            st.session_state["browse_cursors"] = [None]
+            st.session_state["browse_next"] = None
+            st.session_state["browse_active"] = False
+
+        if st.button("Load Rows"):
+            st.session_state["browse_active"] = True
+
+        bcol1, bcol2, bcol3 = st.columns(3)
+        with bcol1:
+            if st.button("First Page"):
+                st.session_state["browse_cursors"] = [None]
+        with bcol2:
+            if st.button("Previous Page") and len(st.session_state["browse_cursors"]) > 1:
+                st.session_state["browse_cursors"].pop()
+        with bcol3:
+            if st.button("Next Page") and st.session_state["browse_next"]:
+                st.session_state["browse_cursors"].append(st.session_state["browse_next"])
+
+        if st.session_state["browse_active"]:
+            page = fetch_financial_data(year, quarter, data_type, source, filters=filters,
+                                        page_size=page_size, cursor=st.session_state["browse_cursors"][-1])
+            if page:
+                st.session_state["browse_next"] = page.get("next_cursor")
+                st.write(f"Page {len(st.session_state['browse_cursors'])}, "
+                         f"query executed in {page.get('execution_time', 0)} seconds.")
+                st.dataframe(pd.DataFrame(page["data"]))
+                if not st.session_state["browse_next"]:
+                    st.caption("Last page.")
+
+        # All three statements for several quarters, fetched in one batch request
+        st.subheader("Compare Quarters")
+        compare_quarters = st.multiselect("Quarters", ["Q1", "Q2", "Q3", "Q4"], default=["Q1", "Q2", "Q3", "Q4"],
+                                          key="compare_quarters")
+        if st.button("Compare Statements") and compare_quarters:
+            data_types = ["Balance Sheet", "Income Statement", "Cash Flow"]
+            specs = [{"year": year, "quarter": q, "data_type": dt, "source": source}
+                     for q in compare_quarters for dt in data_types]
+            # Only the totals are shown, so only the totals are fetched
+            totals = []
+            for spec, df in zip(specs, fetch_financial_batch(specs, aggregate=True)):
+                if df is not None and not df.empty:
+                    totals.append({"Quarter": spec["quarter"], "Statement": spec["data_type"],
+                                   "Rows": int(df["ROW_COUNT"].iloc[0]),
+                                   "Total Value": df["TOTAL_VALUE"].fillna(0).iloc[0]})
+            if totals:
+                df_totals = pd.DataFrame(totals)
+                st.dataframe(df_totals)
+                fig_compare = px.bar(df_totals, x="Quarter", y="Total Value", color="Statement", barmode="group",
+                                     title=f"Statement totals for {year}")
+                st.plotly_chart(fig_compare, use_container_width=True)
     
     with tab2:
         st.header("Custom Query")
-        data_source = st.selectbox("Select Data Source", ["Raw", "JSON", "Fact Tables"])
+        data_source = st.selectbox("Select Data Source", ["Raw", "JSON", "Fact Tables", "Parquet"])
         display_table_schemas(data_source)
 
         # Query input
@@ -324,9 +664,37 @@ def main():
                 df = execute_custom_query(query, data_source)
                 if df is not None:
                     st.success("Query executed successfully!")
+                    if df.attrs.get("truncated"):
+                        st.warning(f"Result truncated to the first {len(df)} rows. Add filters or a LIMIT to see the rest.")
                     st.dataframe(df)
             else:
                 st.warning("Please enter a query to execute")
+
+    with tab3:
+        st.header("Company History")
+        hcol1, hcol2, hcol3 = st.columns(3)
+        with hcol1:
+            company = st.text_input("CIK or ticker symbol", value="AAPL", key="history_company")
+        with hcol2:
+            tags_input = st.text_input("Tags (comma separated)", value="Revenues, NetIncomeLoss", key="history_tags")
+        with hcol3:
+            history_source = st.selectbox("Data Source", ["RAW", "FACT TABLES"], key="history_source")
+        period = st.radio("Period", ["Quarterly", "Annual", "Point in time"], horizontal=True, key="history_period")
+
+        if st.button("Load History"):
+            tags = [tag.strip() for tag in tags_input.split(",") if tag.strip()]
+            qtrs = {"Quarterly": 1, "Annual": 4, "Point in time": 0}[period]
+            series = fetch_company_time_series(company.strip(), tags, history_source, qtrs)
+            if series:
+                df_series = pd.DataFrame(series["data"], columns=series["columns"])
+                if df_series.empty:
+                    st.warning("No values found for this company and tags.")
+                else:
+                    df_series["PERIOD"] = pd.to_datetime(df_series["DDATE"].astype(str), format="%Y%m%d")
+                    fig_series = px.line(df_series, x="PERIOD", y=[tag for tag in tags if tag in df_series.columns],
+                                         markers=True, title=f"{company} over {len(series['quarters'])} quarters")
+                    st.plotly_chart(fig_series, use_container_width=True)
+                    st.dataframe(df_series)
                 
                 
 if __name__ == "__main__":